@@ -0,0 +1,277 @@
+#encoding=utf8
+
+# asyncio 版 IceApi 客户端：非阻塞 socket + 长连接池，一个进程内可以同时保持大量请求在途
+
+import io
+import ssl
+import asyncio
+import weakref
+import http.client
+import http.cookiejar
+import urllib.parse
+import urllib.request
+
+import jsoncodec
+
+class _CookieResponse:
+    """给 CookieJar.extract_cookies 用的响应适配"""
+
+    def __init__(self, headers):
+        self._headers = headers
+
+    def info(self):
+        return self._headers
+
+class AsyncConnection:
+    """一条 HTTP/1.1 连接，一次只处理一个请求"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def open(cls, scheme, host, port, timeout = 30):
+        ctx = ssl.create_default_context() if scheme == "https" else None
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port, ssl=ctx), timeout)
+        return cls(reader, writer)
+
+    async def request(self, method, path, headers, data):
+        """发送请求并读取完整响应，返回 (code, headers, body, keep_alive)"""
+        self.writer.write(BuildRequest(method, path, headers, data))
+        await self.writer.drain()
+        return await ReadResponse(self.reader, method)
+
+    def close(self):
+        self.writer.close()
+
+def BuildRequest(method, path, headers, data):
+    lines = ["%s %s HTTP/1.1" % (method, path)]
+    for k, v in headers.items():
+        lines.append("%s: %s" % (k, v))
+    if data is not None:
+        lines.append("Content-Length: %d" % len(data))
+    head = ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1')
+    return head + data if data else head
+
+async def ReadResponse(reader, method):
+    """读取一个响应，返回 (code, headers, body, keep_alive)"""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            raise http.client.RemoteDisconnected("Remote end closed connection without response")
+        raise
+    status, _, rest = head.partition(b"\r\n")
+    version, code = status.split(None, 2)[:2]
+    code = int(code)
+    headers = http.client.parse_headers(io.BytesIO(rest))
+
+    conn = (headers.get("Connection") or "").lower()
+    keep_alive = conn != "close" if version == b"HTTP/1.1" else conn == "keep-alive"
+
+    if method == "HEAD" or code in (204, 304) or code < 200:
+        body = b""
+    elif (headers.get("Transfer-Encoding") or "").lower() == "chunked":
+        body = await _ReadChunked(reader)
+    elif headers.get("Content-Length") is not None:
+        body = await reader.readexactly(int(headers["Content-Length"]))
+    else:
+        body = await reader.read()
+        keep_alive = False
+    return (code, headers, body, keep_alive)
+
+async def _ReadChunked(reader):
+    parts = []
+    while True:
+        size = int((await reader.readline()).split(b";", 1)[0], 16)
+        if size == 0:
+            break
+        parts.append(await reader.readexactly(size))
+        await reader.readline()
+    # trailer
+    while (await reader.readline()) not in (b"\r\n", b""):
+        pass
+    return b"".join(parts)
+
+class AsyncSession:
+    """按 host 维护空闲连接池，limit 限制每个 host 的并发连接数
+
+    trace 为 httptrace.CaptureWriter 时记录每个请求，供 httptrace.py 回放。
+    """
+
+    def __init__(self, cookies = False, limit = 100, timeout = 30, trace = None):
+        self.cookiejar = http.cookiejar.CookieJar() if cookies else None
+        self.trace = trace
+        self.limit = limit
+        self.timeout = timeout
+        self._idle = {}
+        self._sems = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    async def request(self, url, headers = None, data = None, method = None):
+        """发送请求，返回 (code, headers, body)，body 为 bytes"""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        if method is None:
+            method = "POST" if data is not None else "GET"
+        parts = urllib.parse.urlsplit(url)
+        scheme = parts.scheme or "http"
+        port = parts.port or (443 if scheme == "https" else 80)
+        key = (scheme, parts.hostname, port)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        hdrs = {"Host": parts.netloc, "Accept-Encoding": "identity"}
+        if headers:
+            hdrs.update(headers)
+        self._add_cookies(url, hdrs)
+        if self.trace is not None:
+            self.trace.record(self, method, url, hdrs, data)
+
+        sem = self._sems.get(key)
+        if sem is None:
+            sem = self._sems[key] = asyncio.Semaphore(self.limit)
+        async with sem:
+            idle = self._idle.setdefault(key, [])
+            reused = bool(idle)
+            conn = idle.pop() if reused else await AsyncConnection.open(scheme, parts.hostname, port, self.timeout)
+            try:
+                r = await asyncio.wait_for(conn.request(method, path, hdrs, data), self.timeout)
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if not reused:
+                    raise
+                # 复用的连接已被服务器关闭，换新连接重试一次
+                conn = await AsyncConnection.open(scheme, parts.hostname, port, self.timeout)
+                try:
+                    r = await asyncio.wait_for(conn.request(method, path, hdrs, data), self.timeout)
+                except BaseException:
+                    conn.close()
+                    raise
+            except BaseException:
+                conn.close()
+                raise
+            code, rheaders, body, keep_alive = r
+            if keep_alive:
+                idle.append(conn)
+            else:
+                conn.close()
+
+        if self.cookiejar is not None:
+            self.cookiejar.extract_cookies(_CookieResponse(rheaders), urllib.request.Request(url))
+        return (code, rheaders, body)
+
+    def close(self):
+        idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+    def _add_cookies(self, url, headers):
+        if self.cookiejar is None or any(k.lower() == "cookie" for k in headers):
+            return
+        req = urllib.request.Request(url)
+        self.cookiejar.add_cookie_header(req)
+        cookie = req.get_header("Cookie")
+        if cookie:
+            headers["Cookie"] = cookie
+
+_sessions = weakref.WeakKeyDictionary()
+
+def DefaultSession():
+    """当前事件循环使用的默认会话，连接不能跨事件循环复用"""
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None:
+        session = _sessions[loop] = AsyncSession()
+    return session
+
+async def RequestRaw(url, headers = {}, data = None, session = None):
+    session = session or DefaultSession()
+    code, headers, data = await session.request(url, headers, data)
+    if code < 200 or code >= 300:
+        return (code, headers, None)
+    return (code, headers, data.decode('utf-8'))
+
+async def _RequestBytes(url, headers, obj):
+    """JSON 请求体直接编码成 bytes，返回 (code, body)，非 2xx 时 body 为 None"""
+    data = jsoncodec.dumps(obj) if obj != None else None
+    code, _, body = await DefaultSession().request(url, headers, data)
+    return (code, body if 200 <= code < 300 else None)
+
+async def RequestJson(url, headers = {}, **kwargs):
+    """请求 IceApi，返回未拆包的 JSON 响应"""
+    return await RequestApiObj(url, kwargs, headers)
+
+async def RequestApiObj(url, obj, headers = {}):
+    code, body = await _RequestBytes(url, headers, obj)
+    assert code == 200
+    return jsoncodec.loads(body)
+
+async def RequestApi(url, headers = {}, **kwargs):
+    """请求API并解析响应，根据stat字段判断成功/失败"""
+    code, body = await _RequestBytes(url, headers, kwargs)
+    return UnwrapApi(code, body)
+
+async def RequestApiExpectError(url, headers = {}, **kwargs):
+    """期望失败的请求，返回(是否为错误, 错误信息)"""
+    r = await _RequestBytes(url, headers, kwargs)
+    if r[0] == 200 and r[1]:
+        try:
+            response = jsoncodec.loads(r[1])
+            if response.get("stat") != "ok":
+                return (True, response.get("m", "Unknown error"))
+            return (False, "Success")
+        except ValueError:
+            pass
+    return (True, f"HTTP {r[0]}")
+
+def UnwrapApi(status_code, raw_content):
+    """与 test_middleware.RequestApi 相同的 stat/data 拆包规则"""
+    if status_code == 200 and raw_content:
+        try:
+            response = jsoncodec.loads(raw_content)
+        except ValueError:
+            return None
+        if not isinstance(response, dict):
+            return None
+        # {"stat": "ok", "data": {...}} 或 {"stat": "error", "m": "..."}
+        if response.get("stat") == "ok" and "data" in response:
+            return response["data"]
+        elif response.get("stat") != "ok":
+            return None
+        return response
+    return None
+
+async def Gather(calls, limit = 100, return_exceptions = True):
+    """并发执行 calls 中的 awaitable，同时在途的数量不超过 limit，结果按原顺序返回
+
+    calls 可以是生成器，按需取用，不会一次性创建全部协程。
+    """
+    results = []
+    it = enumerate(calls)
+
+    async def worker():
+        for i, aw in it:
+            results.extend([None] * (i + 1 - len(results)))
+            try:
+                results[i] = await aw
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results[i] = e
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(limit)]
+    try:
+        await asyncio.gather(*workers)
+    except BaseException:
+        for w in workers:
+            w.cancel()
+        raise
+    return results
@@ -0,0 +1,176 @@
+#encoding=utf8
+
+# 基于 asyncio 流的最小 WebSocket（RFC 6455）实现，不依赖第三方库，一个事件循环可以承载大量连接
+
+import os
+import ssl
+import base64
+import struct
+import asyncio
+import hashlib
+import urllib.parse
+
+GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OP_CONT = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+class ConnectionClosed(Exception):
+    def __init__(self, code = 1006, reason = ""):
+        Exception.__init__(self, "WebSocket closed: %d %s" % (code, reason))
+        self.code = code
+        self.reason = reason
+
+def AcceptKey(key):
+    return base64.b64encode(hashlib.sha1(key.encode('latin-1') + GUID).digest()).decode('latin-1')
+
+def Mask(data, mask):
+    """按 4 字节掩码异或，整块转成大整数运算避免逐字节循环"""
+    n = len(data)
+    if n == 0:
+        return b""
+    key = (mask * (n // 4 + 1))[:n]
+    return (int.from_bytes(data, 'little') ^ int.from_bytes(key, 'little')).to_bytes(n, 'little')
+
+def BuildFrame(opcode, payload, mask = True, fin = True):
+    n = len(payload)
+    head = bytearray([(0x80 if fin else 0) | opcode])
+    mbit = 0x80 if mask else 0
+    if n < 126:
+        head.append(mbit | n)
+    elif n < 0x10000:
+        head.append(mbit | 126)
+        head += struct.pack("!H", n)
+    else:
+        head.append(mbit | 127)
+        head += struct.pack("!Q", n)
+    if mask:
+        key = os.urandom(4)
+        head += key
+        payload = Mask(payload, key)
+    return bytes(head) + payload
+
+class WebSocket:
+    """一条已完成握手的 WebSocket 连接；client=True 时发出的帧带掩码"""
+
+    def __init__(self, reader, writer, client = True):
+        self.reader = reader
+        self.writer = writer
+        self.client = client
+        self.closed = False
+        self.close_code = None
+
+    async def send(self, data, binary = None):
+        """str 以文本帧发送，bytes 默认以二进制帧发送；binary=False 时把 UTF-8 bytes 作为文本帧发送"""
+        if isinstance(data, str):
+            await self._send_frame(OP_TEXT, data.encode('utf-8'))
+        else:
+            await self._send_frame(OP_TEXT if binary is False else OP_BINARY, bytes(data))
+
+    async def recv(self, decode = True):
+        """接收一条完整消息（合并分片），文本返回 str，二进制返回 bytes；decode=False 时文本也返回 bytes"""
+        opcode = None
+        parts = []
+        while True:
+            fin, op, payload = await self._read_frame()
+            if op == OP_PING:
+                await self._send_frame(OP_PONG, payload)
+                continue
+            if op == OP_PONG:
+                continue
+            if op == OP_CLOSE:
+                code = struct.unpack("!H", payload[:2])[0] if len(payload) >= 2 else 1005
+                reason = payload[2:].decode('utf-8', 'replace')
+                if not self.closed:
+                    # 对端可能发完关闭帧就断开，回应失败不影响关闭
+                    await self.close(code)
+                raise ConnectionClosed(code, reason)
+            if op != OP_CONT:
+                opcode = op
+            parts.append(payload)
+            if fin:
+                break
+        data = parts[0] if len(parts) == 1 else b"".join(parts)
+        return data.decode('utf-8') if decode and opcode == OP_TEXT else data
+
+    async def close(self, code = 1000, reason = ""):
+        if self.closed:
+            return
+        try:
+            await self._close(code, reason)
+        except (ConnectionError, OSError):
+            self.writer.close()
+
+    async def _close(self, code, reason = ""):
+        self.closed = True
+        self.close_code = code
+        try:
+            await self._send_frame(OP_CLOSE, struct.pack("!H", code) + reason.encode('utf-8'))
+        finally:
+            self.writer.close()
+
+    async def _send_frame(self, opcode, payload):
+        self.writer.write(BuildFrame(opcode, payload, self.client))
+        await self.writer.drain()
+
+    async def _read_frame(self):
+        try:
+            b0, b1 = await self.reader.readexactly(2)
+            n = b1 & 0x7F
+            if n == 126:
+                n = struct.unpack("!H", await self.reader.readexactly(2))[0]
+            elif n == 127:
+                n = struct.unpack("!Q", await self.reader.readexactly(8))[0]
+            mask = await self.reader.readexactly(4) if b1 & 0x80 else None
+            payload = await self.reader.readexactly(n) if n else b""
+        except (asyncio.IncompleteReadError, ConnectionError):
+            self.closed = True
+            raise ConnectionClosed(1006, "connection lost")
+        if mask:
+            payload = Mask(payload, mask)
+        return (bool(b0 & 0x80), b0 & 0x0F, payload)
+
+async def Connect(url, headers = None, timeout = 30, limit = 2 ** 20):
+    """打开 ws:// 或 wss:// 连接并完成握手"""
+    parts = urllib.parse.urlsplit(url)
+    secure = parts.scheme == "wss"
+    port = parts.port or (443 if secure else 80)
+    ctx = ssl.create_default_context() if secure else None
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(parts.hostname, port, ssl=ctx, limit=limit), timeout)
+
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    key = base64.b64encode(os.urandom(16)).decode('latin-1')
+    lines = [
+        "GET %s HTTP/1.1" % path,
+        "Host: %s" % parts.netloc,
+        "Upgrade: websocket",
+        "Connection: Upgrade",
+        "Sec-WebSocket-Key: %s" % key,
+        "Sec-WebSocket-Version: 13",
+    ]
+    for k, v in (headers or {}).items():
+        lines.append("%s: %s" % (k, v))
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1'))
+
+    try:
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+    except BaseException:
+        writer.close()
+        raise
+    status, *header_lines = head.decode('latin-1').split("\r\n")
+    rheaders = {}
+    for line in header_lines:
+        if ":" in line:
+            k, v = line.split(":", 1)
+            rheaders[k.strip().lower()] = v.strip()
+    if status.split(" ", 2)[1] != "101" or rheaders.get("sec-websocket-accept") != AcceptKey(key):
+        writer.close()
+        raise ConnectionError("WebSocket handshake failed: " + status)
+    return WebSocket(reader, writer, client=True)
@@ -0,0 +1,259 @@
+#encoding=utf8
+
+# 基准回归检查：压测 test_json / test_http / test_middleware 用到的接口，结果存为 JSON 基线，
+# 之后每次运行与基线比较（bootstrap 置信区间），有显著变慢时返回非 0，用作升级 Puff/Nano 前的门禁
+#
+#   python bench.py --save baseline.json          记录基线
+#   python bench.py --baseline baseline.json      与基线比较，回归时退出码为 1
+#   python bench.py -k my/echo --rounds 10 --count 500 --baseline baseline.json
+#
+# 每个接口跑 rounds 轮，每轮 count 个请求、concurrency 个并发，基线按轮保存延迟样本和吞吐。
+# 比较时对当前/基线的统计量之比做分层 bootstrap（先抽轮次，再在轮内抽请求），轮与轮之间的抖动也计入区间，
+# 区间整体超出容差才算回归。p99 本身波动大，容差单独设置。
+# 限流接口（getlimiteddata、uploadfile、getcriticaldata 等）测的是限流器本身，不在此列。
+
+import os
+import sys
+import time
+import random
+import socket
+import asyncio
+import argparse
+import platform
+
+from aioclient import AsyncSession, Gather
+from loadgen import CheckApi
+import jsoncodec
+
+server = "http://127.0.0.1:5000"
+
+AUTH = {"Authorization": "Bearer valid-token-123"}
+
+# (名字, 路径, 请求体, 请求头, 期望的 stat)
+ENDPOINTS = [
+    ("ping", "/my/ping", None, None, "ok"),
+    ("echo", "/my/echo", {"name": "second", "count": 2}, None, "ok"),
+    ("echo-query", "/my/echo?name=first&count=1", None, None, "ok"),
+    ("swap", "/my/swap", {"x": 1, "y": 2}, None, "ok"),
+    ("div", "/my/div", {"x": 6, "y": 3}, None, "ok"),
+    ("throw", "/my/throw", {"code": "second", "m": "go"}, None, "second"),
+    ("cookie", "/my/cookie", None, {"Cookie": "name=mo; value=5"}, "ok"),
+    ("sayhello", "/my/sayhello?name=Yuki", None, None, None),
+    ("http-get", "/my/http?id=1&name=mao", None, None, None),
+    ("http-post", "/my/http?id=1", "mao", {"Content-Type": "text/plain"}, None),
+    ("publicdata", "/middlewareexample/getpublicdata", {}, None, "ok"),
+    ("userdata", "/middlewareexample/getuserdata", {}, AUTH, "ok"),
+    ("sensitivedata", "/middlewareexample/getsensitivedata", {}, None, "ok"),
+    ("secureuserdata", "/middlewareexample/getsecureuserdata", {}, AUTH, "ok"),
+    ("adminoperation", "/adminexample/adminoperation", {}, AUTH, "ok"),
+    ("secureinfo", "/securearea/getsecureinfo", {}, AUTH, "ok"),
+]
+
+PERCENTILES = (50, 90, 99)
+
+def CheckResponse(code, body, expect):
+    """与 loadgen.CheckApi 相同，但 /my/throw 这类接口期望的 stat 本来就不是 ok"""
+    if expect is None or expect == "ok":
+        return CheckApi(code, body)
+    if code != 200:
+        return "HTTP %d" % code
+    # 与 CheckApi 一样解析，但期望的错误没出现时要算失败，不能抛异常中断整个 bench
+    try:
+        r = jsoncodec.loads(body)
+    except ValueError:
+        return "not JSON"
+    if not isinstance(r, dict):
+        return "not an object"
+    stat = r.get("stat", "ok")
+    return None if stat == expect else str(stat)
+
+def Percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(len(sorted_values) * p / 100.0 + 0.5))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def Environment(server_url, server_header = None):
+    return {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "host": socket.gethostname(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "codec": jsoncodec.GetCodec().name,
+        "server": server_url,
+        "server_header": server_header,
+    }
+
+async def _Round(session, url, data, headers, expect, count, concurrency):
+    """跑一轮，返回 (延迟列表 us, 吞吐 req/s, 错误数, Server 响应头)"""
+    latencies = []
+    errors = [0]
+    server_header = [None]
+
+    async def one():
+        t0 = time.perf_counter_ns()
+        try:
+            code, rheaders, body = await session.request(url, headers, data)
+            error = CheckResponse(code, body, expect)
+            server_header[0] = rheaders.get("Server")
+        except Exception as e:
+            error = type(e).__name__
+        latencies.append((time.perf_counter_ns() - t0) / 1000.0)
+        if error is not None:
+            errors[0] += 1
+
+    start = time.perf_counter()
+    await Gather((one() for _ in range(count)), concurrency)
+    elapsed = time.perf_counter() - start
+    return (latencies, count / elapsed if elapsed else 0.0, errors[0], server_header[0])
+
+async def BenchEndpoint(url, data = None, headers = None, expect = "ok", rounds = 5, count = 200, concurrency = 8,
+        warmup = 50, max_samples = 5000):
+    """压测一个接口，返回可写入基线的结果"""
+    if data is not None and not isinstance(data, str):
+        data = jsoncodec.dumps(data)
+    async with AsyncSession(limit=concurrency) as session:
+        await _Round(session, url, data, headers, expect, warmup, concurrency)
+        latencies = []
+        samples = []
+        throughputs = []
+        errors = 0
+        server_header = None
+        for _ in range(rounds):
+            lat, tput, err, server_header = await _Round(session, url, data, headers, expect, count, concurrency)
+            latencies.extend(lat)
+            samples.append(_Thin(sorted(lat), max_samples // rounds))
+            throughputs.append(tput)
+            errors += err
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": sum(throughputs) / len(throughputs),
+        "throughputs": throughputs,
+        "latency": {"p%d" % p: Percentile(latencies, p) for p in PERCENTILES},
+        "samples": samples,
+        "server_header": server_header,
+    }
+
+def _Thin(sorted_values, n):
+    """均匀抽取 n 个保持分布形状，基线文件不至于过大"""
+    if len(sorted_values) <= n:
+        return [round(v, 1) for v in sorted_values]
+    step = len(sorted_values) / float(n)
+    return [round(sorted_values[int(i * step)], 1) for i in range(n)]
+
+def _Resample(groups, rnd):
+    """分层重抽样：有放回地抽轮次，再在每个抽中的轮次内有放回地抽样本"""
+    out = []
+    for g in rnd.choices(groups, k=len(groups)):
+        out.extend(rnd.choices(g, k=len(g)))
+    return out
+
+def Bootstrap(current, baseline, stat, resamples = 1000, confidence = 0.95, rnd = None):
+    """stat(current) / stat(baseline) 的 bootstrap 置信区间，返回 (比值, 下界, 上界)
+
+    current / baseline 为按轮分组的样本 [[...], [...]]。
+    """
+    rnd = rnd or random.Random(0)
+    base = stat([v for g in baseline for v in g])
+    ratio = stat([v for g in current for v in g]) / base if base else float("inf")
+    ratios = []
+    for _ in range(resamples):
+        b = stat(_Resample(baseline, rnd))
+        c = stat(_Resample(current, rnd))
+        ratios.append(c / b if b else float("inf"))
+    ratios.sort()
+    alpha = (1 - confidence) / 2
+    return (ratio, ratios[int(alpha * (resamples - 1))], ratios[int((1 - alpha) * (resamples - 1))])
+
+def _LatencyStat(p):
+    return lambda values: Percentile(sorted(values), p)
+
+def _Mean(values):
+    return sum(values) / len(values)
+
+def Compare(current, baseline, tolerance = 0.05, tail_tolerance = 0.2, resamples = 1000, confidence = 0.95):
+    """比较一个接口，返回 [(指标, 比值, 下界, 上界, 是否回归)]
+
+    延迟变大、吞吐变小为变差；置信区间整体越过 1 ± 容差才算回归。
+    """
+    rows = []
+    rnd = random.Random(0)
+    for p, tol in ((50, tolerance), (99, tail_tolerance)):
+        ratio, lo, hi = Bootstrap(current["samples"], baseline["samples"], _LatencyStat(p), resamples, confidence, rnd)
+        rows.append(("p%d" % p, ratio, lo, hi, lo > 1 + tol))
+    if len(current["throughputs"]) > 1 and len(baseline["throughputs"]) > 1:
+        ratio, lo, hi = Bootstrap([[t] for t in current["throughputs"]], [[t] for t in baseline["throughputs"]],
+            _Mean, resamples, confidence, rnd)
+        rows.append(("throughput", ratio, lo, hi, hi < 1 - tolerance))
+    if current["errors"] and not baseline["errors"]:
+        rows.append(("errors", float(current["errors"]), 0.0, 0.0, True))
+    return rows
+
+def Load(path):
+    with open(path, "rb") as f:
+        return jsoncodec.loads(f.read())
+
+def Save(path, result):
+    with open(path, "wb") as f:
+        f.write(jsoncodec.dumps(result))
+
+async def RunSuite(server_url, endpoints = ENDPOINTS, keyword = None, **kwargs):
+    results = {}
+    server_header = None
+    for name, path, data, headers, expect in endpoints:
+        if keyword and keyword not in name and keyword not in path:
+            continue
+        r = await BenchEndpoint(server_url + path, data, headers, expect, **kwargs)
+        server_header = r.pop("server_header") or server_header
+        results[name] = r
+        print("%-16s %9.1f req/s  p50 %8.2fms  p99 %8.2fms  错误 %d" % (
+            name, r["throughput"], r["latency"]["p50"] / 1000, r["latency"]["p99"] / 1000, r["errors"]))
+    return {"environment": Environment(server_url, server_header), "endpoints": results}
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="接口基准与回归检查")
+    parser.add_argument("--server", default=server)
+    parser.add_argument("--save", default=None, help="把本次结果写入基线文件")
+    parser.add_argument("--baseline", default=None, help="与基线比较，有回归时退出码为 1")
+    parser.add_argument("-k", "--keyword", default=None, help="只测名字或路径包含该字符串的接口")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--count", type=int, default=200, help="每轮请求数")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--tolerance", type=float, default=0.05, help="p50 和吞吐可接受的相对变化")
+    parser.add_argument("--tail-tolerance", type=float, default=0.2, help="p99 可接受的相对变化")
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--resamples", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(RunSuite(args.server, keyword=args.keyword,
+        rounds=args.rounds, count=args.count, concurrency=args.concurrency))
+    if args.save:
+        Save(args.save, result)
+        print("基线已写入 %s" % args.save)
+    if not args.baseline:
+        return 0
+
+    baseline = Load(args.baseline)
+    env = baseline["environment"]
+    print("")
+    print("基线: %s, %s, Python %s, %s" % (env["time"], env["host"], env["python"], env["server_header"]))
+    regressions = 0
+    for name, cur in result["endpoints"].items():
+        base = baseline["endpoints"].get(name)
+        if base is None:
+            print("%-16s 基线中没有" % name)
+            continue
+        for metric, ratio, lo, hi, bad in Compare(cur, base, args.tolerance, args.tail_tolerance, args.resamples, args.confidence):
+            if metric == "errors":
+                print("%-16s %-10s %d 个错误（基线没有）  回归" % (name, metric, ratio))
+            else:
+                print("%-16s %-10s x%.3f [%.3f, %.3f]%s" % (name, metric, ratio, lo, hi, "  回归" if bad else ""))
+            regressions += bad
+    print("%d 项回归" % regressions)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
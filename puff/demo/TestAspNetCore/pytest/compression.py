@@ -0,0 +1,170 @@
+#encoding=utf8
+
+# HTTP 内容编码：gzip / deflate（标准库 zlib），br（安装了 brotli 或 brotlicffi 时）
+# 响应按块增量解压，请求体可选压缩；命令行对比不同大小的 /my/echo 负载压缩后的字节数和 CPU 耗时
+#
+#   python compression.py
+#   python compression.py --server http://127.0.0.1:5000
+
+import sys
+import zlib
+import time
+import random
+import argparse
+
+import jsoncodec
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+# 按偏好排列
+ENCODINGS = (["br"] if brotli is not None else []) + ["gzip", "deflate"]
+
+def AcceptEncoding():
+    """本机能解的编码，用作 Accept-Encoding"""
+    return ", ".join(ENCODINGS)
+
+class Decoder:
+    """增量解压器：decompress(块) 返回已能解出的数据，最后调用 flush()"""
+
+    def __init__(self, encoding):
+        encoding = (encoding or "identity").strip().lower()
+        self.encoding = encoding
+        self._br = None
+        self._zlib = None
+        if encoding == "gzip" or encoding == "x-gzip":
+            self._zlib = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == "deflate":
+            pass
+        elif encoding == "br":
+            if brotli is None:
+                raise ValueError("brotli is not installed")
+            self._br = brotli.Decompressor()
+        elif encoding != "identity":
+            raise ValueError("unsupported content encoding: %s" % encoding)
+
+    def decompress(self, data, max_length = 0):
+        """max_length > 0 时单次输出不超过该长度，剩余输入留到下次（data 传 b"" 继续取）"""
+        if self.encoding == "deflate" and self._zlib is None:
+            # deflate 按规范是 zlib 格式，但有的服务器发裸 deflate，看第一个字节区分
+            wbits = zlib.MAX_WBITS if data and (data[0] & 0x0f) == 8 else -zlib.MAX_WBITS
+            self._zlib = zlib.decompressobj(wbits)
+        if self._zlib is not None:
+            return self._zlib.decompress(self._zlib.unconsumed_tail + bytes(data), max_length)
+        if self._br is not None:
+            return self._br.process(bytes(data))
+        return bytes(data)
+
+    def pending(self):
+        """max_length 限制下还有未解出的输入"""
+        return bool(self._zlib is not None and self._zlib.unconsumed_tail)
+
+    def flush(self):
+        if self._zlib is not None:
+            return self._zlib.flush()
+        return b""
+
+def Decompress(data, encoding):
+    """一次性解压完整响应体；支持多重编码（"gzip, br" 按相反顺序解）"""
+    if not encoding:
+        return data
+    for enc in reversed([e.strip() for e in encoding.split(",") if e.strip()]):
+        d = Decoder(enc)
+        data = d.decompress(data) + d.flush()
+    return data
+
+def Compress(data, encoding = "gzip", level = 6):
+    if encoding == "gzip":
+        c = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return c.compress(data) + c.flush()
+    if encoding == "deflate":
+        return zlib.compress(data, level)
+    if encoding == "br":
+        if brotli is None:
+            raise ValueError("brotli is not installed")
+        return brotli.compress(bytes(data), quality=min(level, 11))
+    raise ValueError("unsupported content encoding: %s" % encoding)
+
+WORDS = ("puff", "nano", "ice", "api", "echo", "stat", "ok", "name", "count", "user", "room", "message",
+    "hello", "world", "server", "client", "request", "response", "cookie", "query")
+
+def EchoPayload(size, seed = 1):
+    """构造约 size 字节、结构接近真实业务数据的 JSON（记录列表），全是同一个字符的负载会高估压缩率"""
+    rnd = random.Random(seed)
+    items = []
+    total = 0
+    while total < size:
+        item = {"id": rnd.randrange(1 << 31), "name": " ".join(rnd.choice(WORDS) for _ in range(rnd.randrange(1, 6))),
+            "score": round(rnd.random() * 1000, 3), "tags": [rnd.choice(WORDS) for _ in range(rnd.randrange(0, 4))]}
+        items.append(item)
+        total += len(jsoncodec.dumps(item)) + 1
+    return jsoncodec.dumps({"name": "payload", "count": len(items), "items": items})
+
+def _Time(fn, budget = 0.2):
+    n = 0
+    t0 = time.perf_counter()
+    while True:
+        fn()
+        n += 1
+        elapsed = time.perf_counter() - t0
+        if elapsed >= budget:
+            return elapsed / n
+
+def Benchmark(sizes = (1000, 10000, 100000, 1000000), levels = (1, 6, 9)):
+    """返回 [(size, encoding, level, 压缩后字节数, 压缩us, 解压us)]"""
+    rows = []
+    for size in sizes:
+        data = EchoPayload(size)
+        rows.append((len(data), "identity", 0, len(data), 0.0, 0.0))
+        for enc in ENCODINGS:
+            for level in levels:
+                packed = Compress(data, enc, level)
+                assert Decompress(packed, enc) == data
+                rows.append((len(data), enc, level, len(packed),
+                    _Time(lambda: Compress(data, enc, level)) * 1e6, _Time(lambda: Decompress(packed, enc)) * 1e6))
+    return rows
+
+def BenchmarkServer(server, sizes = (1000, 10000, 100000, 1000000)):
+    """往返 /my/echo，返回 [(size, 请求线路字节, 响应线路字节, 响应编码, 平均 ms)]，分别不压缩和协商压缩
+
+    请求体压缩要求服务端启用 RequestDecompression，这里只协商响应压缩。
+    """
+    from httpclient import Session
+    rows = []
+    for compression in (False, True):
+        timings = []
+        with Session(cookies=False, compression=compression, on_timing=timings.append) as session:
+            for size in sizes:
+                body = jsoncodec.dumps({"name": EchoPayload(size).decode('utf-8'), "count": size})
+                del timings[:]
+                for _ in range(10):
+                    code, headers, data = session.request(server + "/my/echo", None, body)
+                    assert code == 200 and jsoncodec.loads(data)["count"] == size
+                total = sum(t.total for t in timings) / len(timings) / 1e6
+                rows.append((size, len(body), timings[-1].size, headers.get("Content-Encoding") or "identity", total))
+    return rows
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="压缩率与 CPU 耗时对比")
+    parser.add_argument("--size", type=int, action="append", default=None)
+    parser.add_argument("--server", default=None, help="指定时检查服务器对 /my/echo 是否压缩以及线路字节数")
+    args = parser.parse_args(argv)
+    sizes = args.size or [1000, 10000, 100000, 1000000]
+
+    print("可用编码: %s" % ", ".join(ENCODINGS))
+    print("%10s %-8s %5s %10s %7s %12s %12s" % ("原始字节", "编码", "级别", "压缩后", "比例", "压缩us", "解压us"))
+    for size, enc, level, n, cus, dus in Benchmark(sizes):
+        print("%10d %-8s %5s %10d %6.1f%% %12.1f %12.1f" % (size, enc, level or "-", n, 100.0 * n / size, cus, dus))
+    if args.server:
+        print("")
+        for size, sent, received, enc, ms in BenchmarkServer(args.server, sizes):
+            print("/my/echo %8d: 请求 %d 字节, 响应线路 %d 字节 (%s), %.3fms" % (size, sent, received, enc, ms))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+#encoding=utf8
+
+# 固定分桶的延迟直方图（对数-线性分桶，类似 HdrHistogram），单位微秒
+
+from array import array
+
+SUB_BITS = 7
+SUB_COUNT = 1 << SUB_BITS
+MAX_BITS = 40                      # 2^40 us，约 12.7 天
+BUCKET_COUNT = (MAX_BITS - SUB_BITS + 1) * SUB_COUNT
+
+def BucketIndex(v):
+    """值 -> 桶下标；小于 256 的值精确记录，其余相对误差不超过 1/128"""
+    shift = v.bit_length() - (SUB_BITS + 1)
+    if shift <= 0:
+        return v
+    return shift * SUB_COUNT + (v >> shift)
+
+def BucketRange(idx):
+    """桶下标 -> 该桶覆盖的 [lower, upper] 值范围"""
+    if idx < 2 * SUB_COUNT:
+        return (idx, idx)
+    shift = idx // SUB_COUNT - 1
+    top = idx - shift * SUB_COUNT
+    return (top << shift, ((top + 1) << shift) - 1)
+
+class Histogram:
+    """可合并的延迟直方图：分桶布局固定，合并只需逐桶相加，结果与单个直方图记录全部样本完全一致"""
+
+    def __init__(self):
+        self.counts = array('Q', bytes(8 * BUCKET_COUNT))
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def record(self, v, n = 1):
+        v = int(v)
+        if v < 0:
+            v = 0
+        idx = BucketIndex(v)
+        if idx >= BUCKET_COUNT:
+            idx = BUCKET_COUNT - 1
+        self.counts[idx] += n
+        self.count += n
+        self.total += v * n
+        if self.min is None or v < self.min:
+            self.min = v
+        if self.max is None or v > self.max:
+            self.max = v
+
+    def merge(self, other):
+        counts = self.counts
+        for idx, n in enumerate(other.counts):
+            if n:
+                counts[idx] += n
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+        return self
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p):
+        """第 p 百分位（0-100），返回所在桶的上界，并截断到实际最大值"""
+        if self.count == 0:
+            return 0
+        rank = max(1, int(self.count * p / 100.0 + 0.5))
+        seen = 0
+        for idx, n in enumerate(self.counts):
+            if n:
+                seen += n
+                if seen >= rank:
+                    return min(BucketRange(idx)[1], self.max)
+        return self.max
+
+    def percentiles(self, ps = (50, 90, 99, 99.9)):
+        return {p: self.percentile(p) for p in ps}
+
+    def to_dict(self):
+        """稀疏表示，便于写 JSON 或跨进程传递"""
+        return {
+            "count": self.count, "total": self.total, "min": self.min, "max": self.max,
+            "buckets": {str(idx): n for idx, n in enumerate(self.counts) if n},
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        h = cls()
+        for idx, n in d["buckets"].items():
+            h.counts[int(idx)] = n
+        h.count = d["count"]
+        h.total = d["total"]
+        h.min = d["min"]
+        h.max = d["max"]
+        return h
+
+def FormatLatency(h, ps = (50, 90, 99, 99.9)):
+    """按毫秒格式化直方图的分位数"""
+    items = ["p%s=%.2fms" % (("%g" % p), h.percentile(p) / 1000.0) for p in ps]
+    items.append("max=%.2fms" % ((h.max or 0) / 1000.0))
+    return " ".join(items)
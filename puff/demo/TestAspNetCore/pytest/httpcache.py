@@ -0,0 +1,157 @@
+#encoding=utf8
+
+# 客户端响应缓存：按接口配置 TTL，条目数和字节数双上限的 LRU，支持 Cache-Control / ETag 再验证
+#
+#   cache = ResponseCache({"/my/ping": 60, "/my/GetHost": 300}, max_entries=1024, max_bytes=16 << 20)
+#   session = Session(cookies=False, cache=cache)
+#   RequestRaw(server + "/my/ping", session=session)
+#
+# 与服务端 SimpleCacheMiddleware 对应，只缓存显式配置了 TTL 的接口（Puff 的 IceApi 都能 POST，
+# 是否为纯读取只有调用方知道）。
+
+import time
+import threading
+import collections
+import urllib.parse
+
+# 影响响应内容、要计入缓存键的请求头：Puff 会把 Cookie 合并进参数，
+# 认证中间件按 Authorization 区分用户，限流和审计按 X-Forwarded-For / X-Real-IP 区分客户端
+VARY = ("Cookie", "Authorization", "X-Forwarded-For", "X-Real-IP")
+
+def ParseCacheControl(value):
+    """解析 Cache-Control，返回 {指令: 值或 None}"""
+    out = {}
+    for part in (value or "").split(","):
+        name, _, arg = part.strip().partition("=")
+        if name:
+            out[name.lower()] = arg.strip('"') if arg else None
+    return out
+
+class _Entry:
+    __slots__ = ("code", "headers", "body", "expires", "etag", "modified", "size")
+
+    def __init__(self, code, headers, body, expires):
+        self.code = code
+        self.headers = headers
+        self.body = body
+        self.expires = expires
+        self.etag = headers.get("ETag")
+        self.modified = headers.get("Last-Modified")
+        # 头部按粗略长度计入，避免只看 body 时小响应占满内存
+        self.size = len(body) + sum(len(k) + len(v) for k, v in headers.items())
+
+class ResponseCache:
+    """线程安全的响应缓存，由 httpclient.Session 在发请求前后调用"""
+
+    def __init__(self, ttls = None, default_ttl = None, max_entries = 1024, max_bytes = 16 << 20, clock = time.monotonic,
+            vary = VARY):
+        # 路由不区分大小写，按小写路径匹配
+        self.ttls = {k.lower(): v for k, v in (ttls or {}).items()}
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.vary = tuple(h.lower() for h in vary)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def ttl(self, url):
+        path = urllib.parse.urlsplit(url).path.lower()
+        return self.ttls.get(path, self.default_ttl)
+
+    def request(self, fetch, method, url, headers, data):
+        """fetch(method, url, headers, data) -> (code, headers, body)，命中时不调用"""
+        ttl = self.ttl(url)
+        if ttl is None or method not in ("GET", "POST"):
+            return fetch(method, url, headers, data)
+
+        key = self.key(method, url, headers, data)
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if now < entry.expires:
+                    self.hits += 1
+                    return (entry.code, entry.headers, entry.body)
+            self.misses += 1
+
+        if entry is not None and (entry.etag or entry.modified):
+            # 过期但有验证器，带条件头再验证
+            headers = dict(headers)
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.modified:
+                headers["If-Modified-Since"] = entry.modified
+        code, rheaders, body = fetch(method, url, headers, data)
+
+        if code == 304 and entry is not None:
+            with self._lock:
+                self.revalidated += 1
+                entry.expires = self._expires(rheaders, ttl, self.clock())
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+            return (entry.code, entry.headers, entry.body)
+        if code == 200:
+            self._store(key, code, rheaders, body, ttl)
+        elif entry is not None:
+            self._remove(key)
+        return (code, rheaders, body)
+
+    def key(self, method, url, headers, data):
+        """缓存键：方法、URL、请求体和 vary 中列出的请求头"""
+        lowered = {k.lower(): v for k, v in headers.items()}
+        return (method, url, None if data is None else bytes(data), tuple(lowered.get(h) for h in self.vary))
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "revalidated": self.revalidated,
+                "evictions": self.evictions, "entries": len(self._entries), "bytes": self.bytes}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def _expires(self, headers, ttl, now):
+        cc = ParseCacheControl(headers.get("Cache-Control"))
+        if "no-cache" in cc:
+            return now
+        if cc.get("max-age") is not None:
+            try:
+                return now + min(ttl, int(cc["max-age"]))
+            except ValueError:
+                pass
+        return now + ttl
+
+    def _store(self, key, code, headers, body, ttl):
+        cc = ParseCacheControl(headers.get("Cache-Control"))
+        if "no-store" in cc:
+            self._remove(key)
+            return
+        entry = _Entry(code, headers, body, self._expires(headers, ttl, self.clock()))
+        # no-cache 或 max-age=0 且没有验证器时存了也用不上
+        if entry.size > self.max_bytes or (entry.expires <= self.clock() and not (entry.etag or entry.modified)):
+            self._remove(key)
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old.size
+            self._entries[key] = entry
+            self.bytes += entry.size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self.bytes -= old.size
+                self.evictions += 1
+
+    def _remove(self, key):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old.size
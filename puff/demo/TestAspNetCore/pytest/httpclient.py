@@ -0,0 +1,412 @@
+#encoding=utf8
+
+# 共享的 HTTP 客户端：按 host 维护 HTTP/1.1 长连接池，替代每次调用都新建连接的 urlopen
+
+import time
+import threading
+import http.client
+import http.cookiejar
+import urllib.parse
+import urllib.request
+
+import jsoncodec
+import compression
+
+class IceApiError(Exception):
+    """IceApi 返回的 stat 不是 ok"""
+
+    def __init__(self, stat, m = None):
+        Exception.__init__(self, stat if m is None else "%s: %s" % (stat, m))
+        self.stat = stat
+        self.m = m
+
+# 服务器关闭空闲长连接后，复用该连接发送请求时会遇到的异常
+_STALE_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError, ConnectionAbortedError)
+
+class RequestTiming:
+    """一次请求各阶段的耗时（纳秒，time.perf_counter_ns）
+
+    connect: 建立连接（含 TLS），复用连接时为 0；write: 写出请求；ttfb: 写完到收齐响应头，
+    即网络往返加服务器处理时间；body: 读响应体；total: 从取连接到读完，含失效连接的重试。
+    """
+
+    __slots__ = ("method", "url", "code", "reused", "size", "connect", "write", "ttfb", "body", "total")
+
+    def __init__(self, method, url):
+        self.method = method
+        self.url = url
+        self.code = None
+        self.reused = False
+        self.size = 0
+        self.connect = 0
+        self.write = 0
+        self.ttfb = 0
+        self.body = 0
+        self.total = 0
+
+    def __repr__(self):
+        return "<%s %s %s connect=%.3fms write=%.3fms ttfb=%.3fms body=%.3fms total=%.3fms>" % (
+            self.method, self.url, self.code, self.connect / 1e6, self.write / 1e6,
+            self.ttfb / 1e6, self.body / 1e6, self.total / 1e6)
+
+class ConnectionPool:
+    """单个 (scheme, host, port) 的长连接池"""
+
+    def __init__(self, scheme, host, port, maxsize = 16, timeout = 30, blocksize = 65536):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.maxsize = maxsize
+        self.timeout = timeout
+        # 上传文件对象时每次读取并发送的字节数
+        self.blocksize = blocksize
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def new_conn(self):
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout, blocksize=self.blocksize)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout, blocksize=self.blocksize)
+
+    def acquire(self):
+        """取出一个连接，返回 (conn, 是否为复用连接)"""
+        with self._lock:
+            if self._idle:
+                return (self._idle.pop(), True)
+        return (self.new_conn(), False)
+
+    def release(self, conn):
+        with self._lock:
+            if len(self._idle) < self.maxsize:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+class Session:
+    """持有各 host 连接池和会话级 Cookie 的客户端
+
+    Puff 会把请求 Cookie 合并进 IceApi 参数，所以 Cookie 只在显式创建的会话内保持，
+    模块级的 RequestRaw 等函数使用不带 Cookie 的默认会话（与 urlopen 行为一致）。
+
+    compression=True 时发送 Accept-Encoding 并透明解压响应（headers 保留原始的 Content-Encoding），
+    compress_threshold 不为 None 时大于等于该字节数的定长请求体用 gzip 压缩后发送
+    （服务端需要启用 RequestDecompression）。
+
+    trace 为 httptrace.CaptureWriter 时记录每个请求（含命中响应缓存的），供 httptrace.py 回放。
+    """
+
+    def __init__(self, cookies = True, maxsize = 16, timeout = 30, cache = None, headers = None, on_timing = None, blocksize = 65536,
+            compression = False, compress_threshold = None, compress_level = 6, trace = None):
+        self.cookiejar = http.cookiejar.CookieJar() if cookies else None
+        self.compression = compression
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+        # on_timing(RequestTiming) 在每个实际发出的请求完成后调用，不设置时不计时
+        self.on_timing = on_timing
+        # 每个请求都带上的默认头（如区分客户端身份的 X-Forwarded-For），调用者指定的同名头优先
+        self.headers = dict(headers) if headers else {}
+        self.cache = cache
+        self.trace = trace
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.blocksize = blocksize
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def pool(self, url):
+        parts = urllib.parse.urlsplit(url) if isinstance(url, str) else url
+        scheme = parts.scheme or "http"
+        port = parts.port or (443 if scheme == "https" else 80)
+        key = (scheme, parts.hostname, port)
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(scheme, parts.hostname, port, self.maxsize, self.timeout, self.blocksize)
+                self._pools[key] = pool
+        return pool
+
+    def request(self, url, headers = None, data = None, method = None):
+        """发送请求，返回 (code, headers, body)，body 为 bytes
+
+        data 可以是 str / bytes / mmap 等定长缓冲区，也可以是文件对象或 bytes 迭代器，
+        后两种按 chunked 编码边读边发，不会整体读入内存。
+        """
+        method, headers, data = self._prepare(url, headers, data, method)
+        if self.trace is not None:
+            self.trace.record(self, method, url, headers, data if IsBuffer(data) else None)
+        if self.cache is not None and (data is None or IsBuffer(data)):
+            # 见 httpcache.ResponseCache，命中时不发请求
+            return self.cache.request(self._fetch, method, url, headers, data)
+        return self._fetch(method, url, headers, data)
+
+    def stream(self, url, headers = None, data = None, method = None):
+        """发送请求但不读响应体，返回 StreamResponse，由调用者分块读取
+
+        收到响应头即返回，请求体的写法与 request 相同；不经过响应缓存。
+        """
+        method, headers, data = self._prepare(url, headers, data, method)
+        if self.trace is not None:
+            self.trace.record(self, method, url, headers, data if IsBuffer(data) else None)
+        timing = RequestTiming(method, url) if self.on_timing is not None else None
+        pool, conn, resp, reused = self._open(method, url, headers, data, timing)
+        if self.cookiejar is not None:
+            self.cookiejar.extract_cookies(resp, urllib.request.Request(url))
+        return StreamResponse(self, pool, conn, resp, reused, timing)
+
+    def close(self):
+        with self._lock:
+            pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            pool.close()
+
+    def _prepare(self, url, headers, data, method):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        if method is None:
+            method = "POST" if data is not None else "GET"
+        hdrs = dict(self.headers)
+        if headers:
+            names = set(k.lower() for k in headers)
+            hdrs = {k: v for k, v in hdrs.items() if k.lower() not in names}
+            hdrs.update(headers)
+        names = set(k.lower() for k in hdrs)
+        if self.compression and "accept-encoding" not in names:
+            hdrs["Accept-Encoding"] = compression.AcceptEncoding()
+        if (self.compress_threshold is not None and "content-encoding" not in names
+                and IsBuffer(data) and len(memoryview(data)) >= self.compress_threshold):
+            data = compression.Compress(data, "gzip", self.compress_level)
+            hdrs["Content-Encoding"] = "gzip"
+        self._add_cookies(url, hdrs)
+        return (method, hdrs, data)
+
+    def _open(self, method, url, headers, data, timing):
+        """发出请求并读到响应头，返回 (pool, conn, resp, reused)"""
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        if timing is not None:
+            timing.total = time.perf_counter_ns()
+        # 流式请求体重试前要回到起点，不能回退的迭代器不重试
+        pos = data.tell() if hasattr(data, "seek") and hasattr(data, "tell") else None
+        pool = self.pool(parts)
+        conn, reused = pool.acquire()
+        try:
+            resp = self._send(conn, method, path, headers, data, timing)
+        except _STALE_ERRORS:
+            if not reused or not (data is None or IsBuffer(data) or pos is not None):
+                raise
+            if pos is not None:
+                data.seek(pos)
+            # 复用的连接已被服务器关闭，换新连接重试一次
+            conn = pool.new_conn()
+            reused = False
+            resp = self._send(conn, method, path, headers, data, timing)
+        return (pool, conn, resp, reused)
+
+    def _fetch(self, method, url, headers, data):
+        timing = RequestTiming(method, url) if self.on_timing is not None else None
+        pool, conn, resp, reused = self._open(method, url, headers, data, timing)
+        try:
+            t = time.perf_counter_ns()
+            body = resp.read()
+        except Exception:
+            conn.close()
+            raise
+        if timing is not None:
+            end = time.perf_counter_ns()
+            timing.body = end - t
+            timing.total = end - timing.total
+            timing.code = resp.status
+            timing.reused = reused
+            timing.size = len(body)
+            self.on_timing(timing)
+        if resp.will_close:
+            conn.close()
+        else:
+            pool.release(conn)
+
+        if self.cookiejar is not None:
+            self.cookiejar.extract_cookies(resp, urllib.request.Request(url))
+        if self.compression:
+            body = compression.Decompress(body, resp.headers.get("Content-Encoding"))
+        return (resp.status, resp.headers, body)
+
+    def _send(self, conn, method, path, headers, data, timing = None):
+        try:
+            if timing is None:
+                conn.request(method, path, body=data, headers=headers)
+                return conn.getresponse()
+            # 先单独建立连接，才能把建连和写请求分开计时
+            t0 = time.perf_counter_ns()
+            if conn.sock is None:
+                conn.connect()
+            t1 = time.perf_counter_ns()
+            conn.request(method, path, body=data, headers=headers)
+            t2 = time.perf_counter_ns()
+            resp = conn.getresponse()
+            timing.connect = t1 - t0
+            timing.write = t2 - t1
+            timing.ttfb = time.perf_counter_ns() - t2
+            return resp
+        except Exception:
+            conn.close()
+            raise
+
+    def _add_cookies(self, url, headers):
+        # 调用者显式指定的 Cookie 优先
+        if self.cookiejar is None or any(k.lower() == "cookie" for k in headers):
+            return
+        req = urllib.request.Request(url)
+        self.cookiejar.add_cookie_header(req)
+        cookie = req.get_header("Cookie")
+        if cookie:
+            headers["Cookie"] = cookie
+
+def IsBuffer(data):
+    """定长请求体（bytes / bytearray / memoryview / mmap 等支持缓冲区协议的对象）"""
+    if data is None or hasattr(data, "read"):
+        return False
+    try:
+        memoryview(data).release()
+        return True
+    except TypeError:
+        return False
+
+class StreamResponse:
+    """流式响应：用固定大小的缓冲区分块读取响应体，内存占用与响应大小无关
+
+    读完（或 close）之后连接放回连接池；没读完就关闭时连接不能复用，直接断开。
+    会话开启 compression 时 iter_content / read 产出解压后的内容（readinto 读的是线路上的原始字节），
+    size 始终是线路字节数。
+    """
+
+    def __init__(self, session, pool, conn, resp, reused, timing = None):
+        self.status = resp.status
+        self.headers = resp.headers
+        self.size = 0
+        self._session = session
+        self._pool = pool
+        self._conn = conn
+        self._resp = resp
+        self._reused = reused
+        self._timing = timing
+        self._start = time.perf_counter_ns()
+        encoding = resp.headers.get("Content-Encoding") if session.compression else None
+        self._decoder = compression.Decoder(encoding) if encoding else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        return self.iter_content()
+
+    def readinto(self, buf):
+        try:
+            n = self._resp.readinto(buf)
+        except Exception:
+            self._conn.close()
+            self._conn = None
+            raise
+        self.size += n
+        return n
+
+    def iter_content(self, chunk_size = 65536):
+        """逐块产出响应体；产出的是同一个缓冲区的 memoryview，下一次迭代前要用完或拷贝
+
+        压缩的响应边读边解压，每块解压输出不超过 chunk_size（br 除外），压缩率再高也不会一次解出整个响应。
+        """
+        buf = bytearray(chunk_size)
+        decoder = self._decoder
+        with memoryview(buf) as view:
+            while True:
+                n = self.readinto(buf)
+                if not n:
+                    break
+                if decoder is None:
+                    yield view[:n]
+                    continue
+                out = decoder.decompress(view[:n], chunk_size)
+                while out:
+                    yield out
+                    out = decoder.decompress(b"", chunk_size) if decoder.pending() else b""
+            if decoder is not None:
+                out = decoder.flush()
+                if out:
+                    yield out
+        self.close()
+
+    def read(self):
+        """读取剩余的全部内容（小响应用）"""
+        data = self._resp.read()
+        self.size += len(data)
+        self.close()
+        if self._decoder is not None:
+            data = self._decoder.decompress(data) + self._decoder.flush()
+        return data
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        if self._timing is not None:
+            end = time.perf_counter_ns()
+            self._timing.body = end - self._start
+            self._timing.total = end - self._timing.total
+            self._timing.code = self.status
+            self._timing.reused = self._reused
+            self._timing.size = self.size
+            self._session.on_timing(self._timing)
+        if self._resp.isclosed() and not self._resp.will_close:
+            self._pool.release(conn)
+        else:
+            self._resp.close()
+            conn.close()
+
+_session = Session(cookies=False)
+
+def DefaultSession():
+    return _session
+
+def SetCache(cache):
+    """给默认会话挂上响应缓存（httpcache.ResponseCache），传 None 关闭"""
+    _session.cache = cache
+
+def RequestRaw(url, headers = {}, data = None, session = None):
+    session = session or _session
+    code, headers, data = session.request(url, headers, data)
+    # 与 urlopen 一致：非 2xx 不返回内容
+    if code < 200 or code >= 300:
+        return (code, headers, None)
+    return (code, headers, data.decode('utf-8'))
+
+# 下面几个 JSON 帮助函数直接在 bytes 上编解码（见 jsoncodec），不经过 str
+
+def RequestApi(url, **kwargs):
+    return RequestApiObj(url, kwargs)
+
+def RequestApiObj(url, obj):
+    data = jsoncodec.dumps(obj) if obj != None else None
+    code, headers, body = _session.request(url, None, data)
+    assert code == 200
+    return jsoncodec.loads(body)
+
+def RequestHttp(url, headers = {}, data = None):
+    code, headers, body = _session.request(url, headers, data)
+    assert code == 200
+    return jsoncodec.loads(body)
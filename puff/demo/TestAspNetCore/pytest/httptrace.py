@@ -0,0 +1,332 @@
+#encoding=utf8
+
+# HTTP 流量采集与按原始时间间隔回放：把 IceApi 请求记录成轨迹，或从服务器访问日志导入，再按倍速重放
+#
+#   python httptrace.py import access.log -o access.trace.gz      Common/Combined Log Format 或 W3C（#Fields:）日志
+#   python httptrace.py stats access.trace.gz
+#   python httptrace.py replay access.trace.gz --speed 10 --copies 4
+#   python httptrace.py replay access.trace.gz --speed max --ordered
+#
+# 录制：Session(trace=CaptureWriter("x.trace")) 或 AsyncSession(trace=w)，每个会话是一条流（stream），一个 CaptureWriter 可以给多个会话共用。
+#
+# 格式：每行一个 JSON，.gz 结尾时 gzip 压缩。第一行是头 {"httptrace":1,...}，之后每行一个请求：
+#   [t, stream, method, path, query, headers, body]
+# t 为相对录制开始的秒数；stream 为发起请求的客户端（会话编号或访问日志里的 IP）；
+# body 为 null、UTF-8 文本，或 {"base64": "..."}。
+#
+# 回放时每个请求在 开始时间 + t / speed 发出，不等前一个返回（--ordered 时同一条流内等前一个返回），
+# 访问日志只精确到秒，同一秒内的请求均匀分布在这一秒里。
+# --copies N 把轨迹复制 N 份同时回放，每份的流使用不同的 X-Forwarded-For，RateLimitMiddleware 会把它们当成不同客户端。
+
+import re
+import sys
+import time
+import base64
+import asyncio
+import argparse
+import calendar
+import itertools
+import urllib.parse
+
+from aioclient import AsyncSession
+from histogram import Histogram, FormatLatency
+from loadgen import CheckApi
+import tracefile
+
+server = "http://127.0.0.1:5000"
+VERSION = 1
+
+# 由客户端按连接生成的头，不录制也不回放
+HOP_HEADERS = {"host", "content-length", "connection", "transfer-encoding", "keep-alive", "accept-encoding"}
+
+def EncodeBody(data):
+    if data is None:
+        return None
+    data = bytes(data)
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError:
+        return {"base64": base64.b64encode(data).decode('ascii')}
+
+def DecodeBody(body):
+    if body is None:
+        return None
+    if isinstance(body, dict):
+        return base64.b64decode(body["base64"])
+    return body.encode('utf-8')
+
+class CaptureWriter(tracefile.TraceFile):
+    """线程安全，可供多个 Session / AsyncSession 共用"""
+
+    def __init__(self, path, clock = time.monotonic, **header):
+        tracefile.TraceFile.__init__(self, path, "httptrace", VERSION, clock, **header)
+
+    @property
+    def requests(self):
+        return self.rows
+
+    def record(self, stream, method, url, headers, data):
+        """stream 为发起请求的会话对象，第一次出现时分配编号；data 不是定长缓冲区时记为 null"""
+        parts = urllib.parse.urlsplit(url)
+        hdrs = {k: v for k, v in (headers or {}).items() if k.lower() not in HOP_HEADERS}
+        self.append(stream, [method, parts.path or "/", parts.query, hdrs, EncodeBody(data)])
+
+def ReadCapture(path):
+    """返回 (头, 请求列表)，按时间排序"""
+    return tracefile.ReadTrace(path, "httptrace", VERSION)
+
+def WriteCapture(path, records, **header):
+    return tracefile.WriteTrace(path, "httptrace", VERSION, records, **header)
+
+# 127.0.0.1 - - [10/Oct/2024:13:55:36 +0800] "GET /my/ping?x=1 HTTP/1.1" 200 12 "referer" "user-agent"
+_CLF_RE = re.compile(r'(\S+) \S+ \S+ \[([^\]]+)\] "(\S+) (\S+)[^"]*" (\d{3}|-) (\S+)(?: "([^"]*)" "([^"]*)")?')
+_MONTHS = {m: i + 1 for i, m in enumerate(("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"))}
+
+def _ClfTime(s):
+    # 10/Oct/2024:13:55:36 +0800，不用 strptime 的 %b，避免受 locale 影响
+    date, _, zone = s.partition(" ")
+    day, mon, rest = date.split("/", 2)
+    year, hh, mm, ss = rest.split(":")
+    t = calendar.timegm((int(year), _MONTHS[mon], int(day), int(hh), int(mm), int(float(ss)), 0, 0, 0))
+    if zone:
+        sign = -1 if zone[0] == "-" else 1
+        t -= sign * (int(zone[1:3]) * 3600 + int(zone[3:5]) * 60)
+    return t + float(ss) % 1
+
+def _W3cTime(date, clock):
+    t = calendar.timegm(time.strptime(date + " " + clock.split(".")[0], "%Y-%m-%d %H:%M:%S"))
+    return t + (float("0." + clock.split(".")[1]) if "." in clock else 0.0)
+
+def ParseAccessLog(lines):
+    """解析访问日志，返回 [(时间戳, 客户端 IP, method, path, query, headers)]，不认识的行跳过
+
+    支持 Common/Combined Log Format（nginx、Apache）和 W3C 扩展格式（IIS、ASP.NET Core W3CLogger，按 #Fields: 取列）。
+    """
+    out = []
+    fields = None
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line:
+            continue
+        if line.startswith("#"):
+            if line.startswith("#Fields:"):
+                fields = line[8:].split()
+            continue
+        if fields is not None:
+            row = dict(zip(fields, line.split(" ")))
+            if "cs-method" not in row or "cs-uri-stem" not in row:
+                continue
+            query = row.get("cs-uri-query", "-")
+            headers = {}
+            for name in ("User-Agent", "Referer", "Cookie"):
+                v = row.get("cs(%s)" % name, "-")
+                if v != "-":
+                    headers[name] = v.replace("+", " ") if name == "User-Agent" else v
+            out.append((_W3cTime(row.get("date", "1970-01-01"), row.get("time", "00:00:00")), row.get("c-ip", "unknown"),
+                row["cs-method"], row["cs-uri-stem"], "" if query == "-" else query, headers))
+            continue
+        m = _CLF_RE.match(line)
+        if m is None:
+            continue
+        ip, stamp, method, target, _, _, referer, agent = m.groups()
+        parts = urllib.parse.urlsplit(target)
+        headers = {}
+        if referer and referer != "-":
+            headers["Referer"] = referer
+        if agent and agent != "-":
+            headers["User-Agent"] = agent
+        out.append((_ClfTime(stamp), ip, method, parts.path or "/", parts.query, headers))
+    return out
+
+def ImportAccessLog(lines):
+    """访问日志转成轨迹记录；流为客户端 IP，并以 X-Forwarded-For 带上，限流按原来的客户端区分
+
+    日志里没有请求体，POST 按空 JSON 对象回放（IceApi 的参数都从 query 取）。
+    同一秒内的请求在这一秒内均匀展开，保留到达顺序。
+    """
+    entries = ParseAccessLog(lines)
+    if not entries:
+        return []
+    entries.sort(key=lambda e: e[0])
+    base = entries[0][0]
+    records = []
+    i = 0
+    while i < len(entries):
+        j = i
+        while j < len(entries) and entries[j][0] == entries[i][0]:
+            j += 1
+        spread = 1.0 / (j - i) if entries[i][0] == int(entries[i][0]) else 0.0
+        for k in range(i, j):
+            t, ip, method, path, query, headers = entries[k]
+            headers = dict(headers)
+            headers["X-Forwarded-For"] = ip
+            body = "{}" if method == "POST" else None
+            records.append([round(t - base + (k - i) * spread, 6), ip, method, path, query, headers, body])
+        i = j
+    return records
+
+def Stats(records):
+    streams = set()
+    endpoints = {}
+    for r in records:
+        streams.add(r[1])
+        key = "%s %s" % (r[2], r[3].lower())
+        endpoints[key] = endpoints.get(key, 0) + 1
+    duration = records[-1][0] - records[0][0] if records else 0.0
+    return {"requests": len(records), "streams": len(streams), "duration": duration,
+        "rate": len(records) / duration if duration else 0.0, "endpoints": endpoints}
+
+def CopyAddress(n):
+    """第 n 份副本流使用的 X-Forwarded-For，取自基准测试保留网段 198.18.0.0/15"""
+    return "198.%d.%d.%d" % (18 + ((n >> 16) & 1), (n >> 8) & 0xff, n & 0xff)
+
+class ReplayResult:
+    def __init__(self):
+        self.latency = Histogram()      # us
+        self.lag = Histogram()          # 实际发出晚于计划的量 us
+        self.endpoints = {}             # "METHOD /path" -> [Histogram, 次数, 错误数]
+        self.errors = {}
+        self.sent = 0
+        self.completed = 0
+        self.streams = 0
+        self.elapsed = 0.0
+        self.trace_duration = 0.0
+
+    def record(self, key, us, error):
+        self.latency.record(us)
+        self.completed += 1
+        entry = self.endpoints.get(key)
+        if entry is None:
+            entry = self.endpoints[key] = [Histogram(), 0, 0]
+        entry[0].record(us)
+        entry[1] += 1
+        if error is not None:
+            entry[2] += 1
+            self.errors[error] = self.errors.get(error, 0) + 1
+
+    def report(self):
+        errors = sum(self.errors.values())
+        lines = [
+            "请求: %d, 流: %d, 轨迹时长 %.1fs, 回放耗时 %.1fs (实际倍速 x%.1f)" % (
+                self.sent, self.streams, self.trace_duration, self.elapsed,
+                self.trace_duration / self.elapsed if self.elapsed else 0.0),
+            "吞吐: %.1f req/s, 失败: %d (%.2f%%)" % (
+                self.completed / self.elapsed if self.elapsed else 0.0, errors, 100.0 * errors / self.completed if self.completed else 0.0),
+            "发送滞后: " + FormatLatency(self.lag, (50, 99)),
+            "延迟: " + FormatLatency(self.latency),
+        ]
+        for key in sorted(self.endpoints):
+            h, n, e = self.endpoints[key]
+            lines.append("   %-48s n=%-7d 失败=%-6d %s" % (key, n, e, FormatLatency(h, (50, 99))))
+        for kind, n in sorted(self.errors.items(), key=lambda kv: -kv[1]):
+            lines.append("错误 %s: %d" % (kind, n))
+        return "\n".join(lines)
+
+async def Replay(records, server_url = server, speed = 1.0, concurrency = 256, ordered = False, copies = 1, session = None):
+    """按轨迹重放请求，speed 为倍速，0 表示尽快
+
+    ordered=False 时每个请求到点就发，不等同一条流的前一个请求（开环，保留到达间隔）；
+    ordered=True 时同一条流内串行，更接近单个浏览器/客户端的行为。同时在途不超过 concurrency。
+    """
+    result = ReplayResult()
+    if not records:
+        return result
+    loop = asyncio.get_running_loop()
+    streams = {}
+    for r in records:
+        streams.setdefault(r[1], []).append(r)
+    result.trace_duration = records[-1][0] - records[0][0]
+    result.streams = len(streams) * copies
+    base = records[0][0]
+    own = session is None
+    session = session or AsyncSession(limit=concurrency)
+    sem = asyncio.Semaphore(concurrency)
+    address = itertools.count()
+
+    async def issue(r, headers, intended):
+        url = server_url + r[3] + ("?" + r[4] if r[4] else "")
+        key = "%s %s" % (r[2], r[3].lower())
+        async with sem:
+            if speed:
+                result.lag.record(max(0.0, loop.time() - intended) * 1e6)
+            t0 = time.perf_counter_ns()
+            try:
+                code, _, body = await session.request(url, headers, DecodeBody(r[6]), r[2])
+                error = CheckApi(code, body)
+            except Exception as e:
+                error = type(e).__name__
+            result.record(key, (time.perf_counter_ns() - t0) // 1000, error)
+
+    async def run_stream(reqs, copy):
+        forwarded = CopyAddress(next(address)) if copy else None
+        pending = set()
+        for r in reqs:
+            intended = start + (r[0] - base) / speed if speed else start
+            delay = intended - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            headers = {k: v for k, v in r[5].items() if k.lower() not in HOP_HEADERS}
+            if forwarded is not None:
+                headers = {k: v for k, v in headers.items() if k.lower() != "x-forwarded-for"}
+                headers["X-Forwarded-For"] = forwarded
+            result.sent += 1
+            if ordered:
+                await issue(r, headers, intended)
+            else:
+                t = asyncio.ensure_future(issue(r, headers, intended))
+                pending.add(t)
+                t.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.gather(*pending)
+
+    start = loop.time()
+    t0 = time.perf_counter()
+    try:
+        await asyncio.gather(*(run_stream(reqs, copy) for copy in range(copies) for reqs in streams.values()))
+    finally:
+        result.elapsed = time.perf_counter() - t0
+        if own:
+            session.close()
+    return result
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="IceApi 流量采集、导入与回放")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("import", help="把访问日志转成轨迹")
+    p.add_argument("log", help="访问日志文件，- 为标准输入")
+    p.add_argument("-o", "--output", required=True)
+
+    p = sub.add_parser("stats", help="轨迹概况")
+    p.add_argument("trace")
+
+    p = sub.add_parser("replay", help="回放轨迹")
+    p.add_argument("trace")
+    p.add_argument("--server", default=server)
+    p.add_argument("--speed", default="1", help="倍速，如 1、10，max 表示尽快")
+    p.add_argument("--concurrency", type=int, default=256, help="同时在途请求上限")
+    p.add_argument("--ordered", action="store_true", help="同一条流内等前一个请求返回再发下一个")
+    p.add_argument("--copies", type=int, default=1, help="同时回放的副本数，每份使用不同的 X-Forwarded-For")
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        if args.log == "-":
+            records = ImportAccessLog(sys.stdin)
+        else:
+            with open(args.log, encoding="utf-8", errors="replace") as f:
+                records = ImportAccessLog(f)
+        n = WriteCapture(args.output, records, source=args.log)
+        print("%d 个请求写入 %s" % (n, args.output))
+        return 0
+    header, records = ReadCapture(args.trace)
+    if args.command == "stats":
+        print(Stats(records))
+        return 0
+
+    speed = 0.0 if args.speed == "max" else float(args.speed)
+    result = asyncio.run(Replay(records, args.server, speed, args.concurrency, args.ordered, args.copies))
+    print(result.report())
+    return 1 if result.errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+#encoding=utf8
+
+# asyncio 版 SignalR Hub 客户端（json / messagepack 协议）：握手一次，按 target 把服务器调用分发给回调或队列
+
+import json
+import asyncio
+import inspect
+import logging
+from urllib.parse import urlsplit
+
+import aiows
+from hubframe import RS, EncodeRecord
+from hubprotocol import GetProtocol
+
+SERVER = "ws://127.0.0.1:9000"
+
+log = logging.getLogger(__name__)
+
+# SignalR 消息类型
+INVOCATION = 1
+STREAM_ITEM = 2
+COMPLETION = 3
+PING = 6
+CLOSE = 7
+
+class HubError(Exception):
+    """服务器返回的调用错误或握手错误"""
+    pass
+
+class HubConnection:
+    """一条 Hub 连接，消息由后台任务读取并分发
+
+    trace 为 hubtrace.TraceWriter 时记录连接、调用（以及可选的收到的调用）事件，供 hubtrace.py 回放。
+    """
+
+    def __init__(self, url, headers = None, keepalive = 15, protocol = "json", trace = None):
+        self.url = url
+        self.trace = trace
+        self.protocol = GetProtocol(protocol)
+        self.headers = headers
+        self.keepalive = keepalive
+        self.ws = None
+        self.closed = None
+        self._handlers = {}
+        self._queues = {}
+        self._waiters = {}
+        self._pending = {}
+        self._next_id = 0
+        self._decoder = self.protocol.decoder()
+        self._tasks = []
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def start(self):
+        """建立 WebSocket 连接并完成 SignalR 握手"""
+        loop = asyncio.get_running_loop()
+        self.closed = loop.create_future()
+        self.ws = await aiows.Connect(self.url, self.headers)
+        await self.ws.send(EncodeRecord({"protocol": self.protocol.name, "version": 1}), binary=False)
+
+        # 握手响应总是 JSON + 0x1e，后面可能紧跟着按所选协议编码的第一批消息（如连接通知）
+        buf = bytearray()
+        while RS not in buf:
+            buf += await self.ws.recv(decode=False)
+        end = buf.index(RS)
+        error = json.loads(bytes(buf[:end])).get("error")
+        if error:
+            await self.ws.close()
+            raise HubError(error)
+        messages = self._decoder.feed(buf[end + 1:])
+        if self.trace is not None:
+            self.trace.record(self, "open", urlsplit(self.url).path, self.protocol.name)
+
+        self._tasks.append(asyncio.ensure_future(self._read_loop()))
+        if self.keepalive:
+            self._tasks.append(asyncio.ensure_future(self._ping_loop()))
+        for msg in messages:
+            self._dispatch(msg)
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        self._tasks = []
+        if self.ws is not None:
+            if self.trace is not None and not self.ws.closed:
+                self.trace.record(self, "close")
+            await self.ws.close()
+        self._finish(None)
+
+    def on(self, target, handler):
+        """注册 target 的回调，handler(*arguments)，可以是协程函数"""
+        self._handlers.setdefault(target, []).append(handler)
+        return handler
+
+    def off(self, target, handler = None):
+        if handler is None:
+            self._handlers.pop(target, None)
+        elif handler in self._handlers.get(target, []):
+            self._handlers[target].remove(handler)
+
+    def queue(self, target, maxsize = 0):
+        """返回一个接收 target 调用参数列表的 asyncio.Queue"""
+        q = asyncio.Queue(maxsize)
+        self._queues.setdefault(target, []).append(q)
+        return q
+
+    def wait_for(self, target, predicate = None, timeout = None):
+        """返回一个 future，收到第一条满足 predicate(*arguments) 的 target 调用时以参数列表完成
+
+        要在触发消息的操作之前调用，才不会错过消息；超时抛 asyncio.TimeoutError，连接断开抛连接错误。
+        """
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        waiter = (predicate, fut)
+        waiters = self._waiters.setdefault(target, [])
+        waiters.append(waiter)
+        timer = loop.call_later(timeout, self._expire, fut) if timeout is not None else None
+
+        def done(_):
+            # 完成、超时或被调用者取消时都从等待表里移除
+            if timer is not None:
+                timer.cancel()
+            if waiter in waiters:
+                waiters.remove(waiter)
+        fut.add_done_callback(done)
+        return fut
+
+    @staticmethod
+    def _expire(fut):
+        if not fut.done():
+            fut.set_exception(asyncio.TimeoutError())
+
+    async def send(self, target, *args):
+        """调用服务器方法，不等待结果"""
+        if self.trace is not None:
+            self.trace.record(self, "send", target, list(args))
+        await self._send({"type": INVOCATION, "target": target, "arguments": list(args)})
+
+    async def invoke(self, target, *args, timeout = None):
+        """调用服务器方法并等待 Completion，返回 result，出错抛 HubError"""
+        self._next_id += 1
+        invocation_id = str(self._next_id)
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[invocation_id] = fut
+        if self.trace is not None:
+            self.trace.record(self, "invoke", target, list(args))
+        try:
+            await self._send({"type": INVOCATION, "invocationId": invocation_id, "target": target, "arguments": list(args)})
+            return await asyncio.wait_for(fut, timeout)
+        finally:
+            self._pending.pop(invocation_id, None)
+
+    async def _send(self, msg):
+        await self.ws.send(self.protocol.encode(msg), binary=self.protocol.binary)
+
+    async def _read_loop(self):
+        error = None
+        try:
+            while True:
+                for msg in self._decoder.feed(await self.ws.recv(decode=False)):
+                    self._dispatch(msg)
+        except aiows.ConnectionClosed as e:
+            if e.code not in (1000, 1005):
+                error = e
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = e
+        self._finish(error)
+
+    async def _ping_loop(self):
+        while True:
+            await asyncio.sleep(self.keepalive)
+            await self._send({"type": PING})
+
+    def _dispatch(self, msg):
+        t = msg.get("type")
+        if t == INVOCATION:
+            target = msg.get("target")
+            args = msg.get("arguments", [])
+            if self.trace is not None and self.trace.received:
+                self.trace.record(self, "recv", target, args)
+            for handler in list(self._handlers.get(target, ())):
+                # 回调出错只记日志，不能中断读循环
+                try:
+                    r = handler(*args)
+                    if inspect.isawaitable(r):
+                        asyncio.ensure_future(r).add_done_callback(_LogHandlerError)
+                except Exception:
+                    log.exception("hub handler for %s failed", target)
+            for q in self._queues.get(target, ()):
+                q.put_nowait(args)
+            for predicate, fut in list(self._waiters.get(target, ())):
+                if fut.done():
+                    continue
+                try:
+                    matched = predicate is None or predicate(*args)
+                except Exception as e:
+                    fut.set_exception(e)
+                    continue
+                if matched:
+                    fut.set_result(args)
+        elif t == COMPLETION:
+            fut = self._pending.get(msg.get("invocationId"))
+            if fut is not None and not fut.done():
+                if msg.get("error"):
+                    fut.set_exception(HubError(msg["error"]))
+                else:
+                    fut.set_result(msg.get("result"))
+        elif t == CLOSE:
+            asyncio.ensure_future(self.stop())
+            self._finish(HubError(msg["error"]) if msg.get("error") else None)
+
+    def _finish(self, error):
+        for fut in self._pending.values():
+            if not fut.done():
+                fut.set_exception(error or HubError("Connection closed"))
+        self._pending.clear()
+        for waiters in self._waiters.values():
+            for predicate, fut in list(waiters):
+                if not fut.done():
+                    fut.set_exception(error or HubError("Connection closed"))
+        if self.closed is not None and not self.closed.done():
+            self.closed.set_result(error)
+
+def _LogHandlerError(task):
+    if not task.cancelled() and task.exception() is not None:
+        log.error("hub handler failed", exc_info=task.exception())
+
+class ChatHubClient(HubConnection):
+    """TestAspNetCore 的 ChatHub"""
+
+    def __init__(self, server = SERVER, **kwargs):
+        HubConnection.__init__(self, server + "/chatHub", **kwargs)
+
+    async def SendMessage(self, user, message):
+        return await self.invoke("SendMessage", user, message)
+
+    async def JoinRoom(self, roomName):
+        return await self.invoke("JoinRoom", roomName)
+
+    async def LeaveRoom(self, roomName):
+        return await self.invoke("LeaveRoom", roomName)
+
+    async def SendMessageToRoom(self, roomName, user, message):
+        return await self.invoke("SendMessageToRoom", roomName, user, message)
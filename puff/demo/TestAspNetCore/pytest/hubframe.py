@@ -0,0 +1,133 @@
+#encoding=utf8
+
+# SignalR JSON 协议的记录分隔符（0x1e）分帧：增量解码，跨多次 recv 的半帧会保留到下次
+
+import jsoncodec
+
+RS = 0x1e
+RS_BYTES = b"\x1e"
+
+def _Consume(decoder, start):
+    """从解码器缓冲区开头移除 start 字节"""
+    if not start:
+        return
+    try:
+        del decoder._buf[:start]
+    except BufferError:
+        # 解码异常的 traceback 还引用着缓冲区的切片，不能原地缩短，改为拷贝剩余部分
+        decoder._buf = bytearray(decoder._buf[start:])
+
+class RecordDecoder:
+    """复用同一个 bytearray 缓冲区，用 find 扫描分隔符，按 memoryview 切片交给 loads
+
+    loads 接收 memoryview，默认用 jsoncodec.loads（orjson 直接解析 memoryview，完全不拷贝）。
+    """
+
+    def __init__(self, loads = None):
+        self.loads = loads or jsoncodec.loads
+        self._buf = bytearray()
+        self._ready = []
+
+    def feed(self, data):
+        """追加收到的数据，返回其中所有完整消息解码后的列表
+
+        某条消息解码失败时抛出异常，这条消息从缓冲区移除；之前已解出的消息留到下次 feed 一起返回。
+        """
+        buf = self._buf
+        buf += data
+        out, self._ready = self._ready, []
+        start = 0
+        try:
+            with memoryview(buf) as view:
+                while True:
+                    end = buf.find(RS, start)
+                    if end < 0:
+                        break
+                    record = start
+                    start = end + 1
+                    if end > record:
+                        out.append(self.loads(view[record:end]))
+        except Exception:
+            self._ready = out
+            raise
+        finally:
+            # 只搬移剩余的半帧，缓冲区容量保留复用
+            _Consume(self, start)
+        return out
+
+    def pending(self):
+        """尚未凑成完整消息的字节数"""
+        return len(self._buf)
+
+    def reset(self):
+        del self._buf[:]
+        self._ready = []
+
+def EncodeRecord(msg, dumps = None):
+    """编码一条消息，返回以 0x1e 结尾的 bytes；dumps 返回 bytes，默认 jsoncodec.dumps"""
+    return (dumps or jsoncodec.dumps)(msg) + RS_BYTES
+
+def EncodeVarint(n):
+    """SignalR 二进制协议的长度前缀：7 位一组，低位在前"""
+    out = bytearray()
+    while True:
+        b = n & 0x7f
+        n >>= 7
+        if n:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+class LengthPrefixDecoder:
+    """varint 长度前缀分帧（MessagePack 协议），与 RecordDecoder 一样复用缓冲区、按 memoryview 切片解码"""
+
+    def __init__(self, loads):
+        self.loads = loads
+        self._buf = bytearray()
+        self._ready = []
+
+    def feed(self, data):
+        """解码失败时与 RecordDecoder 相同：这条消息从缓冲区移除，之前已解出的消息留到下次返回"""
+        buf = self._buf
+        buf += data
+        out, self._ready = self._ready, []
+        start = 0
+        end = len(buf)
+        try:
+            with memoryview(buf) as view:
+                while start < end:
+                    # 解析 varint，最多 5 字节
+                    size = 0
+                    shift = 0
+                    pos = start
+                    while pos < end:
+                        b = buf[pos]
+                        pos += 1
+                        size |= (b & 0x7f) << shift
+                        shift += 7
+                        if not b & 0x80:
+                            break
+                        if shift >= 35:
+                            # 长度前缀损坏后无法重新对齐，丢弃全部已收数据
+                            start = end
+                            raise ValueError("invalid length prefix")
+                    else:
+                        break
+                    if pos + size > end:
+                        break
+                    start = pos + size
+                    out.append(self.loads(view[pos:start]))
+        except Exception:
+            self._ready = out
+            raise
+        finally:
+            _Consume(self, start)
+        return out
+
+    def pending(self):
+        return len(self._buf)
+
+    def reset(self):
+        del self._buf[:]
+        self._ready = []
@@ -0,0 +1,111 @@
+#encoding=utf8
+
+# SignalR Hub 协议：json（文本帧，0x1e 分隔）和 messagepack（二进制帧，varint 长度前缀）
+# 两种协议的消息统一成 JSON 协议的 dict 形式，HubConnection 不需要关心具体协议
+#
+#   python hubprotocol.py    对比两种协议单条 ReceiveMessage 的字节数和编解码耗时
+
+import sys
+import timeit
+
+import minipack
+from hubframe import RecordDecoder, EncodeRecord, LengthPrefixDecoder, EncodeVarint
+
+INVOCATION = 1
+STREAM_ITEM = 2
+COMPLETION = 3
+PING = 6
+CLOSE = 7
+
+# Completion 的 ResultKind
+RESULT_ERROR = 1
+RESULT_VOID = 2
+RESULT_VALUE = 3
+
+class JsonHubProtocol:
+    name = "json"
+    binary = False
+
+    def decoder(self):
+        return RecordDecoder()
+
+    def encode(self, msg):
+        return EncodeRecord(msg)
+
+class MessagePackHubProtocol:
+    name = "messagepack"
+    binary = True
+
+    def decoder(self):
+        return LengthPrefixDecoder(self.decode)
+
+    def encode(self, msg):
+        data = minipack.packb(self.to_array(msg))
+        return EncodeVarint(len(data)) + data
+
+    def decode(self, view):
+        return self.from_array(minipack.unpackb(view))
+
+    def to_array(self, msg):
+        t = msg["type"]
+        if t == INVOCATION:
+            return [t, msg.get("headers", {}), msg.get("invocationId"), msg["target"], msg.get("arguments", [])]
+        if t == STREAM_ITEM:
+            return [t, msg.get("headers", {}), msg["invocationId"], msg.get("item")]
+        if t == COMPLETION:
+            if msg.get("error") is not None:
+                return [t, msg.get("headers", {}), msg["invocationId"], RESULT_ERROR, msg["error"]]
+            if "result" in msg:
+                return [t, msg.get("headers", {}), msg["invocationId"], RESULT_VALUE, msg["result"]]
+            return [t, msg.get("headers", {}), msg["invocationId"], RESULT_VOID]
+        if t == CLOSE:
+            return [t, msg.get("error"), msg.get("allowReconnect", False)]
+        return [t]
+
+    def from_array(self, a):
+        t = a[0]
+        if t == INVOCATION:
+            msg = {"type": t, "target": a[3], "arguments": a[4]}
+            if a[2] is not None:
+                msg["invocationId"] = a[2]
+            return msg
+        if t == STREAM_ITEM:
+            return {"type": t, "invocationId": a[2], "item": a[3]}
+        if t == COMPLETION:
+            msg = {"type": t, "invocationId": a[2]}
+            if a[3] == RESULT_ERROR:
+                msg["error"] = a[4]
+            elif a[3] == RESULT_VALUE:
+                msg["result"] = a[4]
+            return msg
+        if t == CLOSE:
+            msg = {"type": t}
+            if len(a) > 1 and a[1] is not None:
+                msg["error"] = a[1]
+            if len(a) > 2:
+                msg["allowReconnect"] = a[2]
+            return msg
+        return {"type": t}
+
+PROTOCOLS = {
+    JsonHubProtocol.name: JsonHubProtocol(),
+    MessagePackHubProtocol.name: MessagePackHubProtocol(),
+}
+
+def GetProtocol(name):
+    if name not in PROTOCOLS:
+        raise ValueError("unknown hub protocol: %s" % name)
+    return PROTOCOLS[name]
+
+def Benchmark(message = "hello world", number = 20000):
+    msg = {"type": INVOCATION, "target": "ReceiveMessage", "arguments": ["tester", message]}
+    for protocol in PROTOCOLS.values():
+        data = protocol.encode(msg)
+        dec = protocol.decoder()
+        assert dec.feed(data) == [msg]
+        enc_us = timeit.timeit(lambda: protocol.encode(msg), number=number) / number * 1e6
+        dec_us = timeit.timeit(lambda: dec.feed(data), number=number) / number * 1e6
+        print("%-12s %5d 字节  编码 %.2fus  解码 %.2fus" % (protocol.name, len(data), enc_us, dec_us))
+
+if __name__ == "__main__":
+    Benchmark(sys.argv[1] if len(sys.argv) > 1 else "hello world")
@@ -0,0 +1,207 @@
+#encoding=utf8
+
+# ChatHub 广播扇出规模测试：多进程建立大量 /chatHub 连接，通过 /System/Broadcast 触发广播，
+# 统计送达完整率和每个接收者的延迟分布
+#
+#   python hubscale.py --connections 10000 --processes 8 --broadcasts 20 --interval 1
+#
+# 注意 ChatHub 每次连接/断开都会通知所有客户端，建立 N 个连接本身就会产生 O(N^2) 条通知，
+# 所以连接建立后会先等通知流停下来（--settle）再开始广播。
+
+import sys
+import time
+import json
+import asyncio
+import argparse
+import threading
+import multiprocessing
+
+from hubclient import ChatHubClient
+from histogram import Histogram, FormatLatency
+from httpclient import RequestRaw
+from workers import CollectResults
+
+SERVER = "127.0.0.1:9000"
+MARK = "scale:"
+
+def RaiseFileLimit():
+    """尽量把打开文件数上限提到硬上限，大量连接需要"""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+class Receiver:
+    """一个进程内所有连接共用的广播接收统计"""
+
+    def __init__(self, broadcasts):
+        self.broadcasts = broadcasts
+        self.per_seq = [Histogram() for _ in range(broadcasts)]
+        self.total = Histogram()
+        self.per_conn = []
+        self.last_recv = time.monotonic()
+
+    def handler(self):
+        """返回 (回调, 计数)，连接建立成功后再用 add(计数) 登记，失败的连接不计入完整率"""
+        count = [0]
+
+        def on_notification(text):
+            now = time.time_ns()
+            self.last_recv = time.monotonic()
+            pos = text.find(MARK)
+            if pos < 0:
+                return
+            # 同一服务器上别的 hubscale 运行（或之前的一次）的广播也带 MARK，序号对不上的忽略
+            try:
+                seq, sent = text[pos + len(MARK):].split(":", 1)
+                seq = int(seq)
+                sent = int(sent)
+            except ValueError:
+                return
+            if not 0 <= seq < self.broadcasts:
+                return
+            us = (now - sent) // 1000
+            self.per_seq[seq].record(us)
+            self.total.record(us)
+            count[0] += 1
+        return (on_notification, count)
+
+    def add(self, count):
+        self.per_conn.append(count)
+
+    def complete(self):
+        return all(c[0] >= self.broadcasts for c in self.per_conn)
+
+async def _OpenAll(server, n, concurrency, receiver, protocol):
+    conns = []
+    sem = asyncio.Semaphore(concurrency)
+
+    async def open_one():
+        c = ChatHubClient("ws://" + server, protocol=protocol)
+        handler, count = receiver.handler()
+        c.on("ReceiveSystemNotification", handler)
+        async with sem:
+            await c.start()
+        receiver.add(count)
+        conns.append(c)
+
+    rs = await asyncio.gather(*(open_one() for _ in range(n)), return_exceptions=True)
+    failed = [r for r in rs if isinstance(r, Exception)]
+    return (conns, failed)
+
+async def _WorkerMain(server, n, args, barrier, done):
+    loop = asyncio.get_running_loop()
+    receiver = Receiver(args.broadcasts)
+
+    t0 = time.perf_counter()
+    conns, failed = await _OpenAll(server, n, args.connect_concurrency, receiver, args.protocol)
+    connect_s = time.perf_counter() - t0
+
+    # 等连接通知停下来
+    while time.monotonic() - receiver.last_recv < args.settle:
+        await asyncio.sleep(0.1)
+    await loop.run_in_executor(None, barrier.wait)
+
+    await loop.run_in_executor(None, done.wait)
+    deadline = time.monotonic() + args.timeout
+    while not receiver.complete() and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+
+    result = {
+        "opened": len(conns),
+        "failed": len(failed),
+        "errors": sorted(set(type(e).__name__ for e in failed)),
+        "connect_s": connect_s,
+        "per_seq": [h.to_dict() for h in receiver.per_seq],
+        "total": receiver.total.to_dict(),
+        "incomplete": sum(1 for c in receiver.per_conn if c[0] < args.broadcasts),
+    }
+    for c in conns:
+        c.ws.writer.close()
+    return result
+
+def _Worker(server, n, args, barrier, done, results):
+    RaiseFileLimit()
+    results.put(asyncio.run(_WorkerMain(server, n, args, barrier, done)))
+
+def Broadcast(server, seq):
+    message = "%s%d:%d" % (MARK, seq, time.time_ns())
+    r = RequestRaw("http://%s/System/Broadcast" % server, {"Content-Type": "application/json"}, json.dumps({"message": message}))
+    return r[0] == 200
+
+def RunScale(args):
+    n = args.connections
+    procs = args.processes
+    barrier = multiprocessing.Barrier(procs + 1)
+    done = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    workers = []
+    for i in range(procs):
+        count = n // procs + (1 if i < n % procs else 0)
+        p = multiprocessing.Process(target=_Worker, args=(args.server, count, args, barrier, done, results), daemon=True)
+        p.start()
+        workers.append(p)
+
+    try:
+        barrier.wait(args.ready_timeout)
+    except threading.BrokenBarrierError:
+        for p in workers:
+            p.terminate()
+        raise RuntimeError("连接阶段超过 %gs 未完成" % args.ready_timeout)
+    print("连接已建立，开始广播 %d 次" % args.broadcasts)
+    sent = 0
+    for seq in range(args.broadcasts):
+        if Broadcast(args.server, seq):
+            sent += 1
+        time.sleep(args.interval)
+    done.set()
+
+    # 工作进程在最后一次广播后最多等 timeout 秒送达
+    reports = CollectResults(results, workers, args.timeout + 60)
+    return Summarize(args, reports, sent)
+
+def Summarize(args, reports, sent):
+    opened = sum(r["opened"] for r in reports)
+    failed = sum(r["failed"] for r in reports)
+    per_seq = [Histogram() for _ in range(args.broadcasts)]
+    total = Histogram()
+    for r in reports:
+        for h, d in zip(per_seq, r["per_seq"]):
+            h.merge(Histogram.from_dict(d))
+        total.merge(Histogram.from_dict(r["total"]))
+
+    expected = opened * sent
+    lines = [
+        "连接: %d 成功, %d 失败 %s, 建立耗时 %.1fs (最慢进程)" % (
+            opened, failed, ",".join(sorted(set(e for r in reports for e in r["errors"]))),
+            max(r["connect_s"] for r in reports)),
+        "广播: 发出 %d, 应送达 %d, 实际送达 %d (%.2f%%), 未收全的连接 %d" % (
+            sent, expected, total.count, 100.0 * total.count / expected if expected else 0.0,
+            sum(r["incomplete"] for r in reports)),
+        "总体延迟: " + FormatLatency(total),
+    ]
+    for seq, h in enumerate(per_seq):
+        lines.append("   #%d: %d/%d %s" % (seq, h.count, opened, FormatLatency(h, (50, 99))))
+    return "\n".join(lines)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="ChatHub 广播扇出规模测试")
+    parser.add_argument("--server", default=SERVER, help="host:port")
+    parser.add_argument("--protocol", default="json", choices=["json", "messagepack"])
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--processes", type=int, default=max(1, multiprocessing.cpu_count() // 2))
+    parser.add_argument("--connect-concurrency", type=int, default=200, help="每个进程同时进行的握手数")
+    parser.add_argument("--broadcasts", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=1.0, help="两次广播的间隔（秒）")
+    parser.add_argument("--settle", type=float, default=2.0, help="连接通知静默多久后认为连接阶段结束（秒）")
+    parser.add_argument("--ready-timeout", type=float, default=600.0, help="等待所有进程建立连接的上限（秒）")
+    parser.add_argument("--timeout", type=float, default=10.0, help="最后一次广播后等待送达的时间（秒）")
+    args = parser.parse_args(argv)
+    print(RunScale(args))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,279 @@
+#encoding=utf8
+
+# 本地 ChatHub 替身：在一个进程里实现 SignalR 握手和 json / messagepack 调用帧，
+# 行为与 TestAspNetCore 的 ChatHub 一致，同一端口还提供 /System/Broadcast 和 standin 的 /my/* 接口
+#
+#   python hubstandin.py                      监听 9000，test_websocket.py / hubscale.py 可以直接连
+#   python hubstandin.py --port 9100 --max-buffer 1M
+#
+# 广播时每种协议只编码一次、只组一次 WebSocket 帧，再写给各连接（不逐个等待 drain），
+# 单进程可以承载数千连接；写缓冲超过 max-buffer 的慢连接直接断开，不拖慢其他连接。
+
+import os
+import sys
+import base64
+import asyncio
+import argparse
+
+import aiows
+import standin
+from hubframe import RS
+from hubprotocol import GetProtocol, INVOCATION, COMPLETION, PING, CLOSE
+import jsoncodec
+
+NOTIFY = "ReceiveSystemNotification"
+MESSAGE = "ReceiveMessage"
+
+def NewConnectionId():
+    """与 SignalR 的 ConnectionId 相同形式：16 个随机字节的 base64url，22 个字符"""
+    return base64.urlsafe_b64encode(os.urandom(16)).rstrip(b"=").decode('ascii')
+
+class ClientConnection:
+    """服务器端的一条 Hub 连接"""
+
+    __slots__ = ("id", "writer", "protocol", "groups", "opcode")
+
+    def __init__(self, writer, protocol):
+        self.id = NewConnectionId()
+        self.writer = writer
+        self.protocol = protocol
+        self.groups = set()
+        self.opcode = aiows.OP_BINARY if protocol.binary else aiows.OP_TEXT
+
+    def write(self, frame, max_buffer):
+        transport = self.writer.transport
+        if transport.is_closing():
+            return
+        if transport.get_write_buffer_size() > max_buffer:
+            # 慢消费者：断开，由读循环完成清理和断开通知
+            transport.abort()
+            return
+        self.writer.write(frame)
+
+class ChatHub:
+    """Hubs/ChatHub.cs：连接/断开通知所有人，SendMessage 广播，房间按 group 路由"""
+
+    def __init__(self, max_buffer = 4 << 20, keepalive = 15):
+        self.max_buffer = max_buffer
+        self.keepalive = keepalive
+        self.connections = {}
+        self.groups = {}
+        self.broadcasts = 0
+
+    # 推送
+
+    def send(self, conns, target, *args):
+        """向 conns 推送一条调用，每种协议只编码一次"""
+        self._send(conns, {"type": INVOCATION, "target": target, "arguments": list(args)})
+
+    def all(self, target, *args):
+        self.send(list(self.connections.values()), target, *args)
+
+    def group(self, name, target, *args):
+        ids = self.groups.get(name, ())
+        self.send([self.connections[i] for i in ids if i in self.connections], target, *args)
+
+    def _send(self, conns, msg):
+        frames = {}
+        for conn in conns:
+            name = conn.protocol.name
+            frame = frames.get(name)
+            if frame is None:
+                frame = frames[name] = aiows.BuildFrame(conn.opcode, conn.protocol.encode(msg), mask=False)
+            conn.write(frame, self.max_buffer)
+        self.broadcasts += 1
+
+    # 生命周期
+
+    def on_connected(self, conn):
+        self.connections[conn.id] = conn
+        self.all(NOTIFY, "User %s connected" % conn.id)
+
+    def on_disconnected(self, conn):
+        self.connections.pop(conn.id, None)
+        for name in conn.groups:
+            members = self.groups.get(name)
+            if members is not None:
+                members.discard(conn.id)
+                if not members:
+                    del self.groups[name]
+        self.all(NOTIFY, "User %s disconnected" % conn.id)
+
+    # Hub 方法，参数个数不符时按 SignalR 的方式报错
+
+    def SendMessage(self, conn, user, message):
+        self.all(MESSAGE, user, message)
+
+    def JoinRoom(self, conn, roomName):
+        self.groups.setdefault(roomName, set()).add(conn.id)
+        conn.groups.add(roomName)
+        self.group(roomName, NOTIFY, "User %s joined %s" % (conn.id, roomName))
+
+    def LeaveRoom(self, conn, roomName):
+        members = self.groups.get(roomName)
+        if members is not None:
+            members.discard(conn.id)
+        conn.groups.discard(roomName)
+        self.group(roomName, NOTIFY, "User %s left %s" % (conn.id, roomName))
+
+    def SendMessageToRoom(self, conn, roomName, user, message):
+        self.group(roomName, MESSAGE, user, message)
+
+    METHODS = {"SendMessage": 2, "JoinRoom": 1, "LeaveRoom": 1, "SendMessageToRoom": 3}
+
+    def invoke(self, conn, target, args):
+        """执行一次调用，返回错误信息，成功返回 None"""
+        # Hub 方法名不区分大小写
+        name = next((m for m in self.METHODS if m.lower() == (target or "").lower()), None)
+        if name is None:
+            return "Failed to invoke '%s' due to an error on the server. HubException: Method does not exist." % target
+        if len(args) != self.METHODS[name]:
+            return "Failed to invoke '%s' due to an error on the server. InvalidDataException: Invocation provides %d argument(s) but target expects %d." % (
+                target, len(args), self.METHODS[name])
+        try:
+            getattr(self, name)(conn, *args)
+        except Exception:
+            # 与 SignalR 相同：方法内部出错只回 Completion 错误，不断开连接，也不带异常细节
+            return "Failed to invoke '%s' due to an error on the server." % target
+        return None
+
+    async def ping_loop(self):
+        while True:
+            await asyncio.sleep(self.keepalive)
+            self._send(list(self.connections.values()), {"type": PING})
+
+class SystemController:
+    """SystemController.cs"""
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    @standin.IceApi(flags=standin.JSON_IN)
+    def Broadcast(self, message: str):
+        self.hub.all(NOTIFY, "[System Admin]: %s" % message)
+        return standin.IceApiResponse.String("Broadcast sent")
+
+class HubServer:
+    """同一端口上：/chatHub 的 WebSocket 升级交给 ChatHub，其余 HTTP 请求交给 standin.App"""
+
+    def __init__(self, hub = None, app = None, path = "/chathub"):
+        self.hub = hub or ChatHub()
+        self.app = app or standin.DefaultApp().add("/system", SystemController(self.hub))
+        self.path = path.lower()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                    req = standin.ParseRequestHead(head[:-4])
+                    n = int(req.header("Content-Length") or 0)
+                    req.body = await reader.readexactly(n) if n else b""
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+                    return
+                if (req.header("Upgrade") or "").lower() == "websocket":
+                    if req.path.lower() == self.path:
+                        await self._websocket(req, reader, writer)
+                    else:
+                        writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                    return
+                keep_alive = req.keep_alive
+                if req.path.lower() == self.path + "/negotiate":
+                    r = standin.IceApiResponse(json=self._negotiate())
+                else:
+                    r = self.app.handle(req) or standin.IceApiResponse(status=404, data=b"")
+                writer.write(standin.EncodeResponse(r, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    return
+        finally:
+            writer.close()
+
+    def _negotiate(self):
+        cid = NewConnectionId()
+        return {"connectionId": cid, "connectionToken": cid, "negotiateVersion": 1,
+            "availableTransports": [{"transport": "WebSockets", "transferFormats": ["Text", "Binary"]}]}
+
+    async def _websocket(self, req, reader, writer):
+        key = req.header("Sec-WebSocket-Key") or ""
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            "Sec-WebSocket-Accept: %s\r\n\r\n" % aiows.AcceptKey(key)).encode('latin-1'))
+        ws = aiows.WebSocket(reader, writer, client=False)
+
+        # 握手请求总是 JSON + 0x1e，之后可能紧跟按所选协议编码的消息
+        buf = bytearray()
+        try:
+            while RS not in buf:
+                buf += await ws.recv(decode=False)
+        except aiows.ConnectionClosed:
+            return
+        end = buf.index(RS)
+        try:
+            hs = jsoncodec.loads(bytes(buf[:end]))
+            protocol = GetProtocol(hs.get("protocol"))
+        except (ValueError, KeyError, AttributeError):
+            await ws.send(b'{"error":"The protocol is not supported."}\x1e', binary=False)
+            await ws.close()
+            return
+        await ws.send(b"{}\x1e", binary=protocol.binary)
+
+        hub = self.hub
+        conn = ClientConnection(writer, protocol)
+        decoder = protocol.decoder()
+        pending = decoder.feed(buf[end + 1:])
+        hub.on_connected(conn)
+        try:
+            while True:
+                for msg in pending:
+                    t = msg.get("type")
+                    if t == INVOCATION:
+                        error = hub.invoke(conn, msg.get("target"), msg.get("arguments") or [])
+                        iid = msg.get("invocationId")
+                        if iid is not None:
+                            done = {"type": COMPLETION, "invocationId": iid}
+                            if error is not None:
+                                done["error"] = error
+                            conn.write(aiows.BuildFrame(conn.opcode, protocol.encode(done), mask=False), hub.max_buffer)
+                    elif t == CLOSE:
+                        return
+                pending = decoder.feed(await ws.recv(decode=False))
+        except aiows.ConnectionClosed:
+            pass
+        finally:
+            hub.on_disconnected(conn)
+            await ws.close()
+
+async def Serve(host = "127.0.0.1", port = 9000, server = None):
+    """启动服务器，返回 (asyncio.Server, HubServer)；ping 任务随事件循环运行"""
+    server = server or HubServer()
+    srv = await asyncio.start_server(server.handle, host, port, backlog=4096)
+    if server.hub.keepalive:
+        asyncio.ensure_future(server.hub.ping_loop())
+    return (srv, server)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="ChatHub 本地替身")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--max-buffer", default="4M", help="单连接写缓冲上限，超过即断开")
+    parser.add_argument("--keepalive", type=float, default=15, help="服务器 ping 间隔（秒），0 关闭")
+    args = parser.parse_args(argv)
+
+    from transfer import ParseSize
+    from hubscale import RaiseFileLimit
+    RaiseFileLimit()
+
+    async def run():
+        srv, server = await Serve(args.host, args.port, HubServer(ChatHub(ParseSize(args.max_buffer), args.keepalive)))
+        print("ChatHub stand-in listening on ws://%s:%d/chatHub" % (args.host, args.port))
+        sys.stdout.flush()
+        async with srv:
+            await srv.serve_forever()
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,304 @@
+#encoding=utf8
+
+# Hub 流量轨迹：记录连接、分组和调用事件，按原速、加速或尽快回放，统计消息送达延迟
+#
+#   python hubtrace.py synth -o room.trace.gz --connections 200 --rooms 20 --duration 60
+#   python hubtrace.py replay room.trace.gz --speed 10
+#   python hubtrace.py replay room.trace.gz --speed max --server ws://127.0.0.1:9000
+#   python hubtrace.py stats room.trace.gz
+#
+# 录制：HubConnection(..., trace=TraceWriter("x.trace")) 或 ChatHubClient(SERVER, trace=w)，一个 TraceWriter 可以给多条连接共用。
+#
+# 格式：每行一个 JSON，.gz 结尾时 gzip 压缩。第一行是头 {"hubtrace":1,...}，之后每行一个事件数组：
+#   [t, conn, "open", path, protocol]     t 为相对录制开始的秒数，conn 为连接编号
+#   [t, conn, "close"]
+#   [t, conn, "invoke", target, args]     等待 Completion 的调用（JoinRoom / LeaveRoom 就是分组事件）
+#   [t, conn, "send", target, args]       不等结果的调用
+#   [t, conn, "recv", target, args]       收到的服务器调用，TraceWriter(received=True) 时才记录，回放时忽略
+
+import sys
+import time
+import random
+import asyncio
+import argparse
+from array import array
+
+from hubclient import HubConnection
+from histogram import Histogram, FormatLatency
+import tracefile
+
+SERVER = "ws://127.0.0.1:9000"
+VERSION = 1
+
+# 回放时给这些调用的消息参数加上序号，接收端据此算送达延迟：target -> 参数下标
+TAGGED = {"SendMessage": 1, "SendMessageToRoom": 2}
+DELIVERY = ("ReceiveMessage", 1)
+TAG = "\x1f#"
+
+class TraceWriter(tracefile.TraceFile):
+    """线程安全，可供多条连接共用"""
+
+    def __init__(self, path, received = False, clock = time.monotonic, **header):
+        tracefile.TraceFile.__init__(self, path, "hubtrace", VERSION, clock, **header)
+        self.received = received
+
+    @property
+    def events(self):
+        return self.rows
+
+    def record(self, conn, kind, *fields):
+        """conn 为连接对象（要能弱引用），第一次出现时分配编号"""
+        self.append(conn, [kind] + list(fields))
+
+def ReadTrace(path):
+    """返回 (头, 事件列表)，事件按时间排序"""
+    return tracefile.ReadTrace(path, "hubtrace", VERSION)
+
+def Synthesize(path, connections = 200, rooms = 20, duration = 60.0, rate = 50.0, burst = 8, churn = 0.05,
+        protocol = "json", seed = 1):
+    """生成一个房间聊天轨迹：连接在开头几秒内陆续进入并加入房间，
+    之后房间消息以突发方式到达（平均 rate 条/秒，每次突发 1~burst 条），每秒约 churn 比例的连接换房间，
+    少量全局 SendMessage；结束时陆续断开
+    """
+    rnd = random.Random(seed)
+    rows = []
+    room_of = {}
+    ramp = min(5.0, duration / 4)
+    for c in range(connections):
+        t = rnd.uniform(0, ramp)
+        room = "room-%d" % min(int(rnd.paretovariate(1.2)) - 1, rooms - 1)
+        room_of[c] = room
+        rows.append([t, c, "open", "/chatHub", protocol])
+        rows.append([t + 0.001, c, "invoke", "JoinRoom", [room]])
+
+    t = ramp
+    end = duration - ramp / 2
+    next_churn = ramp + 1.0
+    while t < end:
+        # 突发间隔按指数分布，保证平均速率
+        t += rnd.expovariate(rate / ((burst + 1) / 2.0))
+        while next_churn < t:
+            for c in rnd.sample(range(connections), max(1, int(connections * churn))):
+                old = room_of[c]
+                new = "room-%d" % rnd.randrange(rooms)
+                rows.append([next_churn + rnd.random() * 0.5, c, "invoke", "LeaveRoom", [old]])
+                rows.append([next_churn + 0.5 + rnd.random() * 0.5, c, "invoke", "JoinRoom", [new]])
+                room_of[c] = new
+            next_churn += 1.0
+        c = rnd.randrange(connections)
+        for k in range(rnd.randint(1, burst)):
+            sender = c if rnd.random() < 0.7 else rnd.randrange(connections)
+            text = "msg %d from user%d" % (len(rows), sender)
+            if rnd.random() < 0.02:
+                rows.append([t + k * 0.002, sender, "send", "SendMessage", ["user%d" % sender, text]])
+            else:
+                rows.append([t + k * 0.002, sender, "send", "SendMessageToRoom", [room_of[sender], "user%d" % sender, text]])
+
+    for c in range(connections):
+        rows.append([end + rnd.uniform(0, ramp / 2), c, "close"])
+    rows.sort(key=lambda r: r[0])
+    return tracefile.WriteTrace(path, "hubtrace", VERSION, rows, synthetic=True, seed=seed)
+
+def Stats(events):
+    conns = set()
+    kinds = {}
+    targets = {}
+    for e in events:
+        conns.add(e[1])
+        kinds[e[2]] = kinds.get(e[2], 0) + 1
+        if e[2] in ("invoke", "send"):
+            targets[e[3]] = targets.get(e[3], 0) + 1
+    return {"events": len(events), "connections": len(conns), "duration": events[-1][0] - events[0][0] if events else 0.0,
+        "kinds": kinds, "targets": targets}
+
+class ReplayResult:
+    def __init__(self):
+        self.latency = Histogram()      # 送达延迟 us
+        self.lag = Histogram()          # 事件实际执行时间晚于计划的量 us
+        self.sent = 0
+        self.delivered = 0
+        self.events = 0
+        self.errors = {}
+        self.elapsed = 0.0
+        self.trace_duration = 0.0
+        self.opened = 0
+
+    def error(self, e):
+        name = type(e).__name__ if isinstance(e, Exception) else str(e)
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+    def report(self):
+        lines = [
+            "事件: %d, 连接: %d, 轨迹时长 %.1fs, 回放耗时 %.1fs (实际倍速 x%.1f)" % (
+                self.events, self.opened, self.trace_duration, self.elapsed,
+                self.trace_duration / self.elapsed if self.elapsed else 0.0),
+            "消息: 发出 %d, 送达 %d 次 (平均扇出 %.1f)" % (
+                self.sent, self.delivered, self.delivered / float(self.sent) if self.sent else 0.0),
+            "送达延迟: " + FormatLatency(self.latency),
+        ]
+        if self.lag.count:
+            # 尽快回放时不按时刻调度，没有滞后可言
+            lines.insert(1, "调度滞后: " + FormatLatency(self.lag, (50, 99)))
+        for kind, n in sorted(self.errors.items(), key=lambda kv: -kv[1]):
+            lines.append("错误 %s: %d" % (kind, n))
+        return "\n".join(lines)
+
+def Phases(events):
+    """尽快回放的分段：按轨迹顺序把事件切成连续的段，消息（send 和带标记的 invoke）一段，
+    连接、断开和其他调用（JoinRoom / LeaveRoom）一段，交替出现；返回每个事件的段号列表
+    """
+    phases = []
+    p = -1
+    last = None
+    for e in events:
+        message = e[2] == "send" or (e[2] == "invoke" and e[3] in TAGGED)
+        if message != last:
+            p += 1
+            last = message
+        phases.append(p)
+    return phases
+
+async def Replay(events, server = SERVER, speed = 1.0, connect_concurrency = 100, drain = 2.0, protocol = None):
+    """按轨迹驱动连接，speed 为倍速，0 表示尽快
+
+    尽快回放时各连接不等计划时刻，但仍按 Phases 分段：一段全部完成后才开始下一段，段内并发。
+    消息发出时的房间成员与轨迹中相同，扇出不会因为有的连接先跑完加入、离开而走样。
+    """
+    result = ReplayResult()
+    events = [e for e in events if e[2] != "recv"]
+    if not events:
+        return result
+    loop = asyncio.get_running_loop()
+    phases = Phases(events)
+    per_conn = {}
+    for e, p in zip(events, phases):
+        per_conn.setdefault(e[1], []).append((e, p))
+    # gates[p] 在第 p 段之前的事件全部完成时就绪
+    totals = [0] * (phases[-1] + 1)
+    for p in phases:
+        totals[p] += 1
+    finished = [0] * len(totals)
+    gates = [loop.create_future() for _ in range(len(totals) + 1)]
+    gates[0].set_result(None)
+    result.events = len(events)
+    result.trace_duration = events[-1][0] - events[0][0]
+    base = events[0][0]
+    sem = asyncio.Semaphore(connect_concurrency)
+    # 按序号保存发出时刻（ns），长时间回放也只占每条消息 8 字节
+    sent_at = array('q')
+    target, index = DELIVERY
+
+    def on_deliver(*args):
+        text = args[index] if len(args) > index else None
+        if not isinstance(text, str):
+            return
+        pos = text.rfind(TAG)
+        if pos < 0:
+            return
+        n = int(text[pos + len(TAG):])
+        if n < len(sent_at):
+            t0 = sent_at[n]
+            result.latency.record((time.perf_counter_ns() - t0) // 1000)
+            result.delivered += 1
+
+    async def run_conn(cid, evs):
+        conn = None
+        for e, p in evs:
+            if speed:
+                delay = start + (e[0] - base) / speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                result.lag.record(max(0.0, loop.time() - start - (e[0] - base) / speed) * 1e6)
+            else:
+                await gates[p]
+            kind = e[2]
+            try:
+                if kind == "open":
+                    conn = HubConnection(server + e[3], protocol=protocol or e[4], keepalive=0)
+                    conn.on(target, on_deliver)
+                    async with sem:
+                        await conn.start()
+                    result.opened += 1
+                elif conn is None:
+                    continue
+                elif kind == "close":
+                    await conn.stop()
+                    conn = None
+                else:
+                    args = list(e[4])
+                    i = TAGGED.get(e[3])
+                    if i is not None and i < len(args):
+                        args[i] = "%s%s%d" % (args[i], TAG, len(sent_at))
+                        sent_at.append(time.perf_counter_ns())
+                        result.sent += 1
+                    if kind == "invoke":
+                        await conn.invoke(e[3], *args)
+                    else:
+                        await conn.send(e[3], *args)
+            except Exception as ex:
+                result.error(ex)
+                if kind == "open":
+                    conn = None
+            finally:
+                finished[p] += 1
+                if finished[p] == totals[p]:
+                    gates[p + 1].set_result(None)
+        return conn
+
+    start = loop.time()
+    t0 = time.perf_counter()
+    leftover = await asyncio.gather(*(run_conn(cid, evs) for cid, evs in per_conn.items()))
+    result.elapsed = time.perf_counter() - t0
+    # 等最后发出的消息送达
+    await asyncio.sleep(drain)
+    for conn in leftover:
+        if conn is not None:
+            await conn.stop()
+    return result
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="Hub 流量轨迹的生成、统计和回放")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("synth", help="生成房间聊天轨迹")
+    p.add_argument("-o", "--output", required=True)
+    p.add_argument("--connections", type=int, default=200)
+    p.add_argument("--rooms", type=int, default=20)
+    p.add_argument("--duration", type=float, default=60.0)
+    p.add_argument("--rate", type=float, default=50.0, help="平均房间消息数/秒")
+    p.add_argument("--burst", type=int, default=8, help="一次突发的最大消息数")
+    p.add_argument("--churn", type=float, default=0.05, help="每秒换房间的连接比例")
+    p.add_argument("--protocol", default="json", choices=["json", "messagepack"])
+    p.add_argument("--seed", type=int, default=1)
+
+    p = sub.add_parser("stats", help="轨迹概况")
+    p.add_argument("trace")
+
+    p = sub.add_parser("replay", help="回放轨迹")
+    p.add_argument("trace")
+    p.add_argument("--server", default=SERVER)
+    p.add_argument("--speed", default="1", help="倍速，如 1、10，max 表示尽快")
+    p.add_argument("--protocol", default=None, choices=["json", "messagepack"], help="覆盖轨迹中记录的协议")
+    p.add_argument("--connect-concurrency", type=int, default=100)
+    p.add_argument("--drain", type=float, default=2.0, help="回放结束后等待送达的时间（秒）")
+    args = parser.parse_args(argv)
+
+    if args.command == "synth":
+        n = Synthesize(args.output, args.connections, args.rooms, args.duration, args.rate, args.burst, args.churn,
+            args.protocol, args.seed)
+        print("%d 个事件写入 %s" % (n, args.output))
+        return 0
+    header, events = ReadTrace(args.trace)
+    if args.command == "stats":
+        print(Stats(events))
+        return 0
+
+    from hubscale import RaiseFileLimit
+    RaiseFileLimit()
+    speed = 0.0 if args.speed == "max" else float(args.speed)
+    result = asyncio.run(Replay(events, args.server, speed, args.connect_concurrency, args.drain, args.protocol))
+    print(result.report())
+    return 1 if result.errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
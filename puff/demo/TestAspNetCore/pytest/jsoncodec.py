@@ -0,0 +1,123 @@
+#encoding=utf8
+
+# 可替换的 JSON 编解码：直接在 bytes / memoryview 上编解码，省掉 str 中间层
+# 默认用标准库 json，安装了 orjson 时自动使用 orjson（编码直接产出 bytes，解码接受 memoryview，不拷贝）
+#
+#   python jsoncodec.py                            离线对比各编解码器处理 /my/echo 负载的耗时
+#   python jsoncodec.py --server http://127.0.0.1:5000 --size 100000
+
+import sys
+import json
+import time
+import timeit
+import argparse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+class StdCodec:
+    name = "json"
+
+    def dumps(self, obj):
+        # 紧凑格式，非 ASCII 字符直接输出 UTF-8，请求体更短
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode('utf-8')
+
+    def loads(self, data):
+        # json.loads 可以直接接受 UTF-8 bytes；memoryview 只能先拷贝一次
+        if isinstance(data, memoryview):
+            data = bytes(data)
+        return json.loads(data)
+
+class OrjsonCodec:
+    name = "orjson"
+
+    def dumps(self, obj):
+        return orjson.dumps(obj)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+CODECS = {StdCodec.name: StdCodec()}
+if orjson is not None:
+    CODECS[OrjsonCodec.name] = OrjsonCodec()
+
+_codec = CODECS.get("orjson") or CODECS["json"]
+
+def GetCodec():
+    return _codec
+
+def SetCodec(codec):
+    """切换全局编解码器，codec 为名字（json / orjson）或带 dumps/loads 方法的对象"""
+    global _codec
+    if isinstance(codec, str):
+        if codec not in CODECS:
+            raise ValueError("JSON codec not available: %s" % codec)
+        codec = CODECS[codec]
+    _codec = codec
+
+def dumps(obj):
+    """编码为 UTF-8 bytes"""
+    return _codec.dumps(obj)
+
+def loads(data):
+    """从 bytes / bytearray / memoryview 解码"""
+    return _codec.loads(data)
+
+def EchoPayload(size):
+    """构造大小约为 size 字节的 /my/echo 响应"""
+    return {"stat": "ok", "name": "x" * max(1, size - 32), "count": size}
+
+def Benchmark(size = 1000, number = None):
+    """对比旧路径（json.dumps + encode / decode + json.loads）与各编解码器的 bytes 路径，返回 {名字: (编码us, 解码us)}"""
+    obj = EchoPayload(size)
+    body = json.dumps(obj).encode('utf-8')
+    number = number or max(10, 2000000 // max(size, 100))
+    results = {}
+
+    enc = timeit.timeit(lambda: json.dumps(obj).encode('utf-8'), number=number)
+    dec = timeit.timeit(lambda: json.loads(body.decode('utf-8')), number=number)
+    results["str"] = (enc / number * 1e6, dec / number * 1e6)
+    for name, codec in CODECS.items():
+        assert codec.loads(memoryview(codec.dumps(obj))) == obj
+        enc = timeit.timeit(lambda: codec.dumps(obj), number=number)
+        dec = timeit.timeit(lambda: codec.loads(body), number=number)
+        results[name] = (enc / number * 1e6, dec / number * 1e6)
+    return results
+
+def BenchmarkEcho(server, size = 1000, count = 200):
+    """对 /my/echo 实际往返，返回 {名字: 每次调用的平均耗时 ms}"""
+    from httpclient import Session
+    url = server + "/my/echo"
+    obj = {"name": "x" * size, "count": size}
+    results = {}
+    with Session(cookies=False) as session:
+        for name, codec in CODECS.items():
+            session.request(url, None, codec.dumps(obj))
+            t0 = time.perf_counter()
+            for _ in range(count):
+                code, _, body = session.request(url, None, codec.dumps(obj))
+                assert code == 200 and codec.loads(body)["count"] == size
+            results[name] = (time.perf_counter() - t0) / count * 1000
+    return results
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="JSON 编解码基准")
+    parser.add_argument("--size", type=int, action="append", default=None, help="负载字节数，可重复指定")
+    parser.add_argument("--server", default=None, help="指定时同时测 /my/echo 实际往返")
+    parser.add_argument("--count", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    print("当前编解码器: %s" % _codec.name)
+    for size in args.size or [100, 10000, 1000000]:
+        print("负载 %d 字节:" % size)
+        for name, (enc, dec) in Benchmark(size).items():
+            print("   %-8s 编码 %10.2fus  解码 %10.2fus" % (name, enc, dec))
+        if args.server:
+            for name, ms in BenchmarkEcho(args.server, size, args.count).items():
+                print("   %-8s /my/echo 往返 %.3fms" % (name, ms))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,344 @@
+#encoding=utf8
+
+# 开环压测：按固定速率发请求（不等上一个返回），统计吞吐、错误率和延迟分布
+#
+#   python loadgen.py /my/echo --rate 1000 --duration 10 --concurrency 64 --data '{"name":"x","count":1}'
+#   python loadgen.py /my/ping --rate 20000 --duration 30 --processes 8 --interval 1
+#
+# 单进程受 GIL 限制，--processes N 时由 N 个进程各按 rate/N 发送（发送时刻错开，合起来仍是均匀的 rate），
+# 每个进程把延迟记入固定分桶的 Histogram，协调进程逐桶相加合并，合并结果与单个直方图记录全部样本完全相同。
+# 按 --interval 分段的时间序列（完成数、错误数、分位数）同样逐段合并，用来看出服务器在哪一刻到顶。
+#
+# 延迟同时按两种起点统计：从实际发出算（未校正），和从计划发出时刻算（校正协调遗漏，coordinated omission）。
+# 服务器卡顿时请求在客户端排队、发得更晚，未校正的分位数看不到这段等待，校正后的才是用户实际经历的延迟。
+# --sequential 模拟测试脚本里一次一个的循环：同一时刻只有一个请求在途，但仍按固定时间表计划发送时刻。
+
+import sys
+import time
+import asyncio
+import argparse
+import multiprocessing
+
+from aioclient import AsyncSession
+from histogram import Histogram, FormatLatency
+from sketch import Sketch, FormatSize
+from workers import CollectResults
+import jsoncodec
+
+server = "http://127.0.0.1:5000"
+
+# 定时器唤醒通常会晚零点几毫秒，计划时刻前的最后这段改为忙等，免得把定时器误差算进校正延迟
+SPIN = 0.002
+
+def CheckApi(code, body):
+    """按 IceApi 约定检查响应，成功返回 None，否则返回错误类别"""
+    if code != 200:
+        return "HTTP %d" % code
+    try:
+        r = jsoncodec.loads(body)
+    except ValueError:
+        return None  # JsonIn/Http 接口返回的不是 JSON
+    if isinstance(r, dict) and r.get("stat", "ok") != "ok":
+        return r["stat"]
+    return None
+
+class Interval:
+    """时间序列中的一段：按完成时刻归入"""
+
+    __slots__ = ("histogram", "corrected", "errors")
+
+    def __init__(self):
+        self.histogram = Histogram()
+        self.corrected = Histogram()
+        self.errors = 0
+
+class LoadResult:
+    def __init__(self, url, rate, duration, concurrency, interval = 1.0):
+        self.url = url
+        self.rate = rate
+        self.duration = duration
+        self.concurrency = concurrency
+        self.interval = interval
+        self.histogram = Histogram()       # 从实际发出算
+        self.corrected = Histogram()       # 从计划发出时刻算
+        self.sizes = Sketch()              # 响应体字节数
+        self.series = []
+        self.sent = 0
+        self.completed = 0
+        self.errors = {}
+        self.late = 0          # 因并发上限未能按计划时间发出的请求
+        self.elapsed = 0.0
+        self.processes = 1
+        self.start = None      # perf_counter 起点，分段用
+
+    def record(self, us, corrected_us, error, size = None):
+        self.histogram.record(us)
+        if size is not None:
+            self.sizes.record(size)
+        self.corrected.record(corrected_us)
+        self.completed += 1
+        if self.interval:
+            idx = int((time.perf_counter() - self.start) / self.interval)
+            while len(self.series) <= idx:
+                self.series.append(Interval())
+            self.series[idx].histogram.record(us)
+            self.series[idx].corrected.record(corrected_us)
+        if error is not None:
+            self.errors[error] = self.errors.get(error, 0) + 1
+            if self.interval:
+                self.series[idx].errors += 1
+
+    def merge(self, other):
+        """合并另一个进程的结果，各进程的分段以同一时刻为起点"""
+        self.histogram.merge(other.histogram)
+        self.corrected.merge(other.corrected)
+        self.sizes.merge(other.sizes)
+        while len(self.series) < len(other.series):
+            self.series.append(Interval())
+        for mine, theirs in zip(self.series, other.series):
+            mine.histogram.merge(theirs.histogram)
+            mine.corrected.merge(theirs.corrected)
+            mine.errors += theirs.errors
+        self.sent += other.sent
+        self.completed += other.completed
+        for kind, n in other.errors.items():
+            self.errors[kind] = self.errors.get(kind, 0) + n
+        self.late += other.late
+        self.elapsed = max(self.elapsed, other.elapsed)
+        return self
+
+    def to_dict(self):
+        return {
+            "url": self.url, "rate": self.rate, "duration": self.duration, "concurrency": self.concurrency,
+            "interval": self.interval, "histogram": self.histogram.to_dict(), "corrected": self.corrected.to_dict(),
+            "sizes": self.sizes.to_dict(),
+            "series": [(i.histogram.to_dict(), i.corrected.to_dict(), i.errors) for i in self.series],
+            "sent": self.sent, "completed": self.completed, "errors": self.errors, "late": self.late, "elapsed": self.elapsed,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        r = cls(d["url"], d["rate"], d["duration"], d["concurrency"], d["interval"])
+        r.histogram = Histogram.from_dict(d["histogram"])
+        r.corrected = Histogram.from_dict(d["corrected"])
+        r.sizes = Sketch.from_dict(d["sizes"])
+        for h, c, errors in d["series"]:
+            i = Interval()
+            i.histogram = Histogram.from_dict(h)
+            i.corrected = Histogram.from_dict(c)
+            i.errors = errors
+            r.series.append(i)
+        r.sent = d["sent"]
+        r.completed = d["completed"]
+        r.errors = dict(d["errors"])
+        r.late = d["late"]
+        r.elapsed = d["elapsed"]
+        return r
+
+    def error_count(self):
+        return sum(self.errors.values())
+
+    def throughput(self):
+        return self.completed / self.elapsed if self.elapsed else 0.0
+
+    def report(self):
+        errors = self.error_count()
+        lines = [
+            "%s: 目标 %d req/s x %gs, 并发上限 %d%s" % (self.url, self.rate, self.duration, self.concurrency,
+                " (每进程), %d 个进程" % self.processes if self.processes > 1 else ""),
+            "   请求: %d, 完成: %d, 失败: %d (%.2f%%), 滞后发送: %d" % (
+                self.sent, self.completed, errors, 100.0 * errors / self.completed if self.completed else 0.0, self.late),
+            "   吞吐: %.1f req/s" % self.throughput(),
+            "   延迟（从实际发出）: " + FormatLatency(self.histogram),
+            "   延迟（从计划时刻）: " + FormatLatency(self.corrected),
+            "   响应大小: " + FormatSize(self.sizes),
+        ]
+        for kind, n in sorted(self.errors.items(), key=lambda kv: -kv[1]):
+            lines.append("   错误 %s: %d" % (kind, n))
+        return "\n".join(lines)
+
+    def report_series(self):
+        lines = ["%8s %8s %10s %6s  %-40s %s" % ("时刻", "完成", "req/s", "错误", "延迟（从实际发出）", "延迟（从计划时刻）")]
+        for idx, i in enumerate(self.series):
+            h = i.histogram
+            lines.append("%7.1fs %8d %10.1f %6d  %-44s %s" % (
+                (idx + 1) * self.interval, h.count, h.count / self.interval, i.errors,
+                FormatLatency(h, (50, 99)), FormatLatency(i.corrected, (50, 99))))
+        return "\n".join(lines)
+
+async def _SleepUntil(t):
+    """等到 perf_counter 时刻 t：先 sleep 到 t - SPIN，剩下的让出事件循环忙等"""
+    delay = t - time.perf_counter() - SPIN
+    if delay > 0:
+        await asyncio.sleep(delay)
+    while time.perf_counter() < t:
+        await asyncio.sleep(0)
+
+def _WaitUntil(t):
+    """_SleepUntil 的阻塞版"""
+    delay = t - time.perf_counter() - SPIN
+    if delay > 0:
+        time.sleep(delay)
+    while time.perf_counter() < t:
+        pass
+
+async def _Issue(session, result, url, headers, data, intended):
+    """intended 为计划发出的 perf_counter 时刻"""
+    t0 = time.perf_counter()
+    size = None
+    try:
+        code, _, body = await session.request(url, headers, data, "POST" if data is not None else "GET")
+        size = len(body)
+        error = CheckApi(code, body)
+    except Exception as e:
+        error = type(e).__name__
+    end = time.perf_counter()
+    result.record((end - t0) * 1e6, (end - intended) * 1e6, error, size)
+
+async def RunLoad(url, rate, duration, concurrency = 64, data = None, headers = None, session = None,
+        interval = 1.0, offset = 0.0, start_at = None, count = None):
+    """按 rate 的固定间隔发请求，持续 duration 秒，同时在途不超过 concurrency
+
+    interval 为时间序列的分段长度（秒），0 表示不分段；offset 把整个发送计划推后若干秒，
+    start_at 为开始的墙钟时刻（time.time()），多进程时用来对齐各进程的起点和分段；
+    count 为请求总数，默认 int(rate * duration)。
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    own = session is None
+    session = session or AsyncSession(limit=concurrency)
+    result = LoadResult(url, rate, duration, concurrency, interval)
+    sem = asyncio.Semaphore(concurrency)
+    tasks = set()
+    gap = 1.0 / rate
+    total = int(rate * duration) if count is None else count
+
+    def done(t):
+        tasks.discard(t)
+        sem.release()
+
+    if start_at is not None:
+        await asyncio.sleep(max(0.0, start_at - time.time()))
+    start = result.start = time.perf_counter()
+    try:
+        for i in range(total):
+            intended = start + offset + i * gap
+            await _SleepUntil(intended)
+            await sem.acquire()
+            if time.perf_counter() - intended > gap:
+                result.late += 1
+            t = asyncio.ensure_future(_Issue(session, result, url, headers, data, intended))
+            t.add_done_callback(done)
+            tasks.add(t)
+            result.sent += 1
+        if tasks:
+            await asyncio.wait(tasks)
+    finally:
+        result.elapsed = time.perf_counter() - start
+        if own:
+            session.close()
+    return result
+
+async def RunSequential(url, rate, duration, data = None, headers = None, session = None, interval = 1.0):
+    """同一时刻只有一个请求在途，按 rate 的固定时间表计划发送；前一个超时占用了后面的计划时刻时立即补发，
+    校正延迟从计划时刻算，服务器卡顿期间本该发出的请求都会计入这段等待
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    own = session is None
+    session = session or AsyncSession(limit=1)
+    result = LoadResult(url, rate, duration, 1, interval)
+    gap = 1.0 / rate
+    start = result.start = time.perf_counter()
+    try:
+        for i in range(int(rate * duration)):
+            intended = start + i * gap
+            if time.perf_counter() - intended > gap:
+                result.late += 1
+            await _SleepUntil(intended)
+            result.sent += 1
+            await _Issue(session, result, url, headers, data, intended)
+    finally:
+        result.elapsed = time.perf_counter() - start
+        if own:
+            session.close()
+    return result
+
+def MeasureTimeline(fn, rate, count):
+    """阻塞版的固定时间表测量，用于测试脚本里的 for 循环：按 rate 计划调用 fn() count 次，
+    返回 (从实际调用算的 Histogram, 从计划时刻算的 Histogram, 各次 fn() 的返回值)，延迟单位 us
+    """
+    actual = Histogram()
+    corrected = Histogram()
+    results = []
+    gap = 1.0 / rate
+    start = time.perf_counter()
+    for i in range(count):
+        intended = start + i * gap
+        _WaitUntil(intended)
+        t0 = time.perf_counter()
+        results.append(fn())
+        end = time.perf_counter()
+        actual.record((end - t0) * 1e6)
+        corrected.record((end - intended) * 1e6)
+    return (actual, corrected, results)
+
+def _Worker(url, rate, duration, concurrency, data, headers, interval, offset, start_at, count, results):
+    result = asyncio.run(RunLoad(url, rate, duration, concurrency, data, headers, None, interval, offset, start_at, count))
+    results.put(result.to_dict())
+
+def RunProcesses(url, rate, duration, processes = None, concurrency = 64, data = None, headers = None, interval = 1.0):
+    """在 processes 个进程中各跑 RunLoad(rate / processes)，合并成一个 LoadResult
+
+    各进程第 k 个请求的计划时刻依次错开 1/rate，合起来与单进程按 rate 发送的计划相同：
+    第 j 个请求由进程 j % processes 发出，int(rate * duration) 除不尽的余数分给前几个进程。
+    """
+    processes = processes or multiprocessing.cpu_count()
+    total = int(rate * duration)
+    results = multiprocessing.Queue()
+    # 留出进程启动的时间，各进程从同一墙钟时刻开始
+    start_at = time.time() + 0.5 + 0.05 * processes
+    workers = []
+    for i in range(processes):
+        count = total // processes + (1 if i < total % processes else 0)
+        p = multiprocessing.Process(target=_Worker, daemon=True, args=(
+            url, rate / processes, duration, concurrency, data, headers, interval, i / float(rate), start_at, count, results))
+        p.start()
+        workers.append(p)
+    merged = LoadResult(url, rate, duration, concurrency, interval)
+    # 工作进程崩溃时不会放回结果，按时间表发完后再给 60 秒收尾
+    for d in CollectResults(results, workers, start_at - time.time() + duration + 60):
+        merged.merge(LoadResult.from_dict(d))
+    merged.processes = processes
+    return merged
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="开环压测 JmController 接口")
+    parser.add_argument("endpoint", help="接口路径（如 /my/echo）或完整 URL")
+    parser.add_argument("--server", default=server)
+    parser.add_argument("--rate", type=float, default=100, help="目标请求速率 req/s")
+    parser.add_argument("--duration", type=float, default=10, help="持续时间（秒）")
+    parser.add_argument("--concurrency", type=int, default=64, help="同时在途请求上限")
+    parser.add_argument("--data", default=None, help="JSON 请求体，如 '{\"x\":1,\"y\":2}'")
+    parser.add_argument("-H", "--header", action="append", default=[], help="附加请求头 'Name: value'")
+    parser.add_argument("--processes", type=int, default=1, help="发压进程数，0 表示 CPU 核数")
+    parser.add_argument("--interval", type=float, default=1.0, help="时间序列的分段长度（秒），0 表示不输出")
+    parser.add_argument("--sequential", action="store_true", help="一次一个请求，仍按固定时间表计划发送")
+    args = parser.parse_args(argv)
+
+    url = args.endpoint if "://" in args.endpoint else args.server + args.endpoint
+    headers = dict(h.split(":", 1) for h in args.header)
+    headers = {k.strip(): v.strip() for k, v in headers.items()}
+    if args.sequential:
+        result = asyncio.run(RunSequential(url, args.rate, args.duration, args.data, headers, interval=args.interval))
+    elif args.processes == 1:
+        result = asyncio.run(RunLoad(url, args.rate, args.duration, args.concurrency, args.data, headers, interval=args.interval))
+    else:
+        result = RunProcesses(url, args.rate, args.duration, args.processes, args.concurrency, args.data, headers, args.interval)
+    print(result.report())
+    if args.interval:
+        print(result.report_series())
+    return 0 if result.error_count() == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
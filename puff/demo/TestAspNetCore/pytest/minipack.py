@@ -0,0 +1,188 @@
+#encoding=utf8
+
+# 最小的 MessagePack 编解码（只覆盖 SignalR 消息用到的类型）；安装了 msgpack 包时优先使用它
+
+import struct
+
+try:
+    import msgpack as _msgpack
+except ImportError:
+    _msgpack = None
+
+class ExtType:
+    def __init__(self, code, data):
+        self.code = code
+        self.data = data
+
+    def __eq__(self, other):
+        return isinstance(other, ExtType) and (self.code, self.data) == (other.code, other.data)
+
+    def __repr__(self):
+        return "ExtType(%d, %r)" % (self.code, self.data)
+
+def _PackInto(out, o):
+    if o is None:
+        out.append(0xc0)
+    elif o is True:
+        out.append(0xc3)
+    elif o is False:
+        out.append(0xc2)
+    elif isinstance(o, int):
+        if 0 <= o < 0x80:
+            out.append(o)
+        elif -32 <= o < 0:
+            out.append(o & 0xff)
+        elif o >= 0:
+            if o <= 0xff:
+                out += b"\xcc" + struct.pack(">B", o)
+            elif o <= 0xffff:
+                out += b"\xcd" + struct.pack(">H", o)
+            elif o <= 0xffffffff:
+                out += b"\xce" + struct.pack(">I", o)
+            else:
+                out += b"\xcf" + struct.pack(">Q", o)
+        else:
+            if o >= -0x80:
+                out += b"\xd0" + struct.pack(">b", o)
+            elif o >= -0x8000:
+                out += b"\xd1" + struct.pack(">h", o)
+            elif o >= -0x80000000:
+                out += b"\xd2" + struct.pack(">i", o)
+            else:
+                out += b"\xd3" + struct.pack(">q", o)
+    elif isinstance(o, float):
+        out += b"\xcb" + struct.pack(">d", o)
+    elif isinstance(o, str):
+        b = o.encode('utf-8')
+        n = len(b)
+        if n < 32:
+            out.append(0xa0 | n)
+        elif n <= 0xff:
+            out += b"\xd9" + struct.pack(">B", n)
+        elif n <= 0xffff:
+            out += b"\xda" + struct.pack(">H", n)
+        else:
+            out += b"\xdb" + struct.pack(">I", n)
+        out += b
+    elif isinstance(o, (bytes, bytearray, memoryview)):
+        n = len(o)
+        if n <= 0xff:
+            out += b"\xc4" + struct.pack(">B", n)
+        elif n <= 0xffff:
+            out += b"\xc5" + struct.pack(">H", n)
+        else:
+            out += b"\xc6" + struct.pack(">I", n)
+        out += o
+    elif isinstance(o, (list, tuple)):
+        n = len(o)
+        if n < 16:
+            out.append(0x90 | n)
+        elif n <= 0xffff:
+            out += b"\xdc" + struct.pack(">H", n)
+        else:
+            out += b"\xdd" + struct.pack(">I", n)
+        for item in o:
+            _PackInto(out, item)
+    elif isinstance(o, dict):
+        n = len(o)
+        if n < 16:
+            out.append(0x80 | n)
+        elif n <= 0xffff:
+            out += b"\xde" + struct.pack(">H", n)
+        else:
+            out += b"\xdf" + struct.pack(">I", n)
+        for k, v in o.items():
+            _PackInto(out, k)
+            _PackInto(out, v)
+    else:
+        raise TypeError("can not serialize %r" % type(o))
+
+# 定长格式：类型字节 -> (struct 格式, 长度)
+_FIXED = {
+    0xcc: (">B", 1), 0xcd: (">H", 2), 0xce: (">I", 4), 0xcf: (">Q", 8),
+    0xd0: (">b", 1), 0xd1: (">h", 2), 0xd2: (">i", 4), 0xd3: (">q", 8),
+    0xca: (">f", 4), 0xcb: (">d", 8),
+}
+# 变长格式：类型字节 -> (长度的 struct 格式, 长度字节数, 种类)
+_VAR = {
+    0xd9: (">B", 1, "str"), 0xda: (">H", 2, "str"), 0xdb: (">I", 4, "str"),
+    0xc4: (">B", 1, "bin"), 0xc5: (">H", 2, "bin"), 0xc6: (">I", 4, "bin"),
+    0xdc: (">H", 2, "array"), 0xdd: (">I", 4, "array"),
+    0xde: (">H", 2, "map"), 0xdf: (">I", 4, "map"),
+    0xc7: (">B", 1, "ext"), 0xc8: (">H", 2, "ext"), 0xc9: (">I", 4, "ext"),
+}
+_FIXEXT = {0xd4: 1, 0xd5: 2, 0xd6: 4, 0xd7: 8, 0xd8: 16}
+
+def _Unpack(data, pos):
+    b = data[pos]
+    pos += 1
+    if b < 0x80:
+        return (b, pos)
+    if b >= 0xe0:
+        return (b - 0x100, pos)
+    if 0xa0 <= b <= 0xbf:
+        n = b & 0x1f
+        return (str(data[pos:pos + n], 'utf-8'), pos + n)
+    if 0x90 <= b <= 0x9f:
+        return _UnpackArray(data, pos, b & 0x0f)
+    if 0x80 <= b <= 0x8f:
+        return _UnpackMap(data, pos, b & 0x0f)
+    if b == 0xc0:
+        return (None, pos)
+    if b == 0xc2:
+        return (False, pos)
+    if b == 0xc3:
+        return (True, pos)
+    if b in _FIXED:
+        fmt, size = _FIXED[b]
+        return (struct.unpack_from(fmt, data, pos)[0], pos + size)
+    if b in _VAR:
+        fmt, size, kind = _VAR[b]
+        n = struct.unpack_from(fmt, data, pos)[0]
+        pos += size
+        if kind == "str":
+            return (str(data[pos:pos + n], 'utf-8'), pos + n)
+        if kind == "bin":
+            return (bytes(data[pos:pos + n]), pos + n)
+        if kind == "array":
+            return _UnpackArray(data, pos, n)
+        if kind == "map":
+            return _UnpackMap(data, pos, n)
+        code = struct.unpack_from(">b", data, pos)[0]
+        return (ExtType(code, bytes(data[pos + 1:pos + 1 + n])), pos + 1 + n)
+    if b in _FIXEXT:
+        n = _FIXEXT[b]
+        code = struct.unpack_from(">b", data, pos)[0]
+        return (ExtType(code, bytes(data[pos + 1:pos + 1 + n])), pos + 1 + n)
+    raise ValueError("invalid msgpack type 0x%02x" % b)
+
+def _UnpackArray(data, pos, n):
+    items = []
+    for _ in range(n):
+        item, pos = _Unpack(data, pos)
+        items.append(item)
+    return (items, pos)
+
+def _UnpackMap(data, pos, n):
+    m = {}
+    for _ in range(n):
+        k, pos = _Unpack(data, pos)
+        v, pos = _Unpack(data, pos)
+        m[k] = v
+    return (m, pos)
+
+def packb(o):
+    if _msgpack is not None:
+        return _msgpack.packb(o, use_bin_type=True)
+    out = bytearray()
+    _PackInto(out, o)
+    return bytes(out)
+
+def unpackb(data):
+    """解码一个完整对象；data 可以是 bytes 或 memoryview"""
+    if _msgpack is not None:
+        return _msgpack.unpackb(data, raw=False, strict_map_key=False)
+    o, pos = _Unpack(data, 0)
+    if pos != len(data):
+        raise ValueError("extra data after msgpack object")
+    return o
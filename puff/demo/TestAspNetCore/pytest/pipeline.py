@@ -0,0 +1,113 @@
+#encoding=utf8
+
+# IceApi 批量调用：在一条长连接上用 HTTP/1.1 pipelining 连续写出请求，再按顺序读回响应
+#
+#   rs = RequestBatch([("/my/div", {"x": 6, "y": 3}), ("/my/swap", {"x": 1, "y": 2})])
+#
+# 每个调用的结果放在返回列表的对应位置：成功是解析后的 JSON，失败是 IceApiError 实例（不抛出）。
+
+import asyncio
+import http.client
+import urllib.parse
+
+from aioclient import AsyncConnection, BuildRequest, ReadResponse
+from httpclient import IceApiError
+import jsoncodec
+
+server = "http://127.0.0.1:5000"
+
+# 连接被服务器关闭时会遇到的异常，未收到响应的请求换新连接重发
+_CLOSED_ERRORS = (http.client.RemoteDisconnected, asyncio.IncompleteReadError, ConnectionResetError, BrokenPipeError)
+
+def ParseResult(code, body):
+    """按 IceApi 约定解析一个响应，失败返回 IceApiError"""
+    if code != 200:
+        return IceApiError("HTTP %d" % code)
+    try:
+        r = jsoncodec.loads(body)
+    except ValueError:
+        # JsonIn/Http 接口返回的不是 JSON
+        return body.decode('utf-8')
+    if isinstance(r, dict) and r.get("stat", "ok") != "ok":
+        return IceApiError(r["stat"], r.get("m"))
+    return r
+
+def _Encode(host, call, headers):
+    path, kwargs = call
+    hdrs = {"Host": host, "Accept-Encoding": "identity"}
+    if kwargs is not None:
+        hdrs["Content-Type"] = "application/json"
+    if headers:
+        hdrs.update(headers)
+    return BuildRequest(_Method(call), path, hdrs, None if kwargs is None else jsoncodec.dumps(kwargs))
+
+def _Method(call):
+    return "GET" if call[1] is None else "POST"
+
+async def _RunPipeline(conn, requests, methods, results, start, depth, timeout):
+    """从 start 开始在 conn 上发送请求并读取响应，返回本连接处理完的请求数
+
+    某个响应超过 timeout 未到时，它和之后的请求都记为 IceApiError("Timeout")，连接由调用者关闭。
+    """
+    window = asyncio.Semaphore(depth)
+
+    async def sender():
+        for i in range(start, len(requests)):
+            # 在途请求不超过 depth 个，避免服务器的响应堆满缓冲区
+            await window.acquire()
+            conn.writer.write(requests[i])
+            await conn.writer.drain()
+
+    task = asyncio.ensure_future(sender())
+    done = 0
+    try:
+        for i in range(start, len(requests)):
+            try:
+                code, headers, body, keep_alive = await asyncio.wait_for(ReadResponse(conn.reader, methods[i]), timeout)
+            except _CLOSED_ERRORS:
+                break
+            except asyncio.TimeoutError:
+                # 后面的响应排在它之后，同一连接上也不会再到
+                for j in range(i, len(requests)):
+                    results[j] = IceApiError("Timeout")
+                done += len(requests) - i
+                break
+            results[i] = ParseResult(code, body)
+            done += 1
+            window.release()
+            if not keep_alive:
+                break
+    finally:
+        task.cancel()
+        # 写失败（连接已断）时读端也会结束，这里只取走异常
+        if task.done() and not task.cancelled():
+            task.exception()
+    return done
+
+async def Pipeline(calls, server = server, headers = None, depth = 64, timeout = 30):
+    """批量调用 IceApi，calls 为 [(path, kwargs), ...]，kwargs 为 None 时发 GET"""
+    parts = urllib.parse.urlsplit(server)
+    scheme = parts.scheme or "http"
+    port = parts.port or (443 if scheme == "https" else 80)
+    requests = [_Encode(parts.netloc, call, headers) for call in calls]
+    methods = [_Method(call) for call in calls]
+    results = [None] * len(requests)
+
+    start = 0
+    while start < len(requests):
+        conn = await AsyncConnection.open(scheme, parts.hostname, port, timeout)
+        try:
+            done = await _RunPipeline(conn, requests, methods, results, start, depth, timeout)
+        finally:
+            conn.close()
+        if not done:
+            # 新连接上一个响应都没拿到，不再重试
+            for i in range(start, len(requests)):
+                results[i] = IceApiError("ConnectionClosed")
+            break
+        start += done
+    return results
+
+def RequestBatch(calls, server = server, headers = None, depth = 64, timeout = 30):
+    """Pipeline 的同步版本"""
+    return asyncio.run(Pipeline(calls, server, headers, depth, timeout))
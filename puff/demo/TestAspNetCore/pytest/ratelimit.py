@@ -0,0 +1,170 @@
+#encoding=utf8
+
+# 客户端限流调度：按接口维护令牌桶，在 RateLimitAttribute 的上限以内排队发送，而不是发出去再被拒绝
+#
+#   python ratelimit.py /middlewareexample/getlimiteddata -n 10
+#
+# 服务端 RateLimitMiddleware 是滑动窗口：任意 60 秒内同一 IP + 方法最多 RequestsPerMinute 次，
+# 被拒绝的请求不计数。对应到客户端就是容量为上限的令牌桶，每个令牌在用掉一个窗口之后才归还。
+# 归还时间从收到响应算起（不早于服务器记录的时间），所以只要没有别的客户端共用配额就不会被拒。
+
+import re
+import sys
+import time
+import argparse
+import threading
+import urllib.parse
+
+from httpclient import DefaultSession
+import jsoncodec
+
+server = "http://127.0.0.1:5000"
+
+RATE_LIMITED = "RateLimitExceeded"
+_LIMIT_RE = re.compile(r"Limit:\s*(\d+)")
+
+def ClientKey(url, headers):
+    """与 RateLimitMiddleware 相同的限流键：客户端 IP + 接口（路由不区分大小写）"""
+    ip = "unknown"
+    for k, v in (headers or {}).items():
+        if k.lower() == "x-forwarded-for":
+            ip = v.split(",")[0].strip()
+            break
+        if k.lower() == "x-real-ip":
+            ip = v
+    return (ip, urllib.parse.urlsplit(url).path.lower())
+
+class _Bucket:
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = []          # 已用令牌的归还起点；None 表示请求还在途
+        self.inflight = 0
+
+class RateLimitScheduler:
+    """按限流键排队的调度器，线程安全
+
+    limits 可以预先配置 {path: RequestsPerMinute}；没有配置的接口先不限速，
+    第一次被拒绝时从错误信息（"Limit: N per minute"）学到上限。
+    """
+
+    def __init__(self, limits = None, window = 60.0, session = None, max_retries = 3, clock = time.monotonic):
+        self.limits = {k.lower(): v for k, v in (limits or {}).items()}
+        self.window = window
+        self.session = session or DefaultSession()
+        self.max_retries = max_retries
+        self.clock = clock
+        self.sent = 0
+        self.rejected = 0
+        self.waited = 0.0
+        self._buckets = {}
+        self._cond = threading.Condition()
+
+    def acquire(self, key):
+        """阻塞到 key 有可用令牌，并占用一个"""
+        with self._cond:
+            bucket = self._bucket(key)
+            start = self.clock()
+            while True:
+                now = self.clock()
+                self._expire(bucket, now)
+                if bucket.limit is None or len(bucket.used) < bucket.limit:
+                    break
+                done = [t for t in bucket.used if t is not None]
+                # 全部在途时等任一请求完成；否则等最早的令牌归还
+                self._cond.wait(done[0] + self.window - now if done else None)
+            bucket.used.append(None)
+            bucket.inflight += 1
+            self.waited += self.clock() - start
+
+    def release(self, key, rejected_message = None):
+        """请求完成；被拒绝的请求不占服务器配额，但说明配额已满"""
+        with self._cond:
+            bucket = self._bucket(key)
+            bucket.used.remove(None)
+            bucket.inflight -= 1
+            now = self.clock()
+            if rejected_message is None:
+                bucket.used.append(now)
+            else:
+                m = _LIMIT_RE.search(rejected_message or "")
+                if m:
+                    bucket.limit = int(m.group(1))
+                    self.limits[key[1]] = bucket.limit
+                elif bucket.limit is None:
+                    bucket.limit = max(1, len([t for t in bucket.used if t is not None]))
+                # 服务器窗口已满而本地记录不足（有别的客户端或之前的请求），按刚用完补齐
+                while len(bucket.used) < bucket.limit:
+                    bucket.used.append(now)
+            bucket.used.sort(key=lambda t: float("inf") if t is None else t)
+            self._cond.notify_all()
+
+    def request(self, url, headers = None, data = None):
+        """按限流排队发送，被拒绝时等待后重试，返回 (code, headers, body)"""
+        key = ClientKey(url, headers)
+        for attempt in range(self.max_retries + 1):
+            self.acquire(key)
+            try:
+                r = self.session.request(url, headers, data)
+            except BaseException:
+                self.release(key)
+                raise
+            m = RejectMessage(r[0], r[2])
+            self.release(key, m)
+            # 多个线程共用一个 RateLimiter，计数也要在锁里改
+            with self._cond:
+                self.sent += 1
+                if m is not None:
+                    self.rejected += 1
+            if m is None:
+                return r
+        return r
+
+    def stats(self):
+        with self._cond:
+            return {"sent": self.sent, "rejected": self.rejected, "waited": self.waited,
+                "limits": {"%s %s" % k: b.limit for k, b in self._buckets.items()}}
+
+    def _bucket(self, key):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket(self.limits.get(key[1]))
+        return bucket
+
+    def _expire(self, bucket, now):
+        limit = now - self.window
+        while bucket.used and bucket.used[0] is not None and bucket.used[0] <= limit:
+            bucket.used.pop(0)
+
+def RejectMessage(code, body):
+    """响应是限流拒绝时返回错误信息（可能为空串），否则返回 None"""
+    if code != 200 or not body:
+        return None
+    try:
+        r = jsoncodec.loads(body)
+    except ValueError:
+        return None
+    if isinstance(r, dict) and r.get("stat") == RATE_LIMITED:
+        return r.get("m") or ""
+    return None
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="按限流调度连续请求一个接口")
+    parser.add_argument("endpoint", help="如 /middlewareexample/getlimiteddata")
+    parser.add_argument("--server", default=server)
+    parser.add_argument("-n", "--count", type=int, default=10)
+    parser.add_argument("--limit", type=int, default=None, help="已知的每分钟上限，不指定则从拒绝中学习")
+    parser.add_argument("--ip", default=None, help="X-Forwarded-For，用来隔离限流配额")
+    args = parser.parse_args(argv)
+
+    limits = {args.endpoint: args.limit} if args.limit else None
+    sched = RateLimitScheduler(limits)
+    headers = {"X-Forwarded-For": args.ip} if args.ip else None
+    t0 = time.monotonic()
+    for i in range(args.count):
+        code, _, body = sched.request(args.server + args.endpoint, headers, "{}")
+        print("%7.1fs  #%d  %d %s" % (time.monotonic() - t0, i + 1, code, body[:60].decode('utf-8', 'replace')))
+    print(sched.stats())
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,241 @@
+#encoding=utf8
+
+# 常数内存的流式分位数草图（DDSketch）：相对误差有保证、可以逐桶合并，用于长时间压测的浮点指标（延迟、负载大小等）
+#
+#   s = Sketch(0.01)             分位数相对误差不超过 1%
+#   s.record(0.35)
+#   s.quantile(0.99)
+#   s.merge(other)               其他进程 Sketch.from_dict(d) 的结果
+#
+# 值先追加到 array('d') 缓冲区，满了再批量写入对数分桶（装了 NumPy 时向量化），不会保存逐个样本；
+# 桶数不超过 max_bins，超出时合并最低的桶（只影响最低的分位数），内存上限约为 max_bins * 8 字节加缓冲区。
+# histogram.Histogram 是整数微秒、固定 1/128 误差的版本，这里适用于任意非负浮点数。
+
+import math
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# 小于它的值记入零桶
+MIN_VALUE = 1e-9
+
+class Sketch:
+    """DDSketch：值 v 落在 key = ceil(log_gamma(v)) 的桶里，gamma = (1 + a) / (1 - a)，
+    以桶的中点 2 * gamma^key / (gamma + 1) 作为估计值，相对误差不超过 a
+    """
+
+    def __init__(self, relative_accuracy = 0.01, max_bins = 2048, buffer_size = 4096):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be in (0, 1)")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.max_bins = max_bins
+        self.buffer_size = buffer_size
+        self._multiplier = 1.0 / math.log(self.gamma)
+        self._bins = array('d')    # self._bins[i] 为 key = self._offset + i 的计数
+        self._offset = 0
+        self._buffer = array('d')
+        self._zero = 0.0
+        self._count = 0.0
+        self._sum = 0.0
+        self._min = None
+        self._max = None
+
+    def record(self, v, n = 1):
+        if not math.isfinite(v) or v < 0:
+            raise ValueError("sketch values must be finite and non-negative: %r" % v)
+        if n == 1:
+            self._buffer.append(v)
+            if len(self._buffer) >= self.buffer_size:
+                self.flush()
+            return
+        self.flush()
+        self._add([v], n)
+
+    def record_many(self, values):
+        """批量记录（list / array / NumPy 数组）"""
+        self.flush()
+        self._add(values, 1)
+
+    def flush(self):
+        """把缓冲区写入分桶，查询和合并前会自动调用"""
+        if self._buffer:
+            buf, self._buffer = self._buffer, array('d')
+            self._add(buf, 1)
+
+    def _add(self, values, n):
+        # 先校验并算出全部 key，再修改计数和分桶，出错时草图保持不变
+        if numpy is not None and len(values) > 64:
+            v = numpy.asarray(values, dtype=numpy.float64)
+            if not numpy.isfinite(v).all() or v.min() < 0:
+                raise ValueError("sketch values must be finite and non-negative")
+            positive = v[v >= MIN_VALUE]
+            self._count += len(v) * n
+            self._sum += float(v.sum()) * n
+            self._update_range(float(v.min()), float(v.max()))
+            self._zero += (len(v) - len(positive)) * n
+            if not len(positive):
+                return
+            keys = numpy.ceil(numpy.log(positive) * self._multiplier).astype(numpy.int64)
+            lo = int(keys.min())
+            counts = numpy.bincount(keys - lo) * n
+            self._reserve(lo, int(keys.max()))
+            base = lo - self._offset
+            for i in numpy.nonzero(counts)[0]:
+                self._bins[base + int(i)] += float(counts[i])
+        else:
+            log = math.log
+            ceil = math.ceil
+            isfinite = math.isfinite
+            mult = self._multiplier
+            keys = []
+            zero = 0
+            for v in values:
+                if not isfinite(v) or v < 0:
+                    raise ValueError("sketch values must be finite and non-negative: %r" % v)
+                if v < MIN_VALUE:
+                    zero += 1
+                else:
+                    keys.append(ceil(log(v) * mult))
+            if not keys and not zero:
+                return
+            self._count += (len(keys) + zero) * n
+            self._sum += math.fsum(values) * n
+            self._update_range(min(values), max(values))
+            self._zero += zero * n
+            if keys:
+                self._reserve(min(keys), max(keys))
+                offset = self._offset
+                bins = self._bins
+                for key in keys:
+                    bins[key - offset] += n
+        if len(self._bins) > self.max_bins:
+            self._collapse()
+
+    def _update_range(self, lo, hi):
+        if self._min is None or lo < self._min:
+            self._min = lo
+        if self._max is None or hi > self._max:
+            self._max = hi
+
+    def _reserve(self, lo, hi):
+        """扩展分桶使其覆盖 [lo, hi]"""
+        if not self._bins:
+            self._offset = lo
+            self._bins = array('d', bytes(8 * (hi - lo + 1)))
+            return
+        if lo < self._offset:
+            self._bins = array('d', bytes(8 * (self._offset - lo))) + self._bins
+            self._offset = lo
+        top = self._offset + len(self._bins) - 1
+        if hi > top:
+            self._bins.extend(array('d', bytes(8 * (hi - top))))
+
+    def _collapse(self):
+        # 最低的若干个桶并进第一个保留的桶
+        extra = len(self._bins) - self.max_bins
+        merged = sum(self._bins[:extra + 1])
+        del self._bins[:extra]
+        self._bins[0] = merged
+        self._offset += extra
+
+    def merge(self, other):
+        """合并另一个相同精度的草图，结果与一个草图记录全部样本相同（未触发合并最低桶时）"""
+        if other.gamma != self.gamma:
+            raise ValueError("cannot merge sketches with different relative accuracy")
+        self.flush()
+        other.flush()
+        if other._bins:
+            self._reserve(other._offset, other._offset + len(other._bins) - 1)
+            base = other._offset - self._offset
+            for i, n in enumerate(other._bins):
+                if n:
+                    self._bins[base + i] += n
+        self._zero += other._zero
+        self._count += other._count
+        self._sum += other._sum
+        if other._min is not None:
+            self._update_range(other._min, other._max)
+        if len(self._bins) > self.max_bins:
+            self._collapse()
+        return self
+
+    @property
+    def count(self):
+        self.flush()
+        return int(self._count)
+
+    @property
+    def min(self):
+        self.flush()
+        return self._min
+
+    @property
+    def max(self):
+        self.flush()
+        return self._max
+
+    def mean(self):
+        self.flush()
+        return self._sum / self._count if self._count else 0.0
+
+    def quantile(self, q):
+        """第 q 分位（0-1），截断到实际的最小、最大值之间"""
+        self.flush()
+        if not self._count:
+            return 0.0
+        rank = q * (self._count - 1)
+        seen = self._zero
+        if seen > rank:
+            return self._min
+        for i, n in enumerate(self._bins):
+            if n:
+                seen += n
+                if seen > rank:
+                    v = 2 * self.gamma ** (self._offset + i) / (self.gamma + 1)
+                    return min(max(v, self._min), self._max)
+        return self._max
+
+    def percentile(self, p):
+        """与 Histogram.percentile 相同的 0-100 接口"""
+        return self.quantile(p / 100.0)
+
+    def percentiles(self, ps = (50, 90, 99, 99.9)):
+        return {p: self.percentile(p) for p in ps}
+
+    def memory(self):
+        """分桶和缓冲区占用的字节数"""
+        return self._bins.buffer_info()[1] * self._bins.itemsize + self._buffer.buffer_info()[1] * self._buffer.itemsize
+
+    def to_dict(self):
+        """稀疏表示，便于写 JSON 或跨进程传递"""
+        self.flush()
+        return {
+            "relative_accuracy": self.relative_accuracy, "max_bins": self.max_bins,
+            "count": self._count, "sum": self._sum, "min": self._min, "max": self._max, "zero": self._zero,
+            "bins": {str(self._offset + i): n for i, n in enumerate(self._bins) if n},
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        s = cls(d["relative_accuracy"], d["max_bins"])
+        keys = [int(k) for k in d["bins"]]
+        if keys:
+            s._reserve(min(keys), max(keys))
+            for k, n in d["bins"].items():
+                s._bins[int(k) - s._offset] = n
+        s._zero = d["zero"]
+        s._count = d["count"]
+        s._sum = d["sum"]
+        s._min = d["min"]
+        s._max = d["max"]
+        return s
+
+def FormatSize(s, ps = (50, 90, 99)):
+    """按字节格式化负载大小草图的分位数"""
+    items = ["p%s=%.0fB" % (("%g" % p), s.percentile(p)) for p in ps]
+    items.append("max=%.0fB" % (s.max or 0))
+    return " ".join(items)
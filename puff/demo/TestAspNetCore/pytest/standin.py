@@ -0,0 +1,580 @@
+#encoding=utf8
+
+# 本地替身服务器：用 asyncio 实现测试依赖的 Puff IceApi 约定，没有 .NET 运行时也能单独测客户端性能
+#
+#   python standin.py                         监听 5000，提供 /my/*（TestAspNetCore）和 /api/*（TestSimple）
+#   python standin.py --port 8080 --workers 4 多进程共用端口（SO_REUSEPORT）
+#
+# 与 JmController 保持一致的规则：
+#   路由 /{controller}/{verb}，不区分大小写，只接受 GET / POST
+#   参数依次从 JSON 请求体、Cookie、QueryString 中按名字取（请求体优先，Cookie 覆盖同名 query）
+#   返回值按 Ret 命名后补上 stat=ok（Stat=None 时不补），NutsException 转成 {"stat":code,"m":m}，
+#   其他异常为 InternalServerError，找不到方法为 VerbNotFound
+#   Cookie="a,b" 把返回值中的字段写成 Set-Cookie；JsonIn / Http 方法自己构造 IceApiResponse
+#
+# 协议层直接基于 asyncio.Protocol 解析 HTTP/1.1，支持长连接、流水线和 chunked 请求体，处理函数同步执行。
+
+import os
+import sys
+import base64
+import socket
+import asyncio
+import inspect
+import argparse
+import threading
+import urllib.parse
+
+import jsoncodec
+
+JSON = "json"
+JSON_IN = "jsonin"
+HTTP = "http"
+
+CT_JSON = "application/json; charset=utf-8"
+CT_TEXT = "text/plain; charset=utf-8"
+CT_BINARY = "application/octet-stream"
+
+class NutsException(Exception):
+    """业务错误，对应 Nano.Nuts.NutsException，stat 为 code"""
+
+    def __init__(self, code, m = ""):
+        Exception.__init__(self, code)
+        self.code = code
+        self.m = m
+
+class IceApiResponse:
+    def __init__(self, status = 200, json = None, text = None, data = None, content_type = None):
+        self.status = status
+        self.json = json
+        self.text = text
+        self.data = data
+        self.content_type = content_type
+        self.headers = [("x-request-id", base64.b64encode(os.urandom(12)).decode('ascii'))]
+        self.cookies = None
+
+    def add_header(self, key, value):
+        self.headers.append((key, value))
+
+    def set_to_save(self, name):
+        self.content_type = CT_BINARY
+        self.add_header("Content-Disposition", 'attachment; filename="%s"' % name)
+
+    @classmethod
+    def Error(cls, stat, m = None):
+        r = {"stat": stat}
+        if m:
+            r["m"] = m
+        return cls(json=r)
+
+    @classmethod
+    def String(cls, text):
+        return cls(text=text)
+
+def IceApi(flags = JSON, ret = None, stat = "stat", cookie = None):
+    """标记接口方法，参数含义同 C# 的 IceApiAttribute"""
+    def mark(fn):
+        fn.iceapi = _Api(fn, flags, ret, stat, cookie)
+        return fn
+    return mark
+
+class _Api:
+    def __init__(self, fn, flags, ret, stat, cookie):
+        self.flags = flags
+        self.rets = ret.split(",") if ret else []
+        self.stat = stat
+        self.cookies = cookie.split(",") if cookie else None
+        self.params = [(p.name, p.annotation, p.default) for p in inspect.signature(fn).parameters.values() if p.name != "self"]
+
+_MISSING = inspect.Parameter.empty
+
+def _Convert(vt, v):
+    """query / cookie 中的字符串按参数注解转换"""
+    if vt is int:
+        return int(v)
+    if vt is float:
+        return float(v)
+    if vt is bool:
+        return v.lower() == "true"
+    return v
+
+def PrepareArgs(api, body, qmap, request):
+    args = []
+    for name, vt, default in api.params:
+        if name in body:
+            v = body[name]
+            args.append(_Convert(vt, v) if isinstance(v, str) and vt is not str else v)
+        elif name in qmap:
+            args.append(_Convert(vt, qmap[name]))
+        elif name == "request":
+            args.append(request)
+        elif default is not _MISSING:
+            args.append(default)
+        else:
+            raise NutsException("KeyNotFound:" + name, "KeyNotFound:" + name)
+    return args
+
+def _CookieValue(v):
+    # 与 JsonToString 一致，bool 输出 True/False
+    if isinstance(v, bool):
+        return "True" if v else "False"
+    return str(v)
+
+def BuildJsonReturn(api, o):
+    if not api.rets:
+        if o is None:
+            r = {}
+        elif isinstance(o, dict):
+            r = dict(o)
+        else:
+            raise NutsException("WrongReturnType", "WrongReturnType")
+    elif len(api.rets) == 1:
+        r = {api.rets[0]: o}
+    else:
+        if len(o) != len(api.rets):
+            raise NutsException("WrongObjectNumber", "WrongObjectNumber,Num=%d" % len(api.rets))
+        r = dict(zip(api.rets, o))
+    if api.stat and api.stat not in r:
+        r[api.stat] = "ok"
+    response = IceApiResponse(json=r)
+    if api.cookies:
+        response.cookies = {k: _CookieValue(r[k]) for k in api.cookies}
+    return response
+
+class Request:
+    """一个 HTTP 请求，字段与 IceApiRequest 对应"""
+
+    def __init__(self, method, target, version, headers):
+        self.method = method
+        self.path, _, qs = target.partition("?")
+        self.query_string = "?" + qs if qs else ""
+        self.version = version
+        self.headers = headers          # [(name, value)]，保留原始大小写和顺序
+        self.body = b""
+        self._lower = None
+        self._cookies = None
+        self._query = None
+
+    def header(self, name, default = None):
+        if self._lower is None:
+            self._lower = {}
+            for k, v in self.headers:
+                k = k.lower()
+                self._lower[k] = self._lower[k] + "," + v if k in self._lower else v
+        return self._lower.get(name.lower(), default)
+
+    @property
+    def host(self):
+        return self.header("Host", "")
+
+    @property
+    def url(self):
+        return "http://" + self.host + self.path
+
+    @property
+    def keep_alive(self):
+        conn = (self.header("Connection") or "").lower()
+        return conn != "close" if self.version == "HTTP/1.1" else conn == "keep-alive"
+
+    @property
+    def cookies(self):
+        if self._cookies is None:
+            self._cookies = {}
+            for item in (self.header("Cookie") or "").split(";"):
+                k, eq, v = item.strip().partition("=")
+                if eq:
+                    self._cookies[k] = urllib.parse.unquote(v)
+        return self._cookies
+
+    @property
+    def query(self):
+        if self._query is None:
+            self._query = dict(urllib.parse.parse_qsl(self.query_string[1:], keep_blank_values=True))
+        return self._query
+
+class App:
+    """按 /{prefix}/{verb} 分发到注册的控制器"""
+
+    def __init__(self):
+        self._routes = {}
+
+    def add(self, prefix, controller):
+        methods = {}
+        for name in dir(controller):
+            fn = getattr(controller, name)
+            if callable(fn) and hasattr(fn, "iceapi"):
+                methods[name.lower()] = fn
+        self._routes[prefix.strip("/").lower()] = methods
+        return self
+
+    def handle(self, request):
+        """返回 IceApiResponse，路由不存在时返回 None"""
+        prefix, _, verb = request.path.strip("/").rpartition("/")
+        methods = self._routes.get(prefix.lower())
+        if methods is None or not verb:
+            return None
+        if request.method not in ("GET", "POST"):
+            return IceApiResponse(status=405, text="")
+        fn = methods.get(verb.lower())
+        if fn is None:
+            return IceApiResponse.Error("VerbNotFound", verb)
+        try:
+            return self.invoke(fn, request)
+        except NutsException as e:
+            return IceApiResponse.Error(e.code, e.m)
+        except Exception:
+            return IceApiResponse.Error("InternalServerError", "服务器端异常")
+
+    def invoke(self, fn, request):
+        api = fn.iceapi
+        if api.flags == HTTP:
+            return fn(request)
+        body = jsoncodec.loads(request.body) if request.body else {}
+        qmap = dict(request.query)
+        qmap.update(request.cookies)
+        ret = fn(*PrepareArgs(api, body, qmap, request))
+        if api.flags == JSON:
+            return BuildJsonReturn(api, ret)
+        if not isinstance(ret, IceApiResponse):
+            raise NutsException("WrongRet", "WrongRet")
+        return ret
+
+class MyController:
+    """TestAspNetCore/MyController.cs"""
+
+    @IceApi()
+    def Ping(self):
+        pass
+
+    @IceApi()
+    def Echo(self, name: str, count: int):
+        return {"name": name, "count": count}
+
+    @IceApi(ret="x,y")
+    def Swap(self, x: int, y: int):
+        return (y, x)
+
+    @IceApi()
+    def Throw(self, code: str, m: str = ""):
+        raise NutsException(code, m)
+
+    @IceApi(ret="value")
+    def Div(self, x: int, y: int):
+        # C# 整数除法向零取整
+        q = abs(x) // abs(y)
+        return q if (x < 0) == (y < 0) else -q
+
+    @IceApi(ret="stat")
+    def Stat(self, stat: str):
+        return stat
+
+    @IceApi(stat=None)
+    def NoStat(self):
+        pass
+
+    @IceApi(ret="data")
+    def GetHost(self, request):
+        return request.host
+
+    @IceApi(ret="name,value", cookie="name,value")
+    def Cookie(self, name: str, value: int):
+        return ("x-" + name, value + 1)
+
+    @IceApi(flags=JSON_IN)
+    def SayHello(self, name: str):
+        return IceApiResponse.String("Hello, %s!" % name)
+
+    @IceApi(flags=JSON_IN)
+    def SaveHello(self, name: str):
+        r = IceApiResponse.String("Hello, %s!" % name)
+        r.set_to_save(name + ".txt")
+        return r
+
+    @IceApi(flags=JSON_IN)
+    def PrintUrl(self, request, name: str):
+        return IceApiResponse.String("%s! access %s" % (name, request.host))
+
+    @IceApi(flags=HTTP)
+    def Http(self, request):
+        clen = request.header("Content-Length")
+        o = {
+            "url": request.url, "path": request.path, "method": request.method,
+            "qs": request.query_string, "ctype": request.header("Content-Type"), "clen": int(clen) if clen is not None else None,
+            "header": dict(request.headers), "cookie": request.cookies, "query": request.query,
+            "body": request.body.decode('utf-8', 'replace'),
+        }
+        response = IceApiResponse(json=o)
+        response.cookies = request.cookies
+        secret = request.header("Secret")
+        if secret is not None:
+            response.add_header("Secret", "x-" + secret)
+        return response
+
+class TestApi:
+    """TestSimple/Program.cs，BaseUrl=/api"""
+
+    @IceApi()
+    def Ping(self):
+        pass
+
+    @IceApi(ret="m")
+    def Hello(self, name: str, age: int):
+        return "My name is %s. I'm %d yrs old." % (name, age)
+
+    @IceApi(ret="name,age")
+    def Info(self, name: str, age: int):
+        return (name, age)
+
+    @IceApi(ret="name,age")
+    def InfoV(self, name: str, age: int):
+        return (name, age)
+
+    @IceApi(ret="info")
+    def InfoCG(self, name: str, age: int):
+        return {"name": name, "age": age}
+
+    @IceApi(ret="info")
+    def InfoDO(self, name: str, age: int):
+        return {"name": name, "age": age}
+
+    @IceApi()
+    def Throw(self, s: str):
+        raise NutsException(s)
+
+    @IceApi()
+    def Stat(self):
+        return {"stat": "false", "value": 100}
+
+    @IceApi(ret="value", stat="")
+    def NoStat(self):
+        return 100
+
+    @IceApi(flags=HTTP)
+    def Raw(self, request):
+        return IceApiResponse.String("Haruhi")
+
+def ParseRequestHead(head):
+    """解析请求行和请求头（不含结尾的空行），格式错误抛 ValueError"""
+    lines = head.decode('latin-1').split("\r\n")
+    method, target, version = lines[0].split(" ")
+    headers = []
+    for line in lines[1:]:
+        k, _, v = line.partition(":")
+        headers.append((k.strip(), v.strip()))
+    return Request(method, target, version, headers)
+
+def DefaultApp():
+    return App().add("/my", MyController()).add("/api", TestApi())
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+    500: "Internal Server Error"}
+
+def EncodeResponse(r, keep_alive):
+    if r.json is not None:
+        body = jsoncodec.dumps(r.json)
+        ctype = CT_JSON
+    elif r.text is not None:
+        body = r.text.encode('utf-8')
+        ctype = r.content_type or CT_TEXT
+    else:
+        body = r.data or b""
+        ctype = r.content_type or CT_BINARY
+    lines = ["HTTP/1.1 %d %s" % (r.status, _REASONS.get(r.status, "Unknown")),
+        "Content-Length: %d" % len(body), "Content-Type: " + ctype, "Server: Puff-StandIn"]
+    for k, v in r.headers:
+        lines.append("%s: %s" % (k, v))
+    if r.cookies:
+        # 与 TestAspNetCore 实际返回的一致：多个 Cookie 合并在一行 Set-Cookie 里
+        lines.append("Set-Cookie: " + ", ".join("%s=%s; path=/" % (k, urllib.parse.quote(v, safe="")) for k, v in r.cookies.items()))
+    if not keep_alive:
+        lines.append("Connection: close")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode('utf-8') + body
+
+def _Simple(status, keep_alive):
+    r = IceApiResponse(status=status, data=b"")
+    r.headers = []
+    return EncodeResponse(r, keep_alive)
+
+MAX_HEAD = 64 << 10
+
+class HttpProtocol(asyncio.Protocol):
+    """HTTP/1.1 解析：请求头整体到齐后解析，请求体按 Content-Length 或 chunked 增量读取"""
+
+    def __init__(self, app, max_body = 1 << 30):
+        self.app = app
+        self.max_body = max_body
+        self.transport = None
+        self._buf = bytearray()
+        self._req = None
+        self._body = None
+        self._left = 0              # Content-Length 剩余字节；chunked 时为当前块剩余字节
+        self._chunked = False
+        self._chunk_state = 0       # 0 等块大小行，1 读块数据，2 等块尾 CRLF，3 等 trailer
+        self._closing = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        sock = transport.get_extra_info("socket")
+        if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def data_received(self, data):
+        self._buf += data
+        out = []
+        while not self._closing:
+            if self._req is None and not self._read_head(out):
+                break
+            if self._req is None or not self._read_body(out):
+                break
+            req, self._req = self._req, None
+            req.body = bytes(self._body)
+            self._body = None
+            keep_alive = req.keep_alive
+            r = self.app.handle(req)
+            out.append(EncodeResponse(r, keep_alive) if r is not None else _Simple(404, keep_alive))
+            if not keep_alive:
+                self._closing = True
+        if out:
+            self.transport.write(b"".join(out))
+        if self._closing:
+            self.transport.close()
+
+    def _read_head(self, out):
+        i = self._buf.find(b"\r\n\r\n")
+        if i < 0:
+            if len(self._buf) > MAX_HEAD:
+                self._fail(out, 400)
+            return False
+        head = bytes(self._buf[:i])
+        del self._buf[:i + 4]
+        try:
+            req = ParseRequestHead(head)
+        except ValueError:
+            self._fail(out, 400)
+            return False
+        self._body = bytearray()
+        self._chunked = (req.header("Transfer-Encoding") or "").lower() == "chunked"
+        self._chunk_state = 0
+        try:
+            self._left = int(req.header("Content-Length") or 0)
+        except ValueError:
+            self._fail(out, 400)
+            return False
+        if self._left < 0:
+            # 负的 Content-Length 会让请求体截在缓冲区中间，剩下的字节被当成下一个请求
+            self._fail(out, 400)
+            return False
+        if self._left > self.max_body:
+            self._fail(out, 413)
+            return False
+        self._req = req
+        return True
+
+    def _read_body(self, out):
+        buf = self._buf
+        if not self._chunked:
+            n = min(self._left, len(buf))
+            if n:
+                self._body += buf[:n]
+                del buf[:n]
+                self._left -= n
+            return self._left == 0
+        while True:
+            if self._chunk_state == 0:
+                i = buf.find(b"\r\n")
+                if i < 0:
+                    return False
+                try:
+                    self._left = int(bytes(buf[:i]).split(b";", 1)[0], 16)
+                except ValueError:
+                    self._fail(out, 400)
+                    return False
+                del buf[:i + 2]
+                self._chunk_state = 1 if self._left else 3
+            elif self._chunk_state == 1:
+                n = min(self._left, len(buf))
+                if len(self._body) + n > self.max_body:
+                    self._fail(out, 413)
+                    return False
+                self._body += buf[:n]
+                del buf[:n]
+                self._left -= n
+                if self._left:
+                    return False
+                self._chunk_state = 2
+            elif self._chunk_state == 2:
+                if len(buf) < 2:
+                    return False
+                del buf[:2]
+                self._chunk_state = 0
+            else:
+                # trailer 以空行结束
+                i = buf.find(b"\r\n")
+                if i < 0:
+                    return False
+                del buf[:i + 2]
+                if i == 0:
+                    return True
+
+    def _fail(self, out, status):
+        out.append(_Simple(status, False))
+        self._req = None
+        self._closing = True
+
+async def Serve(host = "127.0.0.1", port = 5000, app = None, reuse_port = False):
+    """启动服务器，返回 asyncio.Server"""
+    app = app or DefaultApp()
+    loop = asyncio.get_running_loop()
+    return await loop.create_server(lambda: HttpProtocol(app), host, port, reuse_port=reuse_port or None, backlog=1024)
+
+def RunInThread(host = "127.0.0.1", port = 0, app = None):
+    """在后台线程的事件循环里启动服务器，返回实际监听的端口（port=0 时随机分配）"""
+    started = threading.Event()
+    box = []
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        server = loop.run_until_complete(Serve(host, port, app))
+        box.append(server.sockets[0].getsockname()[1])
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    started.wait()
+    return box[0]
+
+def _Worker(host, port, reuse_port):
+    async def run():
+        server = await Serve(host, port, reuse_port=reuse_port)
+        async with server:
+            await server.serve_forever()
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="Puff IceApi 本地替身服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=1, help="进程数，大于 1 时用 SO_REUSEPORT 共用端口（仅 Linux/BSD）")
+    args = parser.parse_args(argv)
+
+    print("Puff stand-in listening on http://%s:%d (%d worker%s)" % (args.host, args.port, args.workers, "s" if args.workers > 1 else ""))
+    sys.stdout.flush()
+    if args.workers <= 1:
+        _Worker(args.host, args.port, False)
+        return 0
+    import multiprocessing
+    procs = [multiprocessing.Process(target=_Worker, args=(args.host, args.port, True), daemon=True) for _ in range(args.workers)]
+    for p in procs:
+        p.start()
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
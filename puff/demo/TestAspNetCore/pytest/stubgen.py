@@ -0,0 +1,274 @@
+#encoding=utf8
+
+# 根据 Puff 输出的 Swagger 文档（PuffDocumentFilter）离线生成 Python 客户端模块
+#
+#   curl http://127.0.0.1:9000/swagger/v1/swagger.json > swagger.json
+#   python stubgen.py swagger.json -o puffapi.py --server http://127.0.0.1:9000
+#
+# 每个 IceApi 生成一个方法：URL 在构造时拼好，参数顺序与服务器方法一致，
+# 请求体按参数类型生成固定的拼接代码（不建 dict、不走 json.dumps），返回值按 Ret/Stat 直接拆包。
+
+import re
+import sys
+import json
+import keyword
+import argparse
+
+HEADER = '''#encoding=utf8
+
+# 由 stubgen.py 根据 %(source)s 生成，不要手工修改
+
+import json
+import math
+import urllib.parse
+from json.encoder import encode_basestring_ascii as _str
+
+from httpclient import DefaultSession, IceApiError
+
+server = "%(server)s"
+
+def _int(v):
+    if v != int(v):
+        raise ValueError("not an integer: %%r" %% (v,))
+    return str(int(v))
+
+def _num(v):
+    v = float(v)
+    if not math.isfinite(v):
+        raise ValueError("JSON cannot encode %%r" %% v)
+    return float.__repr__(v)
+
+def _bool(v):
+    return 'true' if v else 'false'
+
+_obj = json.dumps
+
+class _Api:
+    def __init__(self, server = server, session = None):
+        self.server = server
+        self.session = session or DefaultSession()
+
+    def _call(self, url, body):
+        """IceApi JSON 调用，stat 不是 ok 时抛 IceApiError"""
+        code, headers, data = self.session.request(url, None, body)
+        if code != 200:
+            raise IceApiError("HTTP %%d" %% code)
+        r = json.loads(data)
+        stat = r.get("stat", "ok")
+        if stat != "ok":
+            raise IceApiError(stat, r.get("m"))
+        return r
+
+    def _text(self, url, body):
+        """JsonIn 接口，返回响应文本"""
+        code, headers, data = self.session.request(url, None, body)
+        if code != 200:
+            raise IceApiError("HTTP %%d" %% code)
+        return data.decode('utf-8')
+
+    def _raw(self, url, data, headers, query):
+        """Http 接口，返回 (code, headers, body)"""
+        if query:
+            url += "?" + urllib.parse.urlencode(query)
+        return self.session.request(url, headers, data)
+'''
+
+# schema 类型 -> (必填时的 % 格式, 编码函数名)
+ENCODERS = {
+    "integer": ("%s", "_int"),
+    "number": ("%s", "_num"),
+    "boolean": ("%s", "_bool"),
+    "string": ("%s", "_str"),
+}
+
+def Ident(name):
+    name = re.sub(r"\W", "_", name)
+    if not name or name[0].isdigit():
+        name = "_" + name
+    return name + "_" if keyword.iskeyword(name) else name
+
+def Resolve(doc, schema):
+    while schema and "$ref" in schema:
+        ref = schema["$ref"]
+        schema = doc.get("components", {}).get("schemas", {}).get(ref.rsplit("/", 1)[-1], {})
+    return schema or {}
+
+class Param:
+    def __init__(self, name, schema, required = False):
+        self.name = name
+        self.ident = Ident(name)
+        self.type = schema.get("type") if "$ref" not in schema else "object"
+        # Swagger 的 required（query 参数的 required、请求体 schema 的 required 列表），
+        # 另外值类型（int/double/bool）在 C# 里不可为 null，也视为必填
+        self.required = bool(required) or (self.type in ("integer", "number", "boolean") and not schema.get("nullable"))
+
+    def inline(self):
+        """必填参数在模板里的 (格式, 值表达式)"""
+        fmt, enc = ENCODERS.get(self.type, ("%s", "_obj"))
+        return (fmt, "%s(%s)" % (enc, self.ident))
+
+    def check(self):
+        """必填参数传 None 时在客户端报错，而不是发出去得到 KeyNotFound"""
+        return ["if %s is None:" % self.ident, "    raise TypeError(\"%s is required\")" % self.ident]
+
+    def encode(self):
+        enc = ENCODERS.get(self.type, ("%s", "_obj"))[1]
+        return "%s(%s)" % (enc, self.ident)
+
+class Method:
+    def __init__(self, doc, path, item):
+        self.path = path
+        self.name = Ident(path.rstrip("/").rsplit("/", 1)[-1])
+        self.tag = path.strip("/").split("/")[0]
+        op = item.get("post") or item.get("get") or next(iter(item.values()))
+        self.post = "post" in item
+        self.summary = op.get("summary") or ""
+        tags = op.get("tags") or []
+        if tags:
+            self.tag = tags[0] if isinstance(tags[0], str) else tags[0].get("name", self.tag)
+
+        self.params = []
+        if self.post:
+            body = Resolve(doc, op.get("requestBody", {}).get("content", {}).get("application/json", {}).get("schema", {}))
+            required = set(body.get("required") or ())
+            for name, schema in body.get("properties", {}).items():
+                self.params.append(Param(name, schema, name in required))
+        else:
+            for p in op.get("parameters", []):
+                if p.get("in") == "query":
+                    self.params.append(Param(p["name"], p.get("schema", {}), p.get("required")))
+
+        resp = op.get("responses", {}).get("200", {}).get("content", {}).get("application/json", {}).get("schema", {})
+        self.fields = None
+        if resp.get("$ref", "").endswith("/IceApiResponse"):
+            # JsonIn 有参数，返回文本；Http 模式不声明参数，返回原始响应
+            self.kind = "text" if self.params or "requestBody" in op else "raw"
+        else:
+            props = Resolve(doc, resp).get("properties")
+            if props and "stat" in props:
+                self.fields = [k for k in props if k != "stat"]
+                self.kind = "void" if not self.fields else "ret"
+            else:
+                self.kind = "object"
+
+    def signature(self):
+        if self.kind == "raw":
+            return "self, data = None, headers = None, query = None"
+        # 从最后一个必填参数之后开始才能带默认值
+        last = max([i for i, p in enumerate(self.params) if p.required], default=-1)
+        args = ["self"]
+        for i, p in enumerate(self.params):
+            args.append(p.ident if i <= last else "%s = None" % p.ident)
+        return ", ".join(args)
+
+    def body_lines(self):
+        """生成拼请求体的代码，结果放在变量 body 里"""
+        if not self.params:
+            return ["body = None"]
+        required = [p for p in self.params if p.required]
+        optional = [p for p in self.params if not p.required]
+        fmt = ",".join('"%s":%s' % (p.name, p.inline()[0]) for p in required)
+        vals = ", ".join(p.inline()[1] for p in required)
+        lines = [line for p in required for line in p.check()]
+        if not optional:
+            return lines + ["body = '{%s}' %% (%s,)" % (fmt, vals)]
+        lines.append("p = [%s]" % ("'%s' %% (%s,)" % (fmt, vals) if required else ""))
+        for p in optional:
+            lines.append("if %s is not None:" % p.ident)
+            lines.append("    p.append('\"%s\":' + %s)" % (p.name, p.encode()))
+        lines.append("body = '{' + ','.join(p) + '}'")
+        return lines
+
+    def query_lines(self):
+        lines = [line for p in self.params if p.required for line in p.check()]
+        lines.append("q = []")
+        for p in self.params:
+            if p.required:
+                lines.append("q.append((\"%s\", %s))" % (p.name, p.ident))
+                continue
+            lines.append("if %s is not None:" % p.ident)
+            lines.append("    q.append((\"%s\", %s))" % (p.name, p.ident))
+        lines.append("url = self._u_%s + ('?' + urllib.parse.urlencode(q) if q else '')" % self.name)
+        return lines
+
+    def emit(self):
+        out = ["    def %s(%s):" % (self.name, self.signature())]
+        if self.kind == "raw":
+            doc = self.path
+        else:
+            doc = "%s %s" % ("POST" if self.post and self.params else "GET", self.path)
+        if self.summary:
+            doc = self.summary.strip().replace('"""', "'''") + "\n\n        " + doc
+        out.append('        """%s"""' % doc)
+        url = "self._u_%s" % self.name
+        if self.kind == "raw":
+            body = []
+            call = "self._raw(%s, data, headers, query)" % url
+        elif self.post:
+            body = self.body_lines()
+            call = "self._%s(%s, body)" % ("text" if self.kind == "text" else "call", url)
+        else:
+            body = self.query_lines()
+            call = "self._%s(url, None)" % ("text" if self.kind == "text" else "call")
+        out += ["        " + line for line in body]
+        if self.kind == "void":
+            out.append("        %s" % call)
+        elif self.kind == "ret" and len(self.fields) == 1:
+            out.append("        return %s[\"%s\"]" % (call, self.fields[0]))
+        elif self.kind == "ret":
+            out.append("        r = %s" % call)
+            out.append("        return (%s)" % ", ".join('r["%s"]' % f for f in self.fields))
+        else:
+            out.append("        return %s" % call)
+        return out
+
+def Generate(doc, source = "swagger.json", server = "http://127.0.0.1:5000"):
+    groups = {}
+    for path, item in doc.get("paths", {}).items():
+        m = Method(doc, path, item)
+        groups.setdefault(m.tag, []).append(m)
+    tag_docs = {t.get("name"): t.get("description") for t in doc.get("tags", [])}
+
+    out = [HEADER % {"source": source, "server": server}]
+    classes = []
+    for tag, methods in groups.items():
+        cls = Ident(tag) + "Api"
+        classes.append((Ident(tag), cls))
+        out.append("class %s(_Api):" % cls)
+        if tag_docs.get(tag):
+            out.append('    """%s"""' % tag_docs[tag].strip().replace('"""', "'''"))
+            out.append("")
+        out.append("    def __init__(self, server = server, session = None):")
+        out.append("        _Api.__init__(self, server, session)")
+        for m in methods:
+            out.append("        self._u_%s = server + \"%s\"" % (m.name, m.path))
+        for m in methods:
+            out.append("")
+            out += m.emit()
+        out.append("")
+    out.append("class Client:")
+    out.append("    def __init__(self, server = server, session = None):")
+    for attr, cls in classes:
+        out.append("        self.%s = %s(server, session)" % (attr, cls))
+    out.append("")
+    return "\n".join(out)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="根据 Puff Swagger 文档生成 Python 客户端")
+    parser.add_argument("swagger", help="保存下来的 swagger.json")
+    parser.add_argument("-o", "--output", default=None, help="输出文件，默认打印到标准输出")
+    parser.add_argument("--server", default="http://127.0.0.1:5000")
+    args = parser.parse_args(argv)
+
+    with open(args.swagger, encoding='utf-8') as f:
+        doc = json.load(f)
+    code = Generate(doc, args.swagger, args.server)
+    if args.output:
+        with open(args.output, "w", encoding='utf-8') as f:
+            f.write(code)
+    else:
+        print(code)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,29 +1,8 @@
 #encoding=utf8
 
 import json
-import urllib.request
-import urllib.error
-
-def RequestRaw(url, headers = {}, data = None):
-    try:        
-        # 在Python 3中，POST数据需要编码为bytes
-        if data and isinstance(data, str):
-            data = data.encode('utf-8')
-        request = urllib.request.Request(url=url, headers=headers, data=data)
-        r = urllib.request.urlopen(request)
-        data = r.read()
-        r.close()
-        # 解码响应数据
-        if isinstance(data, bytes):
-            data = data.decode('utf-8')
-        return (r.code, r.headers, data)
-    except urllib.error.HTTPError as e:
-        return (e.code, None, None)
-
-def RequestHttp(url, headers = {}, data = None):
-    r = RequestRaw(url, headers, data)
-    assert r[0] == 200
-    return json.loads(r[2])
+from httpclient import RequestRaw, RequestHttp, Session
+from httpcache import ResponseCache
 
 server = "http://127.0.0.1:5000"
 
@@ -76,4 +55,19 @@ if __name__ == "__main__":
     assert "Secret" in headers
     assert headers["Secret"] == "x-kuma"
 
+    # Cache: Authorization 不同的请求不能共用缓存条目
+    cache = ResponseCache({"/my/http": 60})
+    with Session(cookies=False, cache=cache) as session:
+        a = session.request(url, {"Authorization": "Bearer A"}, "x")
+        b = session.request(url, {"Authorization": "Bearer B"}, "x")
+        assert json.loads(a[2])["header"]["Authorization"] == "Bearer A"
+        assert json.loads(b[2])["header"]["Authorization"] == "Bearer B"
+        assert session.request(url, {"Authorization": "Bearer A"}, "x")[2] == a[2]
+        assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+        # 重复的 GET 由缓存返回
+        a = session.request(url + "?id=7")
+        assert session.request(url + "?id=7")[2] == a[2]
+        assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 3
+
     print("ok")
@@ -1,36 +1,8 @@
 #encoding=utf8
 
 import json
-import urllib.request
-import urllib.error
-
-def RequestRaw(url, headers = {}, data = None):
-    try:        
-        # 在Python 3中，POST数据需要编码为bytes
-        if data and isinstance(data, str):
-            data = data.encode('utf-8')
-        request = urllib.request.Request(url=url, headers=headers, data=data)
-        r = urllib.request.urlopen(request)
-        data = r.read()
-        r.close()
-        # 解码响应数据
-        if isinstance(data, bytes):
-            data = data.decode('utf-8')
-        return (r.code, r.headers, data)
-    except urllib.error.HTTPError as e:
-        return (e.code, None, None)
-
-def RequestApi(url, **kwargs):
-    data = json.dumps(kwargs) if kwargs != None else None
-    r = RequestRaw(url, data=data)
-    assert r[0] == 200
-    return json.loads(r[2])
-
-def RequestApiObj(url, obj):
-    data = json.dumps(obj) if obj != None else None
-    r = RequestRaw(url, data=data)
-    assert r[0] == 200
-    return json.loads(r[2])
+from httpclient import RequestRaw, RequestApi, RequestApiObj, IceApiError
+from pipeline import RequestBatch
 
 server = "http://127.0.0.1:5000"
 
@@ -105,5 +77,12 @@ if __name__ == "__main__":
     response = RequestRaw(server + "/my/PrintUrl?name=wenliangjun")
     assert response[0] == 200 
     assert response[2] == "wenliangjun! access 10.211.55.8:5000"
+
+    # Pipelined batch
+    rs = RequestBatch([("/my/div", {"x":6, "y":3}), ("/my/swap", {"x":1, "y":2}), ("/my/throw", {"code":"first"}), ("/my/ping", None)], server)
+    assert rs[0] == {"stat":"ok", "value":2}
+    assert rs[1] == {"stat":"ok", "x":2, "y":1}
+    assert isinstance(rs[2], IceApiError) and rs[2].stat == "first"
+    assert rs[3] == {"stat":"ok"}
     
     print("ok")    
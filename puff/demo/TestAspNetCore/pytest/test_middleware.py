@@ -1,25 +1,10 @@
 #encoding=utf8
 
 import json
-import urllib.request
-import urllib.error
 import time
-
-def RequestRaw(url, headers = {}, data = None):
-    try:        
-        # 在Python 3中，POST数据需要编码为bytes
-        if data and isinstance(data, str):
-            data = data.encode('utf-8')
-        request = urllib.request.Request(url=url, headers=headers, data=data)
-        r = urllib.request.urlopen(request)
-        data = r.read()
-        r.close()
-        # 解码响应数据
-        if isinstance(data, bytes):
-            data = data.decode('utf-8')
-        return (r.code, r.headers, data)
-    except urllib.error.HTTPError as e:
-        return (e.code, e.headers if hasattr(e, 'headers') else None, None)
+from httpclient import RequestRaw
+from histogram import FormatLatency
+from loadgen import MeasureTimeline
 
 def RequestApi(url, headers = {}, **kwargs):
     """请求API并解析响应，根据stat字段判断成功/失败"""
@@ -68,6 +53,11 @@ def RequestApiExpectError(url, headers = {}, **kwargs):
 
 server = "http://127.0.0.1:5000"
 
+def PrintTimeline(actual, corrected):
+    """并列输出从实际发出和从计划时刻算的延迟，服务器卡顿时两者才会拉开"""
+    print("   延迟（从实际发出）: " + FormatLatency(actual))
+    print("   延迟（从计划时刻）: " + FormatLatency(corrected))
+
 def test_public_api():
     """测试公开API（无中间件限制）"""
     print("测试公开API...")
@@ -119,16 +109,16 @@ def test_rate_limit_middleware():
     success_count = 0
     limit_count = 0
     
-    # 快速发送多个请求测试限流
-    for i in range(7):
-        r = RequestApi(url)
+    # 按每秒 10 个的固定时间表发送多个请求测试限流
+    actual, corrected, results = MeasureTimeline(lambda: RequestApi(url), 10, 7)
+    for i, r in enumerate(results):
         if r != None:
             success_count += 1
             print("   请求 %d: 成功" % (i + 1))
         else:
             limit_count += 1
             print("   请求 %d: 被限流" % (i + 1))
-        time.sleep(0.1)  # 短暂延迟
+    PrintTimeline(actual, corrected)
     
     if limit_count == 0:
         print("❌ 测试失败: 应该有请求被限流")
@@ -160,16 +150,16 @@ def test_file_controller_rate_limit():
     success_count = 0
     limit_count = 0
     
-    # 测试文件上传API的限流
-    for i in range(6):
-        r = RequestApi(url)
+    # 测试文件上传API的限流，每秒 5 个
+    actual, corrected, results = MeasureTimeline(lambda: RequestApi(url), 5, 6)
+    for i, r in enumerate(results):
         if r != None:
             success_count += 1
             print("   文件上传 %d: 成功" % (i + 1))
         else:
             limit_count += 1
             print("   文件上传 %d: 被限流" % (i + 1))
-        time.sleep(0.2)
+    PrintTimeline(actual, corrected)
     
     if limit_count == 0:
         print("❌ 测试失败: 文件控制器应该有限流")
@@ -241,18 +231,12 @@ def test_performance_monitoring():
     print("测试性能监控...")
     url = server + "/middlewareexample/getpublicdata"
     
-    # 连续访问同一个API，测试性能监控
-    for i in range(3):
-        start_time = time.time()
-        r = RequestApi(url)
-        end_time = time.time()
-        
-        if r == None:
-            print("❌ 测试失败: API应该成功")
-            return False
-        duration = (end_time - start_time) * 1000  # 转换为毫秒
-        print("   请求 %d: %.0fms" % (i + 1, duration))
-        time.sleep(0.1)
+    # 按每秒 10 个的固定时间表连续访问同一个API，测试性能监控
+    actual, corrected, results = MeasureTimeline(lambda: RequestApi(url), 10, 3)
+    if None in results:
+        print("❌ 测试失败: API应该成功")
+        return False
+    PrintTimeline(actual, corrected)
     
     print("✅ 性能监控测试完成，检查服务器控制台的性能日志")
     return True
@@ -286,15 +270,15 @@ def test_class_level_middleware():
     limit_count = 0
     
     # 测试类级别认证+审计 + 方法级别限流的组合
-    for i in range(5):
-        r = RequestApi(url2, headers)
+    actual, corrected, results = MeasureTimeline(lambda: RequestApi(url2, headers), 10, 5)
+    for r in results:
         if r:
             success_count += 1
         else:
             limit_count += 1
-        time.sleep(0.1)
     
     print("✅ 类+方法级别组合中间件测试: %d 成功, %d 被限流" % (success_count, limit_count))
+    PrintTimeline(actual, corrected)
     
     # 测试方法级别特性覆盖类级别特性
     url3 = server + "/securearea/performspecificoperation"
@@ -0,0 +1,127 @@
+#encoding=utf8
+
+# 并行测试运行器：把 test_middleware / test_websocket 里的各个场景分发到进程池同时运行，汇总结果和耗时
+#
+#   python testrunner.py                       # 默认两个模块全部场景
+#   python testrunner.py test_middleware -j 8 -k rate -v
+#
+# 每个场景使用不同的 X-Forwarded-For，RateLimitMiddleware 按 IP + 方法计数，场景之间的限流配额互不影响。
+# Hub 的连接、断开和广播通知发给所有客户端，test_websocket 的场景同时运行会互相干扰，放在单独的单进程池里依次运行。
+# 场景可以是普通函数或协程函数（test_websocket）。场景函数返回 False、抛异常或 sys.exit(非 0) 视为失败；返回 True 或 None 视为通过。
+
+import io
+import sys
+import asyncio
+import inspect
+import time
+import argparse
+import importlib
+import traceback
+import contextlib
+import multiprocessing
+
+MODULES = ["test_middleware", "test_websocket"]
+
+# 这些模块的场景一次只运行一个
+SERIAL = {"test_websocket"}
+
+def Discover(modules, keyword = None):
+    """按定义顺序列出各模块的 test_* 函数，返回 [(module, name)]；模块导入失败时 name 为 None"""
+    scenarios = []
+    for mod in modules:
+        try:
+            m = importlib.import_module(mod)
+        except Exception:
+            scenarios.append((mod, None))
+            continue
+        for name, fn in vars(m).items():
+            if name.startswith("test_") and callable(fn) and getattr(fn, "__module__", None) == mod:
+                if keyword is None or keyword in name:
+                    scenarios.append((mod, name))
+    return scenarios
+
+def ClientIp(index):
+    return "10.77.%d.%d" % (index // 250, index % 250 + 1)
+
+def RunScenario(mod, name, ip):
+    """在工作进程里运行一个场景，返回 (状态, 耗时, 输出)"""
+    from httpclient import DefaultSession
+    DefaultSession().headers["X-Forwarded-For"] = ip
+
+    out = io.StringIO()
+    t0 = time.perf_counter()
+    status = "pass"
+    with contextlib.redirect_stdout(out):
+        try:
+            m = importlib.import_module(mod)
+            if name is None:
+                raise ImportError("no test scenarios in %s" % mod)
+            fn = getattr(m, name)
+            r = asyncio.run(fn()) if inspect.iscoroutinefunction(fn) else fn()
+            if r is False:
+                status = "fail"
+        except SystemExit as e:
+            if e.code not in (None, 0):
+                status = "fail"
+        except Exception:
+            status = "error"
+            traceback.print_exc(file=out)
+    return (status, time.perf_counter() - t0, out.getvalue())
+
+def RunAll(scenarios, processes, timeout):
+    """返回 [(module, name, 状态, 耗时, 输出)]，以及总墙钟时间"""
+    t0 = time.perf_counter()
+    pool = multiprocessing.Pool(processes)
+    serial = multiprocessing.Pool(1) if any(mod in SERIAL for mod, _ in scenarios) else None
+    try:
+        pending = [(mod, name, (serial if mod in SERIAL else pool).apply_async(RunScenario, (mod, name, ClientIp(i))))
+            for i, (mod, name) in enumerate(scenarios)]
+        results = []
+        for mod, name, r in pending:
+            # 超时从运行器启动算起，排在后面的场景不会因为等前面的而被判超时
+            left = max(0.0, timeout - (time.perf_counter() - t0)) if timeout else None
+            try:
+                status, elapsed, output = r.get(left)
+            except multiprocessing.TimeoutError:
+                status, elapsed, output = ("timeout", time.perf_counter() - t0, "")
+            results.append((mod, name, status, elapsed, output))
+    finally:
+        # 超时的场景还卡在工作进程里，直接结束
+        for p in (pool, serial):
+            if p is not None:
+                p.terminate()
+                p.join()
+    return (results, time.perf_counter() - t0)
+
+def Report(results, wall, verbose = False):
+    lines = []
+    for mod, name, status, elapsed, output in results:
+        mark = "ok" if status == "pass" else status.upper()
+        lines.append("%-7s %7.2fs  %s.%s" % (mark, elapsed, mod, name or "<import>"))
+        if output and (verbose or status != "pass"):
+            lines += ["        " + line for line in output.rstrip().splitlines()]
+    passed = sum(1 for r in results if r[2] == "pass")
+    busy = sum(r[3] for r in results)
+    lines.append("")
+    lines.append("%d/%d 通过，墙钟 %.2fs，各场景耗时合计 %.2fs" % (passed, len(results), wall, busy))
+    return "\n".join(lines)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="并行运行中间件和 Hub 测试场景")
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    parser.add_argument("-j", "--processes", type=int, default=None, help="进程数，默认等于场景数")
+    parser.add_argument("-k", "--keyword", default=None, help="只运行名字包含该字符串的场景")
+    parser.add_argument("--timeout", type=float, default=120.0, help="整体超时（秒）")
+    parser.add_argument("-v", "--verbose", action="store_true", help="通过的场景也打印输出")
+    args = parser.parse_args(argv)
+
+    scenarios = Discover(args.modules, args.keyword)
+    if not scenarios:
+        print("没有匹配的测试场景")
+        return 1
+    results, wall = RunAll(scenarios, args.processes or len(scenarios), args.timeout)
+    print(Report(results, wall, args.verbose))
+    return 0 if all(r[2] == "pass" for r in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+#encoding=utf8
+
+# 按接口汇总请求各阶段耗时（httpclient.RequestTiming），用来区分网络/建连开销和服务器处理时间
+#
+#   stats = TimingStats()
+#   session = Session(cookies=False, on_timing=stats)
+#   ...
+#   print(stats.report())
+#
+#   python timing.py /my/ping -n 200
+
+import sys
+import argparse
+import threading
+import urllib.parse
+
+from histogram import Histogram
+from httpclient import Session
+
+PHASES = ("connect", "write", "ttfb", "body", "total")
+
+class TimingStats:
+    """线程安全的聚合器，可以直接作为 Session 的 on_timing 回调"""
+
+    def __init__(self):
+        self.endpoints = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, timing):
+        self.record(timing)
+
+    def record(self, timing):
+        key = "%s %s" % (timing.method, urllib.parse.urlsplit(timing.url).path.lower())
+        with self._lock:
+            entry = self.endpoints.get(key)
+            if entry is None:
+                entry = self.endpoints[key] = {"count": 0, "new_conns": 0, "errors": 0, "phases": {p: Histogram() for p in PHASES}}
+            entry["count"] += 1
+            if not timing.reused:
+                entry["new_conns"] += 1
+            if timing.code is None or timing.code >= 400:
+                entry["errors"] += 1
+            for p in PHASES:
+                # 直方图单位是微秒
+                entry["phases"][p].record(getattr(timing, p) // 1000)
+
+    def percentile(self, endpoint, phase, p):
+        """返回某接口某阶段的分位数（毫秒）"""
+        with self._lock:
+            return self.endpoints[endpoint]["phases"][phase].percentile(p) / 1000.0
+
+    def report(self, ps = (50, 90, 99)):
+        lines = []
+        with self._lock:
+            for key in sorted(self.endpoints):
+                entry = self.endpoints[key]
+                lines.append("%s  n=%d 新建连接=%d 错误=%d" % (key, entry["count"], entry["new_conns"], entry["errors"]))
+                for p in PHASES:
+                    h = entry["phases"][p]
+                    items = " ".join("p%g=%.3f" % (q, h.percentile(q) / 1000.0) for q in ps)
+                    lines.append("   %-8s %s max=%.3f ms" % (p, items, (h.max or 0) / 1000.0))
+        return "\n".join(lines)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="请求耗时分解")
+    parser.add_argument("endpoint", help="如 /my/ping")
+    parser.add_argument("--server", default="http://127.0.0.1:5000")
+    parser.add_argument("-n", "--count", type=int, default=100)
+    parser.add_argument("--data", default=None, help="请求体，不指定时发 GET")
+    args = parser.parse_args(argv)
+
+    stats = TimingStats()
+    with Session(cookies=False, on_timing=stats) as session:
+        for _ in range(args.count):
+            session.request(args.server + args.endpoint, {"Content-Type": "application/json"} if args.data else None, args.data)
+    print(stats.report())
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+#encoding=utf8
+
+# hubtrace / httptrace 共用的轨迹文件读写：每行一个 JSON，.gz 结尾时 gzip 压缩，"-" 表示标准输入输出
+#
+#   w = TraceFile("x.trace.gz", "hubtrace", 1)       第一行写头 {"hubtrace": 1, "time": ...}
+#   w.append(conn, ["open", "/chatHub", "json"])     写 [t, 流编号, ...]，t 为相对录制开始的秒数
+#   header, rows = ReadTrace("x.trace.gz", "hubtrace", 1)
+#
+# 流编号按发起记录的对象（连接、会话）本身分配，不用 id()：对象回收后 id 会被复用，新对象会拿到旧对象的编号。
+
+import sys
+import gzip
+import time
+import weakref
+import itertools
+import threading
+
+import jsoncodec
+
+def OpenTrace(path, mode):
+    if path == "-":
+        return sys.stdout if "w" in mode else sys.stdin
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+class TraceFile:
+    """轨迹写入器，线程安全，可供多条连接或多个会话共用"""
+
+    def __init__(self, path, format, version, clock = time.monotonic, **header):
+        self.clock = clock
+        self.start = clock()
+        self.rows = 0
+        self._f = OpenTrace(path, "w")
+        self._ids = weakref.WeakKeyDictionary()
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+        header.update({format: version, "time": time.time()})
+        self._write(header)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, stream, fields):
+        """stream 为发起记录的对象（要能弱引用），第一次出现时分配编号"""
+        with self._lock:
+            sid = self._ids.get(stream)
+            if sid is None:
+                sid = self._ids[stream] = next(self._next)
+            self._write([round(self.clock() - self.start, 6), sid] + list(fields))
+            self.rows += 1
+
+    def close(self):
+        with self._lock:
+            if self._f not in (sys.stdout, None):
+                self._f.close()
+            self._f = None
+
+    def _write(self, obj):
+        self._f.write(jsoncodec.dumps(obj).decode('utf-8'))
+        self._f.write("\n")
+
+def ReadTrace(path, format, version):
+    """返回 (头, 记录列表)，记录按时间排序；头不是 {format: version} 时抛 ValueError"""
+    with OpenTrace(path, "r") as f:
+        header = None
+        rows = []
+        for line in f:
+            if not line.strip():
+                continue
+            obj = jsoncodec.loads(line.encode('utf-8'))
+            if header is None:
+                if not isinstance(obj, dict) or obj.get(format) != version:
+                    raise ValueError("not a %s file: %s" % (format, path))
+                header = obj
+            else:
+                rows.append(obj)
+    rows.sort(key=lambda r: r[0])
+    return (header, rows)
+
+def WriteTrace(path, format, version, rows, **header):
+    """写入现成的记录（合成或从日志导入的轨迹），t 保留 6 位小数，返回记录数"""
+    f = OpenTrace(path, "w")
+    try:
+        header.update({format: version, "time": time.time()})
+        f.write(jsoncodec.dumps(header).decode('utf-8') + "\n")
+        for r in rows:
+            f.write(jsoncodec.dumps([round(r[0], 6)] + list(r[1:])).decode('utf-8') + "\n")
+    finally:
+        if f is not sys.stdout:
+            f.close()
+    return len(rows)
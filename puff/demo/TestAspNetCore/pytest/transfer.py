@@ -0,0 +1,154 @@
+#encoding=utf8
+
+# 大请求体/响应体的流式传输：上传按 chunked 编码边读边发（文件、mmap 或生成的数据），下载按固定缓冲区逐块读取
+#
+#   python transfer.py upload /fileexample/uploadfile --file big.bin --mmap
+#   python transfer.py upload /my/http --size 2G
+#   python transfer.py download /my/http --post-size 256M -o /dev/null
+#
+# 输出 MB/s 和进程内存峰值，内存峰值应当与传输大小无关。
+
+import re
+import sys
+import mmap
+import time
+import argparse
+
+from httpclient import DefaultSession, IsBuffer
+
+server = "http://127.0.0.1:5000"
+
+def ParseSize(text):
+    """"64K" / "256M" / "2G" -> 字节数"""
+    m = re.fullmatch(r"(\d+(?:\.\d+)?)([KMG]?)B?", text.strip().upper())
+    if not m:
+        raise ValueError("invalid size: %s" % text)
+    return int(float(m.group(1)) * {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30}[m.group(2)])
+
+def BufferChunks(buf, chunk_size = 65536):
+    """把 mmap / bytes 切成 memoryview 分块，用于 chunked 上传，不拷贝原缓冲区"""
+    view = memoryview(buf)
+    for pos in range(0, len(view), chunk_size):
+        yield view[pos:pos + chunk_size]
+
+def ZeroChunks(size, chunk_size = 1 << 20):
+    """生成 size 字节的零数据，反复产出同一个缓冲区，用来测多 GB 上传而不占磁盘和内存"""
+    block = memoryview(bytes(chunk_size))
+    while size > 0:
+        n = min(size, chunk_size)
+        yield block[:n]
+        size -= n
+
+class _CountingReader:
+    """统计读出的字节数，http.client 按连接的 blocksize 调用 read"""
+
+    def __init__(self, source):
+        self.source = source
+        self.count = 0
+
+    def read(self, n = -1):
+        data = self.source.read(n)
+        self.count += len(data)
+        return data
+
+class _CountingChunks:
+    """统计分块迭代器产出的字节数"""
+
+    def __init__(self, source):
+        self.source = source
+        self.count = 0
+
+    def __iter__(self):
+        for chunk in self.source:
+            self.count += len(chunk)
+            yield chunk
+
+def Upload(url, source, headers = None, session = None, chunk_size = 65536, chunked = True):
+    """流式上传，source 为文件对象、mmap/bytes 或 bytes 迭代器，返回 (code, 发送字节数, 秒, 响应体)
+
+    chunked=False 且 source 为定长缓冲区时按 Content-Length 一次 sendall，连分块拷贝也省掉。
+    """
+    session = session or DefaultSession()
+    hdrs = {"Content-Type": "application/octet-stream"}
+    if headers:
+        hdrs.update(headers)
+    if hasattr(source, "read"):
+        body = _CountingReader(source)
+    elif not IsBuffer(source):
+        body = _CountingChunks(source)
+    elif chunked:
+        body = _CountingChunks(BufferChunks(source, chunk_size))
+    else:
+        body = None
+    t0 = time.perf_counter()
+    with session.stream(url, hdrs, body if body is not None else source) as resp:
+        data = resp.read()
+    seconds = time.perf_counter() - t0
+    sent = body.count if body is not None else len(source)
+    return (resp.status, sent, seconds, data)
+
+def Download(url, sink = None, data = None, headers = None, session = None, chunk_size = 65536):
+    """流式下载，逐块写入 sink（有 write 方法，None 时丢弃），返回 (code, 字节数, 秒)"""
+    session = session or DefaultSession()
+    t0 = time.perf_counter()
+    with session.stream(url, headers, data) as resp:
+        for chunk in resp.iter_content(chunk_size):
+            if sink is not None:
+                sink.write(chunk)
+    return (resp.status, resp.size, time.perf_counter() - t0)
+
+def PeakMemory():
+    """进程内存峰值（MB），不支持时返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return kb / 1024.0 if sys.platform != "darwin" else kb / (1 << 20)
+
+def _Report(action, code, size, seconds):
+    mb = size / float(1 << 20)
+    peak = PeakMemory()
+    print("%s: HTTP %d, %.1f MB, %.2fs, %.1f MB/s%s" % (
+        action, code, mb, seconds, mb / seconds if seconds else 0.0,
+        ", 内存峰值 %.1f MB" % peak if peak is not None else ""))
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="流式上传/下载吞吐测试")
+    parser.add_argument("action", choices=["upload", "download"])
+    parser.add_argument("endpoint", help="如 /fileexample/uploadfile 或 /my/http")
+    parser.add_argument("--server", default=server)
+    parser.add_argument("--file", default=None, help="上传的文件，不指定时用 --size 生成零数据")
+    parser.add_argument("--mmap", action="store_true", help="上传文件时映射到内存再分块发送（映射的页面会计入内存峰值）")
+    parser.add_argument("--no-chunked", action="store_true", help="mmap 上传时按 Content-Length 整体发送")
+    parser.add_argument("--size", default="256M", help="生成的上传数据大小")
+    parser.add_argument("--post-size", default=None, help="下载时先 POST 这么多零数据（/my/http 会回显）")
+    parser.add_argument("--chunk-size", default="64K")
+    parser.add_argument("-o", "--output", default=None, help="下载写入的文件")
+    args = parser.parse_args(argv)
+
+    url = args.server + args.endpoint
+    chunk_size = ParseSize(args.chunk_size)
+    if args.action == "upload":
+        if args.file and args.mmap:
+            with open(args.file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                code, size, seconds, _ = Upload(url, mm, chunk_size=chunk_size, chunked=not args.no_chunked)
+        elif args.file:
+            with open(args.file, "rb") as f:
+                code, size, seconds, _ = Upload(url, f, chunk_size=chunk_size)
+        else:
+            code, size, seconds, _ = Upload(url, ZeroChunks(ParseSize(args.size), chunk_size), chunk_size=chunk_size)
+        _Report("上传", code, size, seconds)
+    else:
+        data = ZeroChunks(ParseSize(args.post_size), chunk_size) if args.post_size else None
+        sink = open(args.output, "wb") if args.output else None
+        try:
+            code, size, seconds = Download(url, sink, data, chunk_size=chunk_size)
+        finally:
+            if sink is not None:
+                sink.close()
+        _Report("下载", code, size, seconds)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,33 @@
+#encoding=utf8
+
+# 多进程压测的公共部分：从结果队列收回各工作进程的报告，进程崩溃或超时时不会一直卡住
+#
+#   results = multiprocessing.Queue()
+#   workers = [multiprocessing.Process(target=..., args=(..., results)) for ...]
+#   reports = CollectResults(results, workers, timeout=120)
+#
+# loadgen（HTTP）和 hubscale（Hub 扇出）共用，只依赖标准库。
+
+import time
+import queue
+
+def CollectResults(results, workers, timeout):
+    """从 results 队列取回每个工作进程的结果；有进程异常退出或超过 timeout 秒时终止全部进程并抛 RuntimeError"""
+    reports = []
+    deadline = time.monotonic() + timeout
+    while len(reports) < len(workers):
+        try:
+            reports.append(results.get(timeout=0.5))
+            continue
+        except queue.Empty:
+            pass
+        dead = [p for p in workers if p.exitcode not in (None, 0)]
+        if dead or time.monotonic() > deadline:
+            for p in workers:
+                p.terminate()
+            if dead:
+                raise RuntimeError("工作进程异常退出: %s" % ", ".join("pid %d exitcode %d" % (p.pid, p.exitcode) for p in dead))
+            raise RuntimeError("等待工作进程结果超过 %gs" % timeout)
+    for p in workers:
+        p.join()
+    return reports
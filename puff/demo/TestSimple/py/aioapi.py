@@ -0,0 +1,66 @@
+#encoding=utf8
+
+# api.py 的 asyncio 版本，可以用 Gather 并发调用
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "TestAspNetCore", "pytest"))
+from aioclient import DefaultSession, RequestApiObj, Gather
+
+async def RequestUrl(url, data):
+    code, headers, data = await DefaultSession().request(url, data=data)
+    if code < 200 or code >= 300:
+        return (code, None)
+    return (code, data.decode('utf-8'))
+
+async def RequestApi(url, **kwargs):
+    return await RequestApiObj(url, kwargs)
+
+server = "http://localhost:8080"
+
+# api
+
+async def Ping():
+    url = server + "/api/ping"
+    return await RequestApi(url)
+
+async def Hello(name, age):
+    url = server + "/api/hello"
+    return await RequestApi(url, name=name, age=age)
+
+async def Info(name, age):
+    url = server + "/api/info"
+    return await RequestApi(url, name=name, age=age)
+
+async def InfoV(name, age):
+    url = server + "/api/InfoV"
+    return await RequestApi(url, name=name, age=age)
+
+async def InfoQ(name, age):
+    url = server + ("/api/info?name=%s&age=%d" % (name, age))
+    return await RequestApiObj(url, None)
+
+async def InfoCG(name, age):
+    url = server + "/api/InfoCG"
+    return await RequestApi(url, name=name, age=age)
+
+async def InfoDO(name, age):
+    url = server + "/api/InfoDO"
+    return await RequestApi(url, name=name, age=age)
+
+async def Throw(s):
+    url = server + "/api/throw"
+    return await RequestApi(url, s=s)
+
+async def Stat():
+    url = server + "/api/Stat"
+    return await RequestApi(url)
+
+async def NoStat():
+    url = server + "/api/NoStat"
+    return await RequestApi(url)
+
+async def Raw():
+    url = server + "/api/raw"
+    return await RequestUrl(url, None)
@@ -1,19 +1,21 @@
 #encoding=utf8
 
+import os
+import sys
 import json
-import urllib.request
+
+# 共享的长连接客户端位于 TestAspNetCore/pytest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "TestAspNetCore", "pytest"))
+from httpclient import DefaultSession
 
 def RequestUrl(url, data):
-    try:
-        r = urllib.request.urlopen(url, data.encode('utf-8') if data else None)
-        cookies = r.headers.get("Set-Cookie")
-        if cookies != None:
-            print ("Set-Cookie: ") + cookies
-        data = r.read()
-        r.close()
-        return (r.code, data)
-    except urllib.error.HTTPError as e:
-        return (e.code, None)  
+    code, headers, data = DefaultSession().request(url, data=data)
+    if code < 200 or code >= 300:
+        return (code, None)
+    cookies = headers.get("Set-Cookie")
+    if cookies != None:
+        print ("Set-Cookie: " + cookies)
+    return (code, data.decode('utf-8'))
 
 def RequestApi(url, **kwargs):
     data = json.dumps(kwargs) if kwargs != None else None